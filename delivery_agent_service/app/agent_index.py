@@ -0,0 +1,196 @@
+import asyncio
+import math
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from app.locations import agent_locations
+from app.models import DeliveryAgent
+
+KM_PER_DEGREE = 111.32
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Equirectangular approximation of the great-circle distance; well under 1% off at city scale."""
+    x = (lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = lat2 - lat1
+    return KM_PER_DEGREE * math.hypot(x, y)
+
+class AgentGeoIndex:
+    """
+    Uniform latitude/longitude grid of available agents' positions.
+
+    nearest() visits rings of cells outward from the query's cell and stops once
+    no unvisited cell can hold anything closer than the best match so far. Sparse
+    regions fall back to a full scan after `max_rings` rings.
+    """
+
+    def __init__(self, cell_degrees: float = 0.005, max_rings: int = 32):
+        self.cell_degrees = cell_degrees
+        self.max_rings = max_rings
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._positions: Dict[int, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, agent_id: int) -> bool:
+        return agent_id in self._positions
+
+    def _cell_of(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def add(self, agent_id: int, latitude: float, longitude: float):
+        self.remove(agent_id)
+        self._positions[agent_id] = (latitude, longitude)
+        self._cells.setdefault(self._cell_of(latitude, longitude), set()).add(agent_id)
+
+    def move(self, agent_id: int, latitude: float, longitude: float):
+        """Updates the position of an agent that is already indexed; others are ignored."""
+        if agent_id in self._positions:
+            self.add(agent_id, latitude, longitude)
+
+    def reset(self, positions: Dict[int, Tuple[float, float]]):
+        """Replaces the whole index with `positions` in one step."""
+        cells: Dict[Tuple[int, int], Set[int]] = {}
+        for agent_id, (latitude, longitude) in positions.items():
+            cells.setdefault(self._cell_of(latitude, longitude), set()).add(agent_id)
+        self._cells, self._positions = cells, dict(positions)
+
+    def remove(self, agent_id: int):
+        position = self._positions.pop(agent_id, None)
+        if position is None:
+            return
+        cell = self._cell_of(*position)
+        members = self._cells[cell]
+        members.discard(agent_id)
+        if not members:
+            del self._cells[cell]
+
+    def position(self, agent_id: int) -> Optional[Tuple[float, float]]:
+        return self._positions.get(agent_id)
+
+    def items(self) -> List[Tuple[int, Tuple[float, float]]]:
+        """Snapshot of every indexed (agent_id, (latitude, longitude))."""
+        return list(self._positions.items())
+
+    def _ring(self, row: int, col: int, radius: int) -> Iterator[Tuple[int, int]]:
+        if radius == 0:
+            yield row, col
+            return
+        for dc in range(-radius, radius + 1):
+            yield row - radius, col + dc
+            yield row + radius, col + dc
+        for dr in range(-radius + 1, radius):
+            yield row + dr, col - radius
+            yield row + dr, col + radius
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[Tuple[int, float]]:
+        """Returns (agent_id, distance_km) of the closest indexed agent, or None when the index is empty."""
+        if not self._positions:
+            return None
+        row, col = self._cell_of(latitude, longitude)
+        best_id, best_distance = None, math.inf
+        for radius in range(self.max_rings + 1):
+            for cell in self._ring(row, col, radius):
+                for agent_id in self._cells.get(cell, ()):
+                    agent_lat, agent_lng = self._positions[agent_id]
+                    distance = distance_km(latitude, longitude, agent_lat, agent_lng)
+                    if distance < best_distance:
+                        best_id, best_distance = agent_id, distance
+            # Cells beyond this ring are at least `radius` whole cells away on one axis;
+            # longitude degrees shrink towards the poles, so bound with the widest latitude reached.
+            lng_scale = math.cos(math.radians(min(89.0, abs(latitude) + (radius + 1) * self.cell_degrees)))
+            if best_distance <= radius * self.cell_degrees * KM_PER_DEGREE * lng_scale:
+                return best_id, best_distance
+
+        for agent_id, (agent_lat, agent_lng) in self._positions.items():
+            distance = distance_km(latitude, longitude, agent_lat, agent_lng)
+            if distance < best_distance:
+                best_id, best_distance = agent_id, distance
+        return best_id, best_distance
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, float]]:
+        """Returns (id, distance_km) of every indexed entry within `radius_km`, nearest first."""
+        lat_degrees = radius_km / KM_PER_DEGREE
+        lng_scale = max(math.cos(math.radians(min(89.0, abs(latitude) + lat_degrees))), 1e-6)
+        lat_cells = math.ceil(lat_degrees / self.cell_degrees)
+        lng_cells = math.ceil(lat_degrees / lng_scale / self.cell_degrees)
+        row, col = self._cell_of(latitude, longitude)
+        found = []
+        for dr in range(-lat_cells, lat_cells + 1):
+            for dc in range(-lng_cells, lng_cells + 1):
+                for entry_id in self._cells.get((row + dr, col + dc), ()):
+                    entry_lat, entry_lng = self._positions[entry_id]
+                    distance = distance_km(latitude, longitude, entry_lat, entry_lng)
+                    if distance <= radius_km:
+                        found.append((entry_id, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "agents": len(self._positions),
+            "cells": len(self._cells),
+            "cell_degrees": self.cell_degrees,
+        }
+
+agent_index = AgentGeoIndex()
+
+class AgentIndexRefresher:
+    """
+    Rebuilds agent_index from the database every `interval` seconds.
+
+    Claims and releases made by this process update the index directly; the
+    rebuild picks up changes made by other processes. A stale entry is harmless
+    because every claim is a conditional UPDATE.
+    """
+
+    def __init__(self, interval: float = 30.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.rebuilds = 0
+        self.last_rebuild_duration = 0.0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                print(f"ERROR: Agent index rebuild failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def rebuild(self):
+        started = time.perf_counter()
+        rows = await DeliveryAgent.filter(
+            available=True, latitude__isnull=False, longitude__isnull=False
+        ).values_list("id", "latitude", "longitude")
+        positions = {agent_id: (latitude, longitude) for agent_id, latitude, longitude in rows}
+        # Positions reported since the last location flush are newer than the table.
+        for agent_id in positions:
+            latest = agent_locations.position(agent_id)
+            if latest is not None:
+                positions[agent_id] = latest[:2]
+        agent_index.reset(positions)
+        self.rebuilds += 1
+        self.last_rebuild_duration = time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {
+            **agent_index.stats(),
+            "rebuilds": self.rebuilds,
+            "last_rebuild_duration_seconds": self.last_rebuild_duration,
+        }
+
+agent_index_refresher = AgentIndexRefresher()
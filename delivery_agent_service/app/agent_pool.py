@@ -0,0 +1,398 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from app.agent_index import AgentGeoIndex, agent_index
+from app.config import AGENT_POOL_FLUSH_SECONDS, STACK_RADIUS_KM, STACK_WINDOW_SECONDS
+from app.locations import agent_locations
+from app.models import DeliveryAgent
+
+# Absolute values from memory, so rewriting a row after a failed flush is harmless.
+FLUSH_AGENTS_SQL = """
+UPDATE delivery_agents AS agent
+SET available = state.available, active_deliveries = state.active_deliveries
+FROM unnest($1::int[], $2::bool[], $3::int[]) AS state(id, available, active_deliveries)
+WHERE agent.id = state.id
+"""
+
+INSERT_DELIVERIES_SQL = """
+INSERT INTO agent_deliveries (order_id, agent_id, pickup_latitude, pickup_longitude, assigned_at)
+SELECT * FROM unnest($1::int[], $2::int[], $3::float8[], $4::float8[], $5::timestamptz[])
+ON CONFLICT (order_id) DO NOTHING
+"""
+
+DELETE_DELIVERIES_SQL = "DELETE FROM agent_deliveries WHERE order_id = ANY($1::int[])"
+
+LOAD_AGENTS_SQL = """
+SELECT id, name, available, capacity, active_deliveries, latitude, longitude FROM delivery_agents
+"""
+
+LOAD_DELIVERIES_SQL = """
+SELECT order_id, agent_id, pickup_latitude, pickup_longitude, assigned_at FROM agent_deliveries
+"""
+
+class AgentState:
+    __slots__ = ("id", "name", "available", "capacity", "active", "untracked", "idle_since", "latitude", "longitude")
+
+    def __init__(self, id: int, name: str, available: bool, capacity: int, latitude=None, longitude=None):
+        self.id = id
+        self.name = name
+        self.available = available
+        self.capacity = capacity
+        self.active = 0
+        # Part of `active` without agent_deliveries rows (busy before migration 0006).
+        self.untracked = 0
+        self.idle_since = 0.0
+        self.latitude = latitude
+        self.longitude = longitude
+
+# (agent_id, pickup_latitude, pickup_longitude, assigned_at as a unix timestamp)
+Delivery = Tuple[int, Optional[float], Optional[float], float]
+
+class AgentPool:
+    """
+    Process-local free/busy state of every agent, used instead of conditional
+    UPDATEs to pick agents when AGENT_POOL_MODE=memory.
+
+    Free agents sit in a heap keyed by when they became idle, so an order without
+    a pickup location goes to the longest-idle agent; located free agents are
+    also kept in agent_index for nearest-agent lookups, and the pickups of active
+    deliveries in a grid of their own for stacking. Assigning and completing
+    touch memory only. Every `flush_interval` seconds the changed agents and
+    deliveries are written to Postgres in one transaction, so the tables always
+    hold a consistent snapshot, which load() recovers from on startup.
+
+    Changes from the last interval before a crash are lost, so an agent may be
+    handed out again after a restart. The pool also assumes it is the only
+    writer of agent state: run a single delivery_agent_service process in this mode.
+    """
+
+    def __init__(self, flush_interval: float = 0.1, chunk_size: int = 5000):
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self._agents: Dict[int, AgentState] = {}
+        self._idle: List[Tuple[float, int]] = []
+        self._deliveries: Dict[int, Delivery] = {}
+        self._pickups = AgentGeoIndex()
+        self._task: Optional[asyncio.Task] = None
+
+        self._dirty_agents: Set[int] = set()
+        self._new_deliveries: Dict[int, Delivery] = {}
+        self._ended_deliveries: Set[int] = set()
+        self._oldest_pending: Optional[float] = None
+
+        self.assignments = 0
+        self.stacked = 0
+        self.completions = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.last_flush_lag = 0.0
+        self.last_flush_duration = 0.0
+        self.last_load_duration = 0.0
+
+    # --- recovery ---
+
+    async def load(self):
+        """Rebuilds the pool from the database. Run before serving requests."""
+        started = time.perf_counter()
+        conn = connections.get("default")
+        agents = await conn.execute_query_dict(LOAD_AGENTS_SQL)
+        deliveries = await conn.execute_query_dict(LOAD_DELIVERIES_SQL)
+        self.restore(agents, deliveries)
+        self.last_load_duration = time.perf_counter() - started
+
+    def restore(self, agents: Iterable[dict], deliveries: Iterable[dict]):
+        """
+        Replaces the pool with the given delivery_agents and agent_deliveries rows.
+        An agent's load is the number of its delivery rows, or its stored
+        active_deliveries if that is higher (load from before migration 0006). One
+        without any load keeps its stored `available` flag, so agents taken off
+        duty stay off.
+        """
+        agents = list(agents)
+        self._agents = {
+            row["id"]: AgentState(row["id"], row["name"], row["available"], row["capacity"], row["latitude"], row["longitude"])
+            for row in agents
+        }
+        self._deliveries = {}
+        self._pickups = AgentGeoIndex()
+        for row in deliveries:
+            agent = self._agents.get(row["agent_id"])
+            if agent is None:
+                continue
+            delivery = (agent.id, row["pickup_latitude"], row["pickup_longitude"], row["assigned_at"].timestamp())
+            self._deliveries[row["order_id"]] = delivery
+            if delivery[1] is not None and delivery[2] is not None:
+                self._pickups.add(row["order_id"], delivery[1], delivery[2])
+            agent.active += 1
+        for row in agents:
+            agent = self._agents[row["id"]]
+            agent.untracked = max(row["active_deliveries"] - agent.active, 0)
+            agent.active += agent.untracked
+
+        now = time.time()
+        self._idle = []
+        positions = {}
+        for agent in self._agents.values():
+            if agent.active:
+                agent.available = False
+            elif agent.available:
+                agent.idle_since = now
+                self._idle.append((now, agent.id))
+                position = self._position(agent)
+                if position is not None:
+                    positions[agent.id] = position
+        heapq.heapify(self._idle)
+        agent_index.reset(positions)
+        self._dirty_agents, self._new_deliveries, self._ended_deliveries = set(), {}, set()
+        self._oldest_pending = None
+
+    # --- reads ---
+
+    def _position(self, agent: AgentState) -> Optional[Tuple[float, float]]:
+        latest = agent_locations.position(agent.id)
+        if latest is not None:
+            return latest[:2]
+        if agent.latitude is not None and agent.longitude is not None:
+            return agent.latitude, agent.longitude
+        return None
+
+    def get(self, agent_id: int) -> Optional[DeliveryAgent]:
+        agent = self._agents.get(agent_id)
+        return self._to_model(agent) if agent is not None else None
+
+    def _to_model(self, agent: AgentState) -> DeliveryAgent:
+        position = self._position(agent) or (None, None)
+        return DeliveryAgent(
+            id=agent.id, name=agent.name, available=agent.available, capacity=agent.capacity,
+            active_deliveries=agent.active, latitude=position[0], longitude=position[1],
+        )
+
+    def overlay(self, agents: List[DeliveryAgent]) -> List[DeliveryAgent]:
+        """Replaces the free/busy fields of agents read from the database with the current ones."""
+        for agent in agents:
+            state = self._agents.get(agent.id)
+            if state is not None:
+                agent.available, agent.active_deliveries = state.available, state.active
+        return agents
+
+    # --- state changes ---
+
+    def add_agent(self, agent: DeliveryAgent):
+        """Takes in an agent that was just created in the database."""
+        state = AgentState(agent.id, agent.name, False, agent.capacity, agent.latitude, agent.longitude)
+        self._agents[agent.id] = state
+        if agent.available:
+            self._set_idle(state)
+
+    def _set_idle(self, agent: AgentState):
+        agent.available = True
+        agent.idle_since = time.time()
+        heapq.heappush(self._idle, (agent.idle_since, agent.id))
+        position = self._position(agent)
+        if position is not None:
+            agent_index.add(agent.id, *position)
+
+    def _take(self, agent: AgentState, order_id: int, latitude: Optional[float], longitude: Optional[float]):
+        agent.available = False
+        agent.active += 1
+        agent_index.remove(agent.id)
+        delivery = (agent.id, latitude, longitude, time.time())
+        self._deliveries[order_id] = delivery
+        if latitude is not None and longitude is not None:
+            self._pickups.add(order_id, latitude, longitude)
+        self._new_deliveries[order_id] = delivery
+        self._mark_dirty(agent.id)
+        self.assignments += 1
+
+    def _mark_dirty(self, agent_id: int):
+        self._dirty_agents.add(agent_id)
+        if self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+
+    def _longest_idle(self) -> Optional[AgentState]:
+        while self._idle:
+            idle_since, agent_id = heapq.heappop(self._idle)
+            agent = self._agents.get(agent_id)
+            # Entries left behind by agents that were taken since are skipped.
+            if agent is not None and agent.available and agent.idle_since == idle_since:
+                return agent
+        return None
+
+    def _stackable(self, latitude: float, longitude: float) -> Optional[Tuple[AgentState, float]]:
+        cutoff = time.time() - STACK_WINDOW_SECONDS
+        for order_id, distance in self._pickups.within(latitude, longitude, STACK_RADIUS_KM):
+            agent_id, _, _, assigned_at = self._deliveries[order_id]
+            agent = self._agents[agent_id]
+            if assigned_at >= cutoff and 0 < agent.active < agent.capacity:
+                return agent, distance
+        return None
+
+    def assign(
+        self, order_id: int, latitude: Optional[float] = None, longitude: Optional[float] = None
+    ) -> Tuple[Optional[DeliveryAgent], Optional[float], bool]:
+        """Same contract and selection order as crud.assign_agent, without touching the database."""
+        delivery = self._deliveries.get(order_id)
+        if delivery is not None:
+            return self.get(delivery[0]), None, False
+
+        if latitude is not None and longitude is not None:
+            match = self._stackable(latitude, longitude)
+            if match is not None:
+                agent, distance = match
+                self._take(agent, order_id, latitude, longitude)
+                self.stacked += 1
+                return self._to_model(agent), distance, True
+            nearest = agent_index.nearest(latitude, longitude)
+            if nearest is not None:
+                agent = self._agents[nearest[0]]
+                self._take(agent, order_id, latitude, longitude)
+                return self._to_model(agent), nearest[1], False
+
+        agent = self._longest_idle()
+        if agent is None:
+            return None, None, False
+        self._take(agent, order_id, latitude, longitude)
+        return self._to_model(agent), None, False
+
+    def claim(self, agent_id: int, order_id: int, latitude: float, longitude: float) -> bool:
+        """Gives an order to a specific idle agent, for batch assignment."""
+        agent = self._agents.get(agent_id)
+        if agent is None or not agent.available or order_id in self._deliveries:
+            return False
+        self._take(agent, order_id, latitude, longitude)
+        return True
+
+    def complete(self, order_id: int, agent_id: int) -> Optional[DeliveryAgent]:
+        """Ends a delivery the agent is carrying; the agent is idle again after its last one."""
+        agent = self._agents.get(agent_id)
+        if agent is None:
+            return None
+        delivery = self._deliveries.get(order_id)
+        if delivery is not None and delivery[0] == agent_id:
+            del self._deliveries[order_id]
+            self._pickups.remove(order_id)
+            if self._new_deliveries.pop(order_id, None) is None:
+                self._ended_deliveries.add(order_id)
+        elif agent.untracked > 0:
+            agent.untracked -= 1
+        else:
+            print(f"WARNING: Agent {agent_id} was not carrying order {order_id}; load left unchanged.")
+            return self._to_model(agent)
+        agent.active -= 1
+        if agent.active == 0 and not agent.available:
+            self._set_idle(agent)
+        self._mark_dirty(agent.id)
+        self.completions += 1
+        return self._to_model(agent)
+
+    def release(self, order_id: int) -> Optional[DeliveryAgent]:
+        """Ends the delivery of `order_id` for whichever agent carries it; None when nobody does."""
+        delivery = self._deliveries.get(order_id)
+        if delivery is None:
+            return None
+        return self.complete(order_id, delivery[0])
+
+    # --- write-behind ---
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush_once()
+        except Exception as e:
+            print(f"ERROR: Final agent pool flush failed: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_once()
+            except Exception as e:
+                print(f"ERROR: Agent pool flush failed: {str(e)}")
+
+    async def flush_once(self) -> int:
+        """Writes every pending change in one transaction. Returns the number of agents written."""
+        if not self._dirty_agents and not self._new_deliveries and not self._ended_deliveries:
+            return 0
+        started = time.perf_counter()
+        dirty, self._dirty_agents = self._dirty_agents, set()
+        new, self._new_deliveries = self._new_deliveries, {}
+        ended, self._ended_deliveries = self._ended_deliveries, set()
+        oldest, self._oldest_pending = self._oldest_pending, None
+
+        agents = [self._agents[agent_id] for agent_id in dirty if agent_id in self._agents]
+        deliveries = list(new.items())
+        try:
+            async with in_transaction("default") as connection:
+                for start in range(0, len(agents), self.chunk_size):
+                    chunk = agents[start:start + self.chunk_size]
+                    await connection.execute_query(FLUSH_AGENTS_SQL, [
+                        [agent.id for agent in chunk],
+                        [agent.available for agent in chunk],
+                        [agent.active for agent in chunk],
+                    ])
+                for start in range(0, len(deliveries), self.chunk_size):
+                    chunk = deliveries[start:start + self.chunk_size]
+                    await connection.execute_query(INSERT_DELIVERIES_SQL, [
+                        [order_id for order_id, _ in chunk],
+                        [delivery[0] for _, delivery in chunk],
+                        [delivery[1] for _, delivery in chunk],
+                        [delivery[2] for _, delivery in chunk],
+                        [datetime.fromtimestamp(delivery[3], timezone.utc) for _, delivery in chunk],
+                    ])
+                if ended:
+                    await connection.execute_query(DELETE_DELIVERIES_SQL, [list(ended)])
+        except Exception:
+            # Nothing was written; queue it all again. A delivery that ended in the
+            # meantime never reached the database, so it needs neither write.
+            self._dirty_agents |= dirty
+            for order_id, delivery in new.items():
+                if order_id in self._ended_deliveries:
+                    self._ended_deliveries.discard(order_id)
+                else:
+                    self._new_deliveries.setdefault(order_id, delivery)
+            self._ended_deliveries |= ended
+            if oldest is not None:
+                self._oldest_pending = min(oldest, self._oldest_pending or oldest)
+            self.flush_failures += 1
+            raise
+
+        self.flushes += 1
+        self.last_flush_lag = time.monotonic() - oldest if oldest is not None else 0.0
+        self.last_flush_duration = time.perf_counter() - started
+        return len(agents)
+
+    def stats(self) -> dict:
+        return {
+            "agents": len(self._agents),
+            "idle": sum(1 for agent in self._agents.values() if agent.available),
+            "active_deliveries": len(self._deliveries),
+            "assignments": self.assignments,
+            "stacked": self.stacked,
+            "completions": self.completions,
+            "pending_agents": len(self._dirty_agents),
+            "pending_deliveries": len(self._new_deliveries) + len(self._ended_deliveries),
+            "flush_lag_seconds": time.monotonic() - self._oldest_pending if self._oldest_pending is not None else 0.0,
+            "last_flush_lag_seconds": self.last_flush_lag,
+            "last_flush_duration_seconds": self.last_flush_duration,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "last_load_duration_seconds": self.last_load_duration,
+        }
+
+agent_pool = AgentPool(flush_interval=AGENT_POOL_FLUSH_SECONDS)
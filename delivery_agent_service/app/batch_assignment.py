@@ -0,0 +1,53 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial import cKDTree
+
+from app.agent_index import KM_PER_DEGREE
+
+def distance_matrix_km(orders: np.ndarray, agents: np.ndarray) -> np.ndarray:
+    """
+    Pairwise distances between (n, 2) order and (m, 2) agent lat/lng arrays, as an (n, m) matrix.
+    Same equirectangular approximation as agent_index.distance_km.
+    """
+    lat_o, lng_o = orders[:, 0:1], orders[:, 1:2]
+    lat_a, lng_a = agents[:, 0], agents[:, 1]
+    x = (lng_a - lng_o) * np.cos(np.radians((lat_o + lat_a) / 2))
+    y = lat_a - lat_o
+    return KM_PER_DEGREE * np.hypot(x, y)
+
+def solve_assignment(
+    order_points: Sequence[Tuple[float, float]],
+    agent_points: Sequence[Tuple[float, float]],
+    max_candidates: int = 32,
+) -> List[Tuple[int, int, float]]:
+    """
+    Matches orders to agents minimising the total pickup distance.
+    Returns (order index, agent index, distance_km) for every matched order;
+    with fewer agents than orders some orders stay unmatched.
+
+    Only the union of each order's k nearest agents, found with a k-d tree, goes
+    to the solver, with k = min(number of orders, max_candidates). With k equal to
+    the number of orders the result is exactly optimal, since one of an order's n
+    nearest agents is always left free to swap in; the cap trades that guarantee
+    for speed on large batches and is rarely binding in practice.
+    """
+    if not order_points or not agent_points:
+        return []
+    orders = np.asarray(order_points, dtype=float)
+    agents = np.asarray(agent_points, dtype=float)
+
+    k = min(len(orders), max_candidates)
+    if len(agents) > k:
+        # Flat projection around the batch's latitude; only used to pick candidates.
+        scale = np.array([1.0, np.cos(np.radians(orders[:, 0].mean()))])
+        _, nearest = cKDTree(agents * scale).query(orders * scale, k=k)
+        candidates = np.unique(nearest)
+        agents = agents[candidates]
+    else:
+        candidates = np.arange(len(agents))
+
+    distances = distance_matrix_km(orders, agents)
+    rows, cols = linear_sum_assignment(distances)
+    return [(int(row), int(candidates[col]), float(distances[row, col])) for row, col in zip(rows, cols)]
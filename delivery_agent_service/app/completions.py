@@ -0,0 +1,178 @@
+import asyncio
+from datetime import timedelta
+from typing import List, Optional
+
+from fastapi import HTTPException
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from app import crud
+from app import external_services
+from app.models import DeliveryAgent, PendingCompletion
+
+class CompletionWorker:
+    """
+    Runs delivery completions as a saga of short steps, so no database connection
+    is held while restaurant_service is being called:
+
+    1. the completion is recorded in pending_completions (one autocommit insert);
+    2. the order is marked delivered over HTTP, with no transaction open;
+    3. one short transaction frees the agent and deletes the record.
+
+    When step 2 fails with a timeout, connection error or 5xx, the record stays
+    and the background loop retries it with backoff, claiming due records with
+    SKIP LOCKED and a lease like restaurant_service's assignment dispatcher. When
+    restaurant_service refuses the transition (4xx) and the order was not already
+    delivered by this agent, the saga is compensated: the record is dropped and
+    the agent stays busy, exactly as before the request. Records that still fail
+    after `max_attempts` are compensated the same way and logged.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 30,
+        max_backoff: int = 60,
+        max_attempts: int = 50,
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+
+        self.completed = 0
+        self.retries = 0
+        self.compensated = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    async def begin(self, order_id: int, agent_id: int) -> Optional[PendingCompletion]:
+        """Step 1. Returns None when the order already has a completion in progress."""
+        return await crud.begin_completion(order_id, agent_id, self.lease_seconds)
+
+    async def attempt(self, completion: PendingCompletion) -> Optional[DeliveryAgent]:
+        """
+        Steps 2 and 3. Returns the freed agent once the order is delivered, or None
+        when the completion was rescheduled. Re-raises restaurant_service's error
+        after compensating a refused completion.
+        """
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await external_services.update_order_status_in_restaurant_service(completion.order_id, "delivered")
+        except HTTPException as exc:
+            if exc.status_code >= 500:
+                await self._reschedule(completion, exc.detail)
+                return None
+            delivered = await self._already_delivered(completion)
+            if delivered is None:
+                await self._reschedule(completion, exc.detail)
+                return None
+            if not delivered:
+                await self._compensate(completion, exc.detail)
+                raise
+            # An earlier attempt went through but its response was lost.
+        finally:
+            self.in_flight -= 1
+
+        agent = await crud.finish_completion(completion)
+        latency = (timezone.now() - completion.created_at).total_seconds()
+        self.completed += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        return agent
+
+    async def _already_delivered(self, completion: PendingCompletion) -> Optional[bool]:
+        """Whether the order is delivered by this agent; None when restaurant_service cannot tell right now."""
+        try:
+            order = await external_services.get_order_details_from_restaurant_service(completion.order_id)
+        except HTTPException as exc:
+            return None if exc.status_code >= 500 else False
+        return order.get("status") == "delivered" and order.get("assigned_agent_id") == completion.agent_id
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                handled = await self.retry_once()
+            except Exception as e:
+                print(f"ERROR: Delivery completion retry batch failed: {str(e)}")
+                handled = 0
+            if handled < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def retry_once(self) -> int:
+        """Claims one batch of due completions and retries them. Returns how many were claimed."""
+        completions = await self._claim_batch()
+        results = await asyncio.gather(*[self.attempt(completion) for completion in completions], return_exceptions=True)
+        for completion, result in zip(completions, results):
+            if isinstance(result, Exception) and not isinstance(result, HTTPException):
+                print(f"ERROR: Completion of order {completion.order_id} failed: {str(result)}")
+        return len(completions)
+
+    async def _claim_batch(self) -> List[PendingCompletion]:
+        now = timezone.now()
+        async with in_transaction("default"):
+            completions = await PendingCompletion.filter(
+                next_attempt_at__lte=now
+            ).order_by("id").limit(self.batch_size).select_for_update(skip_locked=True)
+            if completions:
+                await PendingCompletion.filter(id__in=[completion.id for completion in completions]).update(
+                    next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+                )
+        return completions
+
+    async def _reschedule(self, completion: PendingCompletion, error: str):
+        attempts = completion.attempts + 1
+        if attempts >= self.max_attempts:
+            await self._compensate(completion, f"gave up after {attempts} attempts: {error}")
+            return
+        print(f"WARNING: Completion of order {completion.order_id} failed (attempt {attempts}): {error}")
+        backoff = min(self.max_backoff, 2 ** completion.attempts)
+        await PendingCompletion.filter(id=completion.id).update(
+            attempts=attempts,
+            last_error=error,
+            next_attempt_at=timezone.now() + timedelta(seconds=backoff),
+        )
+        self.retries += 1
+
+    async def _compensate(self, completion: PendingCompletion, error: str):
+        # Nothing local changed before step 3, so dropping the record undoes the saga.
+        print(f"ERROR: Completion of order {completion.order_id} by agent {completion.agent_id} abandoned: {error}")
+        await PendingCompletion.filter(id=completion.id).delete()
+        self.compensated += 1
+
+    async def stats(self) -> dict:
+        now = timezone.now()
+        oldest = await PendingCompletion.all().order_by("created_at").first()
+        return {
+            "pending": await PendingCompletion.all().count(),
+            "due": await PendingCompletion.filter(next_attempt_at__lte=now).count(),
+            "oldest_pending_seconds": (now - oldest.created_at).total_seconds() if oldest else 0.0,
+            "in_flight_calls": self.in_flight,
+            "max_in_flight_calls": self.max_in_flight,
+            "completed": self.completed,
+            "retries": self.retries,
+            "compensated": self.compensated,
+            "last_latency_seconds": self.last_latency,
+            "max_latency_seconds": self.max_latency,
+        }
+
+completion_worker = CompletionWorker()
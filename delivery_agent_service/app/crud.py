@@ -1,23 +1,429 @@
-from typing import Optional, List
+import asyncio
+from datetime import timedelta, timezone as dt_timezone
+from typing import Optional, List, Set, Tuple
+from tortoise import timezone
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
 from tortoise.transactions import in_transaction
 
-from app.models import DeliveryAgent
-from app.schemas import DeliveryAgentIn
+from app.agent_index import agent_index
+from app.agent_pool import agent_pool
+from app.batch_assignment import solve_assignment
+from app.config import AGENT_POOL_MODE, STACK_RADIUS_KM, STACK_WINDOW_SECONDS
+from app.db import read_connection, recent_writes
+from app.locations import agent_locations
+from app.models import DeliveryAgent, PendingCompletion
+from app.schemas import BatchAssignmentItem, BatchAssignmentOrder, DeliveryAgentIn, LocationPing
+from app.stacking import degree_box, stacking_candidates
 
-async def get_available_agent() -> Optional[DeliveryAgent]:
-    async with in_transaction():
-        agent = await DeliveryAgent.filter(available=True).first()
-        return agent
+# Agents carry up to `capacity` orders at once; `active_deliveries` counts the
+# ones in agent_deliveries. `available` means idle (no active delivery): only
+# idle agents take a fresh order, agents with spare capacity only get orders
+# stacked onto a pickup they are already heading to.
+AGENT_COLUMNS = "id, name, available, capacity, active_deliveries, latitude, longitude"
+
+# Picks the first free agent, skipping rows another transaction is already
+# claiming, and flips it to busy in the same statement. Concurrent callers
+# therefore never block on (or both win) the same agent.
+CLAIM_AVAILABLE_AGENT_SQL = f"""
+UPDATE delivery_agents
+SET available = FALSE, active_deliveries = active_deliveries + 1
+WHERE id = (
+    SELECT id FROM delivery_agents
+    WHERE available = TRUE
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+AND available = TRUE
+RETURNING {AGENT_COLUMNS}
+"""
+
+# Claims one specific agent if it is still free.
+CLAIM_AGENT_SQL = f"""
+UPDATE delivery_agents
+SET available = FALSE, active_deliveries = active_deliveries + 1
+WHERE id = $1 AND available = TRUE
+RETURNING {AGENT_COLUMNS}
+"""
+
+# Adds an order to an agent that is already out with others, if it still has room.
+# The row lock makes the capacity check and the increment atomic.
+CLAIM_STACKED_AGENT_SQL = f"""
+UPDATE delivery_agents
+SET active_deliveries = active_deliveries + 1
+WHERE id = $1 AND active_deliveries > 0 AND active_deliveries < capacity
+RETURNING {AGENT_COLUMNS}
+"""
+
+# Recent pickups inside a lat/lng box whose agent still has room for another order.
+STACKING_CANDIDATES_SQL = """
+SELECT delivery.agent_id, delivery.pickup_latitude, delivery.pickup_longitude
+FROM agent_deliveries AS delivery
+JOIN delivery_agents AS agent ON agent.id = delivery.agent_id
+WHERE agent.active_deliveries < agent.capacity
+AND delivery.assigned_at >= $5
+AND delivery.pickup_latitude BETWEEN $1 AND $2
+AND delivery.pickup_longitude BETWEEN $3 AND $4
+"""
+
+# Serialises assignments of the same order until the transaction ends, so two
+# calls cannot both find it unassigned and each claim an agent for it.
+LOCK_ORDER_SQL = "SELECT pg_advisory_xact_lock(hashtext('agent_deliveries'), $1)"
+
+# The same lock for many orders, taken in id order so concurrent batches cannot deadlock.
+LOCK_ORDERS_SQL = """
+SELECT pg_advisory_xact_lock(hashtext('agent_deliveries'), ordered.order_id)
+FROM (SELECT order_id FROM unnest($1::int[]) AS order_id ORDER BY order_id) AS ordered
+"""
+
+RECORD_DELIVERY_SQL = """
+INSERT INTO agent_deliveries (order_id, agent_id, pickup_latitude, pickup_longitude)
+VALUES ($1, $2, $3, $4)
+ON CONFLICT (order_id) DO NOTHING
+RETURNING order_id
+"""
+
+ACTIVE_DELIVERY_SQL = f"""
+SELECT {AGENT_COLUMNS} FROM delivery_agents
+WHERE id = (SELECT agent_id FROM agent_deliveries WHERE order_id = $1)
+"""
+
+async def assign_agent(
+    order_id: int, latitude: Optional[float] = None, longitude: Optional[float] = None
+) -> Tuple[Optional[DeliveryAgent], Optional[float], bool]:
+    """
+    Assigns an order to an agent and records it as one of the agent's active deliveries.
+
+    With a pickup location the order is first stacked onto an agent already
+    heading to a pickup within STACK_RADIUS_KM, then given to the nearest idle
+    agent, then to any idle agent. Returns the agent (None when nobody is free),
+    the distance to the pickup in km when known, and whether the order was
+    stacked. Asking again for an order that already has an agent returns that agent.
+    """
+    if AGENT_POOL_MODE == "memory":
+        return agent_pool.assign(order_id, latitude, longitude)
+
+    async with in_transaction("default") as connection:
+        await connection.execute_query(LOCK_ORDER_SQL, [order_id])
+        rows = await connection.execute_query_dict(ACTIVE_DELIVERY_SQL, [order_id])
+        if rows:
+            return DeliveryAgent(**rows[0]), None, False
+
+        agent, distance, stacked = None, None, False
+        if latitude is not None and longitude is not None:
+            agent, distance = await claim_stacked_agent(connection, latitude, longitude)
+            stacked = agent is not None
+            if agent is None:
+                agent, distance = await claim_nearest_agent(connection, latitude, longitude)
+        if agent is None:
+            agent = await claim_available_agent(connection)
+        if agent is None:
+            return None, None, False
+        recorded = await connection.execute_query_dict(RECORD_DELIVERY_SQL, [order_id, agent.id, latitude, longitude])
+        if not recorded:
+            # Only a writer bypassing the order lock gets here; roll the claim back.
+            raise RuntimeError(f"Order {order_id} was assigned concurrently; agent {agent.id} not claimed.")
+
+    recent_writes.mark("agent", agent.id)
+    return agent, distance, stacked
+
+async def claim_available_agent(connection: BaseDBAsyncClient) -> Optional[DeliveryAgent]:
+    """
+    Atomically claims a free agent and marks it unavailable.
+    Returns None when every agent is busy (or currently being claimed).
+    """
+    rows = await connection.execute_query_dict(CLAIM_AVAILABLE_AGENT_SQL)
+    if not rows:
+        return None
+    agent_index.remove(rows[0]["id"])
+    return DeliveryAgent(**rows[0])
+
+async def claim_nearest_agent(
+    connection: BaseDBAsyncClient, latitude: float, longitude: float
+) -> Tuple[Optional[DeliveryAgent], Optional[float]]:
+    """
+    Claims the free agent nearest to the given point, using the in-memory geo index.
+    Returns the agent and its distance in km, or (None, None) when no located
+    agent is free. Index entries that turn out to be taken already are dropped
+    and the next nearest is tried.
+    """
+    while True:
+        match = agent_index.nearest(latitude, longitude)
+        if match is None:
+            return None, None
+        agent_id, distance = match
+        agent_index.remove(agent_id)
+        rows = await connection.execute_query_dict(CLAIM_AGENT_SQL, [agent_id])
+        if rows:
+            return DeliveryAgent(**rows[0]), distance
+
+async def claim_stacked_agent(
+    connection: BaseDBAsyncClient, latitude: float, longitude: float
+) -> Tuple[Optional[DeliveryAgent], Optional[float]]:
+    """
+    Claims spare capacity on the agent whose recent pickup is nearest to the given
+    one, within STACK_RADIUS_KM. Returns the agent and the distance between the
+    two pickups, or (None, None).
+    """
+    lat_delta, lng_delta = degree_box(latitude, STACK_RADIUS_KM)
+    rows = await connection.execute_query_dict(STACKING_CANDIDATES_SQL, [
+        latitude - lat_delta, latitude + lat_delta,
+        longitude - lng_delta, longitude + lng_delta,
+        timezone.now() - timedelta(seconds=STACK_WINDOW_SECONDS),
+    ])
+    candidates = [(row["agent_id"], row["pickup_latitude"], row["pickup_longitude"]) for row in rows]
+    for agent_id, distance in stacking_candidates(candidates, latitude, longitude, STACK_RADIUS_KM):
+        rows = await connection.execute_query_dict(CLAIM_STACKED_AGENT_SQL, [agent_id])
+        if rows:
+            return DeliveryAgent(**rows[0]), distance
+    return None, None
+
+# Claims whichever of the given agents are still free.
+CLAIM_AGENTS_SQL = """
+UPDATE delivery_agents
+SET available = FALSE, active_deliveries = active_deliveries + 1
+WHERE id = ANY($1::int[]) AND available = TRUE
+RETURNING id
+"""
+
+ASSIGNED_ORDERS_SQL = "SELECT order_id FROM agent_deliveries WHERE order_id = ANY($1::int[])"
+
+RECORD_DELIVERIES_SQL = """
+INSERT INTO agent_deliveries (order_id, agent_id, pickup_latitude, pickup_longitude)
+SELECT * FROM unnest($1::int[], $2::int[], $3::float8[], $4::float8[])
+ON CONFLICT (order_id) DO NOTHING
+RETURNING order_id
+"""
+
+async def claim_agents_for_orders(
+    orders: List[BatchAssignmentOrder], max_rounds: int = 3
+) -> Tuple[List[BatchAssignmentItem], List[int]]:
+    """
+    Matches many orders to free agents at once, minimising total pickup distance.
+    The matching runs in a worker thread with no connection held; each round then
+    claims its matched agents in one short transaction. Agents the index still
+    lists but that are already taken are skipped and the rest re-matched, up to
+    `max_rounds` times. Orders that already have an agent are left unassigned,
+    as in memory mode. Returns the assignments and the ids of unmatched orders.
+    """
+    if AGENT_POOL_MODE == "memory":
+        return await _assign_batch_in_memory(orders)
+
+    remaining = list(orders)
+    assignments: List[BatchAssignmentItem] = []
+    seen: Set[int] = set()
+    for _ in range(max_rounds):
+        if not remaining:
+            break
+        agents = [(agent_id, position) for agent_id, position in agent_index.items() if agent_id not in seen]
+        matches = await asyncio.to_thread(
+            solve_assignment,
+            [(order.latitude, order.longitude) for order in remaining], [position for _, position in agents],
+        )
+        if not matches:
+            break
+        wanted = {agents[agent][0]: (remaining[order], distance) for order, agent, distance in matches}
+
+        claimed: Set[int] = set()
+        assigned_orders = {}
+        async with in_transaction("default") as connection:
+            order_ids = [order.order_id for order, _ in wanted.values()]
+            await connection.execute_query(LOCK_ORDERS_SQL, [order_ids])
+            rows = await connection.execute_query_dict(ASSIGNED_ORDERS_SQL, [order_ids])
+            taken = {row["order_id"] for row in rows}
+            wanted = {agent_id: match for agent_id, match in wanted.items() if match[0].order_id not in taken}
+            if wanted:
+                rows = await connection.execute_query_dict(CLAIM_AGENTS_SQL, [list(wanted)])
+                claimed = {row["id"] for row in rows}
+            for agent_id in claimed:
+                order, _ = wanted[agent_id]
+                assigned_orders[order.order_id] = (agent_id, order)
+            if assigned_orders:
+                recorded = await connection.execute_query_dict(RECORD_DELIVERIES_SQL, [
+                    list(assigned_orders),
+                    [agent_id for agent_id, _ in assigned_orders.values()],
+                    [order.latitude for _, order in assigned_orders.values()],
+                    [order.longitude for _, order in assigned_orders.values()],
+                ])
+                if len(recorded) != len(assigned_orders):
+                    # Only a writer bypassing the order locks gets here; roll every claim back.
+                    raise RuntimeError("Orders in the batch were assigned concurrently; no agents claimed.")
+
+        seen.update(wanted)
+        for agent_id in claimed:
+            order, distance = wanted[agent_id]
+            assignments.append(BatchAssignmentItem(order_id=order.order_id, agent_id=agent_id, distance_km=distance))
+        remaining = [order for order in remaining if order.order_id not in assigned_orders and order.order_id not in taken]
+        if len(claimed) == len(wanted) and not taken:
+            # Nobody was stale, so every agent that could be matched was.
+            break
+
+    for agent_id in seen:
+        agent_index.remove(agent_id)
+    for item in assignments:
+        recent_writes.mark("agent", item.agent_id)
+    assigned = {item.order_id for item in assignments}
+    return assignments, [order.order_id for order in orders if order.order_id not in assigned]
+
+async def _assign_batch_in_memory(orders: List[BatchAssignmentOrder]) -> Tuple[List[BatchAssignmentItem], List[int]]:
+    # Every agent in the index is really free in memory mode, so one round suffices.
+    # Agents taken while the solver runs are caught by agent_pool.claim.
+    agents = agent_index.items()
+    matches = await asyncio.to_thread(
+        solve_assignment,
+        [(order.latitude, order.longitude) for order in orders], [position for _, position in agents],
+    )
+    assignments: List[BatchAssignmentItem] = []
+    for order_position, agent_position, distance in matches:
+        order, agent_id = orders[order_position], agents[agent_position][0]
+        if agent_pool.claim(agent_id, order.order_id, order.latitude, order.longitude):
+            assignments.append(BatchAssignmentItem(order_id=order.order_id, agent_id=agent_id, distance_km=distance))
+    assigned = {item.order_id for item in assignments}
+    return assignments, [order.order_id for order in orders if order.order_id not in assigned]
 
 async def create_delivery_agent(agent_in: DeliveryAgentIn) -> DeliveryAgent:
     new_agent = await DeliveryAgent.create(**agent_in.model_dump())
+    recent_writes.mark("agent", new_agent.id)
+    if AGENT_POOL_MODE == "memory":
+        agent_pool.add_agent(new_agent)
+    else:
+        _sync_agent_index(new_agent)
     return new_agent
 
 async def get_delivery_agent_by_id(agent_id: int) -> Optional[DeliveryAgent]:
+    if AGENT_POOL_MODE == "memory":
+        return agent_pool.get(agent_id)
     agent = await DeliveryAgent.get_or_none(id=agent_id)
     return agent
 
-async def update_agent_availability(agent: DeliveryAgent, available: bool) -> DeliveryAgent:
-    agent.available = available
-    await agent.save()
+async def read_delivery_agent_by_id(agent_id: int) -> Optional[DeliveryAgent]:
+    """Read-only lookup, served by the replica unless this agent was written recently."""
+    agent = await DeliveryAgent.filter(id=agent_id).using_db(read_connection("agent", agent_id)).first()
+    if agent is not None and AGENT_POOL_MODE == "memory":
+        agent_pool.overlay([agent])
+    return agent
+
+async def get_delivery_agents_by_ids(agent_ids: List[int]) -> List[DeliveryAgent]:
+    """Read-only bulk lookup, served by the replica unless any agent was written recently."""
+    agents = await DeliveryAgent.filter(id__in=agent_ids).using_db(read_connection("agent"))
+    return agent_pool.overlay(agents) if AGENT_POOL_MODE == "memory" else agents
+
+# Records a completion unless one for the order is already in progress.
+BEGIN_COMPLETION_SQL = """
+INSERT INTO "pending_completions" ("order_id", "agent_id", "next_attempt_at")
+VALUES ($1, $2, $3)
+ON CONFLICT ("order_id") DO NOTHING
+RETURNING id, order_id, agent_id, attempts, last_error, created_at, next_attempt_at
+"""
+
+# Completions of one agent serialize on its row, like claims do.
+LOCK_AGENT_SQL = f"SELECT {AGENT_COLUMNS} FROM delivery_agents WHERE id = $1 FOR UPDATE"
+
+END_DELIVERY_SQL = "DELETE FROM agent_deliveries WHERE order_id = $1 AND agent_id = $2 RETURNING order_id"
+
+ORDER_AGENT_SQL = "SELECT agent_id FROM agent_deliveries WHERE order_id = $1"
+
+# Ends one of an agent's deliveries once restaurant_service has confirmed it;
+# the agent is free again when it was the last one. Without a delivery row ($2
+# false) only load that agent_deliveries does not account for is released:
+# agents that were busy before the table existed (migration 0006).
+RELEASE_AGENT_SQL = f"""
+UPDATE delivery_agents
+SET active_deliveries = GREATEST(active_deliveries - 1, 0), available = active_deliveries <= 1
+WHERE id = $1
+AND ($2 OR active_deliveries > (SELECT count(*) FROM agent_deliveries WHERE agent_id = $1))
+RETURNING {AGENT_COLUMNS}
+"""
+
+async def begin_completion(order_id: int, agent_id: int, lease_seconds: int) -> Optional[PendingCompletion]:
+    """
+    Records a pending completion in a single autocommit statement, leased for
+    `lease_seconds` so the retry loop leaves it to the caller meanwhile.
+    Returns None when the order already has one.
+    """
+    conn = connections.get("default")
+    rows = await conn.execute_query_dict(
+        BEGIN_COMPLETION_SQL, [order_id, agent_id, timezone.now() + timedelta(seconds=lease_seconds)]
+    )
+    return PendingCompletion(**rows[0]) if rows else None
+
+async def finish_completion(completion: PendingCompletion) -> Optional[DeliveryAgent]:
+    """
+    Ends the agent's delivery and deletes the pending completion in one short transaction.
+    The agent's load only drops if it was carrying the order.
+    Returns the agent, or None if it no longer exists.
+    """
+    if AGENT_POOL_MODE == "memory":
+        await PendingCompletion.filter(id=completion.id).delete()
+        return agent_pool.complete(completion.order_id, completion.agent_id)
+
+    async with in_transaction("default") as connection:
+        rows = await _end_delivery(connection, completion.order_id, completion.agent_id, release_untracked=True)
+        await PendingCompletion.filter(id=completion.id).using_db(connection).delete()
+    return _released_agent(rows)
+
+async def release_order(order_id: int) -> Optional[DeliveryAgent]:
+    """
+    Frees the agent carrying `order_id` without completing the delivery, for orders
+    that no longer need one (e.g. rejected after the agent was claimed).
+    Returns None when no agent carries the order.
+    """
+    if AGENT_POOL_MODE == "memory":
+        return agent_pool.release(order_id)
+
+    async with in_transaction("default") as connection:
+        carrier = await connection.execute_query_dict(ORDER_AGENT_SQL, [order_id])
+        if not carrier:
+            return None
+        rows = await _end_delivery(connection, order_id, carrier[0]["agent_id"], release_untracked=False)
+    return _released_agent(rows)
+
+async def _end_delivery(connection: BaseDBAsyncClient, order_id: int, agent_id: int, release_untracked: bool) -> List[dict]:
+    """Deletes the delivery row and drops the agent's load if there was one. Returns the agent's row."""
+    rows = await connection.execute_query_dict(LOCK_AGENT_SQL, [agent_id])
+    if not rows:
+        return rows
+    ended = await connection.execute_query_dict(END_DELIVERY_SQL, [order_id, agent_id])
+    released = []
+    if ended or release_untracked:
+        released = await connection.execute_query_dict(RELEASE_AGENT_SQL, [agent_id, bool(ended)])
+    if not released:
+        print(f"WARNING: Agent {agent_id} was not carrying order {order_id}; load left unchanged.")
+    return released or rows
+
+def _released_agent(rows: List[dict]) -> Optional[DeliveryAgent]:
+    if not rows:
+        return None
+    agent = DeliveryAgent(**rows[0])
+    recent_writes.mark("agent", agent.id)
+    _sync_agent_index(agent)
     return agent
+
+def _sync_agent_index(agent: DeliveryAgent):
+    """Keeps this process's geo index in step with a committed agent write."""
+    latest = agent_locations.position(agent.id)
+    latitude, longitude = latest[:2] if latest is not None else (agent.latitude, agent.longitude)
+    if agent.available and latitude is not None and longitude is not None:
+        agent_index.add(agent.id, latitude, longitude)
+    else:
+        agent_index.remove(agent.id)
+
+def record_locations(pings: List[LocationPing]) -> int:
+    """
+    Takes in location pings without touching the database; they are flushed in bulk later.
+    Free agents already in the geo index move right away. Returns how many pings were accepted.
+    """
+    accepted = 0
+    for ping in pings:
+        recorded_at = None
+        if ping.recorded_at is not None:
+            # A reading without an offset is UTC, not this server's local time.
+            stamp = ping.recorded_at
+            if stamp.tzinfo is None:
+                stamp = stamp.replace(tzinfo=dt_timezone.utc)
+            recorded_at = stamp.timestamp()
+        if agent_locations.record(ping.agent_id, ping.latitude, ping.longitude, recorded_at):
+            agent_index.move(ping.agent_id, ping.latitude, ping.longitude)
+            accepted += 1
+    return accepted
@@ -0,0 +1,96 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from app.config import DB_REPLICA_URL, REPLICA_STICKY_SECONDS
+
+class RecentWrites:
+    """
+    Remembers which entities this process wrote in the last `window` seconds.
+
+    Reads of those entities (or, with key=None, of any entity of that kind) go
+    to the primary, so a client that just wrote never reads an older replica copy.
+    """
+
+    def __init__(self, window: float, sweep_every: int = 1000):
+        self.window = window
+        self.sweep_every = sweep_every
+        self._written: Dict[Tuple[str, Optional[int]], float] = {}
+        self._marks = 0
+
+    def mark(self, kind: str, key: Optional[int] = None):
+        now = time.monotonic()
+        self._written[(kind, None)] = now
+        if key is not None:
+            self._written[(kind, key)] = now
+        self._marks += 1
+        if self._marks % self.sweep_every == 0:
+            cutoff = now - self.window
+            self._written = {k: t for k, t in self._written.items() if t >= cutoff}
+
+    def is_recent(self, kind: str, key: Optional[int] = None) -> bool:
+        written_at = self._written.get((kind, key))
+        return written_at is not None and time.monotonic() - written_at < self.window
+
+    def __len__(self) -> int:
+        return len(self._written)
+
+recent_writes = RecentWrites(REPLICA_STICKY_SECONDS)
+read_counts = {"replica": 0, "primary": 0}
+
+def read_connection(kind: Optional[str] = None, key: Optional[int] = None) -> BaseDBAsyncClient:
+    """
+    Connection for a read-only query: the replica when one is configured,
+    unless `kind`/`key` was written by this process within the sticky window.
+    """
+    if DB_REPLICA_URL is None or (kind is not None and recent_writes.is_recent(kind, key)):
+        read_counts["primary"] += 1
+        return connections.get("default")
+    read_counts["replica"] += 1
+    return connections.get("replica")
+
+async def replica_stats() -> dict:
+    """
+    Read routing counters and the replica's replay lag.
+    Lag is measured on the replica itself and overstates the
+    real lag while the primary is idle, since nothing new is being replayed.
+    """
+    stats = {
+        "replica_configured": DB_REPLICA_URL is not None,
+        "sticky_seconds": recent_writes.window,
+        "tracked_writes": len(recent_writes),
+        "replica_reads": read_counts["replica"],
+        "primary_reads": read_counts["primary"],
+        "lag_seconds": None,
+    }
+    if DB_REPLICA_URL is None:
+        return stats
+    rows = await connections.get("replica").execute_query_dict(
+        "SELECT CASE WHEN pg_is_in_recovery() "
+        "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag_seconds"
+    )
+    lag = rows[0]["lag_seconds"]
+    stats["lag_seconds"] = float(lag) if lag is not None else None
+    return stats
+
+def pool_stats() -> dict:
+    """
+    Size and occupancy of each connection pool (asyncpg only).
+    `in_use` counts connections checked out by queries or open transactions.
+    """
+    stats = {}
+    for name in ("default", "replica") if DB_REPLICA_URL is not None else ("default",):
+        pool = getattr(connections.get(name), "_pool", None)
+        if pool is None:
+            stats[name] = None
+            continue
+        size = pool.get_size()
+        stats[name] = {
+            "size": size,
+            "idle": pool.get_idle_size(),
+            "in_use": size - pool.get_idle_size(),
+            "max_size": pool.get_max_size(),
+        }
+    return stats
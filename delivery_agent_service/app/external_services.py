@@ -2,8 +2,9 @@ import httpx
 from fastapi import HTTPException, status
 from typing import Dict, Any
 
-restaurant_service_client = httpx.AsyncClient(base_url="http://restaurant_service:8001", timeout=5.0)
-# restaurant_service_client = httpx.AsyncClient(base_url="http://localhost:8001", timeout=5.0)
+from app.config import RESTAURANT_SERVICE_URL
+
+restaurant_service_client = httpx.AsyncClient(base_url=RESTAURANT_SERVICE_URL, timeout=5.0)
 
 async def get_order_details_from_restaurant_service(order_id: int) -> Dict[str, Any]:
     try:
@@ -0,0 +1,193 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from tortoise import connections
+
+from app.config import LOCATION_MAX_CLOCK_SKEW_SECONDS
+
+# Writes the newest position of many agents in one statement. A position older
+# than the stored one (e.g. flushed late by another process) is skipped.
+FLUSH_LOCATIONS_SQL = """
+UPDATE delivery_agents AS agent
+SET latitude = ping.latitude, longitude = ping.longitude, location_updated_at = ping.recorded_at
+FROM unnest($1::int[], $2::float8[], $3::float8[], $4::timestamptz[]) AS ping(id, latitude, longitude, recorded_at)
+WHERE agent.id = ping.id
+AND (agent.location_updated_at IS NULL OR agent.location_updated_at <= ping.recorded_at)
+RETURNING agent.id
+"""
+
+# (latitude, longitude, recorded_at as a unix timestamp)
+Position = Tuple[float, float, float]
+
+class AgentLocationTracker:
+    """
+    Latest reported position of every agent, held in memory and written to
+    Postgres in coalesced bulk updates.
+
+    A ping updates the in-memory table immediately. Every `flush_interval`
+    seconds only the newest position per agent since the last flush is written,
+    `chunk_size` agents per statement, so the database sees one row update per
+    agent per interval however often the agent reports. When more than
+    `max_pending` agents are waiting for a flush, pings from further agents are
+    dropped and counted. Pings stamped more than `max_clock_skew` seconds in the
+    future are rejected and counted, since they would make every later ping stale.
+
+    Pings are not checked against delivery_agents on the way in. A flush drops
+    positions that matched no agent row from memory, and at most `max_tracked`
+    positions are kept, the least recently reported evicted first; reads of a
+    dropped agent fall back to the database.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        max_pending: int = 100000,
+        chunk_size: int = 5000,
+        max_tracked: int = 200000,
+        max_clock_skew: float = 30.0,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.max_tracked = max_tracked
+        self.max_clock_skew = max_clock_skew
+        self._latest: "OrderedDict[int, Position]" = OrderedDict()
+        self._pending: Dict[int, Position] = {}
+        self._oldest_pending: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.received = 0
+        self.stale = 0
+        self.future = 0
+        self.dropped = 0
+        self.unknown_or_superseded = 0
+        self.evicted = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.flushed_positions = 0
+        self.last_flush_lag = 0.0
+        self.last_flush_duration = 0.0
+
+    def record(self, agent_id: int, latitude: float, longitude: float, recorded_at: Optional[float] = None) -> bool:
+        """
+        Stores a ping. Returns False when it is older than the agent's last one,
+        stamped too far in the future, or the buffer is full.
+        """
+        now = time.time()
+        recorded_at = recorded_at if recorded_at is not None else now
+        if recorded_at > now + self.max_clock_skew:
+            self.future += 1
+            return False
+        latest = self._latest.get(agent_id)
+        if latest is not None and recorded_at < latest[2]:
+            self.stale += 1
+            return False
+        if agent_id not in self._pending and len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        position = (latitude, longitude, recorded_at)
+        self._latest[agent_id] = position
+        self._latest.move_to_end(agent_id)
+        while len(self._latest) > self.max_tracked:
+            self._latest.popitem(last=False)
+            self.evicted += 1
+        self._pending[agent_id] = position
+        if self._oldest_pending is None:
+            self._oldest_pending = time.monotonic()
+        self.received += 1
+        return True
+
+    def position(self, agent_id: int) -> Optional[Position]:
+        return self._latest.get(agent_id)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush_once()
+        except Exception as e:
+            print(f"ERROR: Final agent location flush failed: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_once()
+            except Exception as e:
+                print(f"ERROR: Agent location flush failed: {str(e)}")
+
+    async def flush_once(self) -> int:
+        """Writes every pending position. Returns the number of agents updated."""
+        if not self._pending:
+            return 0
+        started = time.perf_counter()
+        batch, self._pending = self._pending, {}
+        oldest, self._oldest_pending = self._oldest_pending, None
+
+        items: List[Tuple[int, Position]] = list(batch.items())
+        updated: Set[int] = set()
+        conn = connections.get("default")
+        try:
+            for start in range(0, len(items), self.chunk_size):
+                chunk = items[start:start + self.chunk_size]
+                rows = await conn.execute_query_dict(FLUSH_LOCATIONS_SQL, [
+                    [agent_id for agent_id, _ in chunk],
+                    [position[0] for _, position in chunk],
+                    [position[1] for _, position in chunk],
+                    [datetime.fromtimestamp(position[2], timezone.utc) for _, position in chunk],
+                ])
+                updated.update(row["id"] for row in rows)
+        except Exception:
+            # Put the batch back unless a newer ping arrived meanwhile; rewriting
+            # the chunks that did succeed is harmless.
+            for agent_id, position in batch.items():
+                self._pending.setdefault(agent_id, position)
+            if oldest is not None:
+                self._oldest_pending = min(oldest, self._oldest_pending or oldest)
+            self.flush_failures += 1
+            raise
+
+        # Unknown ids and positions superseded in the database match no row.
+        # Neither is worth keeping in memory unless a newer ping came in since.
+        for agent_id, position in items:
+            if agent_id not in updated and self._latest.get(agent_id) == position:
+                del self._latest[agent_id]
+        self.unknown_or_superseded += len(items) - len(updated)
+        self.flushes += 1
+        self.flushed_positions += len(updated)
+        self.last_flush_lag = time.monotonic() - oldest if oldest is not None else 0.0
+        self.last_flush_duration = time.perf_counter() - started
+        return len(updated)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_agents": len(self._latest),
+            "max_tracked": self.max_tracked,
+            "pending": len(self._pending),
+            "flush_lag_seconds": time.monotonic() - self._oldest_pending if self._oldest_pending is not None else 0.0,
+            "last_flush_lag_seconds": self.last_flush_lag,
+            "last_flush_duration_seconds": self.last_flush_duration,
+            "received": self.received,
+            "stale": self.stale,
+            "future": self.future,
+            "dropped": self.dropped,
+            "unknown_or_superseded": self.unknown_or_superseded,
+            "evicted": self.evicted,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "flushed_positions": self.flushed_positions,
+        }
+
+agent_locations = AgentLocationTracker(max_clock_skew=LOCATION_MAX_CLOCK_SKEW_SECONDS)
@@ -0,0 +1,6 @@
+-- Baseline schema, as previously produced by generate_schemas.
+CREATE TABLE IF NOT EXISTS "delivery_agents" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "name" VARCHAR(100) NOT NULL,
+    "available" BOOL NOT NULL DEFAULT True
+);
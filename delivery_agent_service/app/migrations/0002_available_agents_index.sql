@@ -0,0 +1,2 @@
+-- Assignment picks the lowest-id free agent; only free agents are indexed.
+CREATE INDEX IF NOT EXISTS "idx_delivery_agents_available_id" ON "delivery_agents" ("id") WHERE "available";
@@ -0,0 +1,2 @@
+ALTER TABLE "delivery_agents" ADD COLUMN IF NOT EXISTS "latitude" DOUBLE PRECISION;
+ALTER TABLE "delivery_agents" ADD COLUMN IF NOT EXISTS "longitude" DOUBLE PRECISION;
@@ -0,0 +1 @@
+ALTER TABLE "delivery_agents" ADD COLUMN IF NOT EXISTS "location_updated_at" TIMESTAMPTZ;
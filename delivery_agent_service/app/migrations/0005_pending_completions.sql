@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS "pending_completions" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "order_id" INT NOT NULL UNIQUE,
+    "agent_id" INT NOT NULL,
+    "attempts" INT NOT NULL DEFAULT 0,
+    "last_error" TEXT,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "next_attempt_at" TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS "idx_pending_completions_next_attempt_at" ON "pending_completions" ("next_attempt_at");
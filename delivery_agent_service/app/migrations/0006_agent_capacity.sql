@@ -0,0 +1,19 @@
+-- Agents may carry several orders at once; available now means "has no active delivery".
+ALTER TABLE "delivery_agents" ADD COLUMN IF NOT EXISTS "capacity" INT NOT NULL DEFAULT 1;
+ALTER TABLE "delivery_agents" ADD COLUMN IF NOT EXISTS "active_deliveries" INT NOT NULL DEFAULT 0;
+-- Busy agents were carrying exactly one order.
+UPDATE "delivery_agents" SET "active_deliveries" = 1 WHERE NOT "available";
+
+CREATE TABLE IF NOT EXISTS "agent_deliveries" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "order_id" INT NOT NULL UNIQUE,
+    "agent_id" INT NOT NULL,
+    "pickup_latitude" DOUBLE PRECISION,
+    "pickup_longitude" DOUBLE PRECISION,
+    "assigned_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS "idx_agent_deliveries_agent_id" ON "agent_deliveries" ("agent_id");
+-- Stacking looks up recent pickups inside a small lat/lng box.
+CREATE INDEX IF NOT EXISTS "idx_agent_deliveries_pickup" ON "agent_deliveries" ("pickup_latitude", "pickup_longitude")
+WHERE "pickup_latitude" IS NOT NULL;
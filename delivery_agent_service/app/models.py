@@ -1,13 +1,57 @@
 from tortoise import fields
 from tortoise.models import Model
 
+# Tables and indexes are created by the SQL files in app/migrations;
+# every model change needs a matching migration there.
+
 class DeliveryAgent(Model):
     """
     Tortoise ORM model for a Delivery Agent.
     """
     id = fields.IntField(pk=True)
     name = fields.CharField(max_length=100)
+    # True while the agent has no active delivery; see crud.AGENT_COLUMNS.
     available = fields.BooleanField(default=True)
+    # Orders the agent can carry at once, and how many it is carrying now.
+    capacity = fields.IntField(default=1)
+    active_deliveries = fields.IntField(default=0)
+    # Last known position; agents without one are only picked when no located agent is free.
+    latitude = fields.FloatField(null=True)
+    longitude = fields.FloatField(null=True)
+    # Written in bulk by app.locations, never by agent.save().
+    location_updated_at = fields.DatetimeField(null=True)
 
     class Meta:
         table = "delivery_agents" 
+
+class PendingCompletion(Model):
+    """
+    A delivery completion whose order status update in restaurant_service has not
+    been confirmed yet. Written before the HTTP call and deleted, together with
+    freeing the agent, once it succeeds; see app.completions.
+    """
+    id = fields.IntField(pk=True)
+    order_id = fields.IntField(unique=True)
+    agent_id = fields.IntField()
+    attempts = fields.IntField(default=0)
+    last_error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    next_attempt_at = fields.DatetimeField()
+
+    class Meta:
+        table = "pending_completions"
+
+class AgentDelivery(Model):
+    """
+    An order an agent is currently carrying, with its pickup location.
+    Written on assignment and deleted when the delivery is completed.
+    """
+    id = fields.IntField(pk=True)
+    order_id = fields.IntField(unique=True)
+    agent_id = fields.IntField()
+    pickup_latitude = fields.FloatField(null=True)
+    pickup_longitude = fields.FloatField(null=True)
+    assigned_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "agent_deliveries"
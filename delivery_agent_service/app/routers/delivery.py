@@ -1,14 +1,25 @@
-from fastapi import APIRouter, HTTPException, status
-from tortoise.transactions import in_transaction
+from datetime import datetime, timezone
+from typing import List
+from fastapi import APIRouter, HTTPException, Query, Response, status
 
 from app import crud
 from app import external_services
+from app.completions import completion_worker
+from app.locations import agent_locations
 from app.schemas import (
     DeliveryAssignment,
     DeliveryAgentIn,
     DeliveryAgentOut,
     DeliveryComplete,
-    DeliveryCompletionResponse
+    DeliveryCompletionResponse,
+    DeliveryRelease,
+    LocationIn,
+    LocationPing,
+    LocationBatch,
+    LocationIngestResult,
+    AgentLocation,
+    BatchAssignmentIn,
+    BatchAssignmentResult,
 )
 
 router = APIRouter(
@@ -18,14 +29,51 @@ router = APIRouter(
 
 @router.post("/assign", response_model=dict) 
 async def assign_delivery(assignment: DeliveryAssignment):
-    async with in_transaction():
-        agent = await crud.get_available_agent()
-        if not agent:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No available delivery agents at the moment.")
+    """
+    Assigns an agent to an order. With a pickup location the order is stacked onto
+    an agent already heading to a nearby pickup when one has room, otherwise it
+    goes to the nearest free agent; without one, to the lowest-id free agent.
+    """
+    agent, distance, stacked = await crud.assign_agent(assignment.order_id, assignment.latitude, assignment.longitude)
+    if not agent:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No available delivery agents at the moment.")
+
+    return {
+        "agent_id": agent.id,
+        "order_id": assignment.order_id,
+        "status": "assigned",
+        "distance_km": distance,
+        "stacked": stacked,
+    }
 
-        await crud.update_agent_availability(agent, False)
+@router.post("/assign/batch", response_model=BatchAssignmentResult)
+async def assign_delivery_batch(batch: BatchAssignmentIn):
+    """
+    Assigns free agents to many orders at once, minimising the total distance to the
+    pickup locations instead of serving each order greedily. Orders left without an
+    agent are listed in `unassigned`.
+    """
+    if len({order.order_id for order in batch.orders}) != len(batch.orders):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Each order may appear only once in a batch.")
+    assignments, unassigned = await crud.claim_agents_for_orders(batch.orders)
+    return BatchAssignmentResult(
+        assignments=assignments,
+        unassigned=unassigned,
+        total_distance_km=sum(item.distance_km for item in assignments),
+    )
 
-        return {"agent_id": agent.id, "order_id": assignment.order_id, "status": "assigned"}
+@router.post("/release", response_model=dict)
+async def release_delivery(release: DeliveryRelease):
+    """
+    Frees the agent claimed for an order that no longer needs one, e.g. because it
+    was rejected while the assignment was in flight. Safe to repeat.
+    """
+    agent = await crud.release_order(release.order_id)
+    return {
+        "order_id": release.order_id,
+        "agent_id": agent.id if agent else None,
+        "released": agent is not None,
+    }
 
 @router.post("/agents", response_model=DeliveryAgentOut)
 async def add_delivery_agent(agent_in: DeliveryAgentIn):
@@ -33,34 +81,95 @@ async def add_delivery_agent(agent_in: DeliveryAgentIn):
     return new_agent
 
 @router.post("/complete-delivery", response_model=DeliveryCompletionResponse)
-async def complete_delivery(delivery_complete: DeliveryComplete):
-      async with in_transaction():
-        agent = await crud.get_delivery_agent_by_id(delivery_complete.agent_id)
-        if not agent:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delivery agent not found.")
-
-        order_details = await external_services.get_order_details_from_restaurant_service(delivery_complete.order_id)
+async def complete_delivery(delivery_complete: DeliveryComplete, response: Response):
+    """
+    Marks the order delivered in restaurant_service and frees the agent.
+    No database connection is held during the HTTP calls (see app.completions).
+    If restaurant_service cannot be reached the completion is kept and retried in
+    the background, and 202 is returned with order_status_updated false.
+    """
+    agent = await crud.get_delivery_agent_by_id(delivery_complete.agent_id)
+    if not agent:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delivery agent not found.")
 
-        if order_details.get("assigned_agent_id") != delivery_complete.agent_id:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Agent {delivery_complete.agent_id} was not assigned to order {delivery_complete.order_id}.")
+    order_details = await external_services.get_order_details_from_restaurant_service(delivery_complete.order_id)
 
-        if order_details.get("status") in ["delivered", "rejected"]:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Order {delivery_complete.order_id} is already in '{order_details.get('status')}' status and cannot be completed.")
+    if order_details.get("assigned_agent_id") != delivery_complete.agent_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Agent {delivery_complete.agent_id} was not assigned to order {delivery_complete.order_id}.")
 
-        await crud.update_agent_availability(agent, True)
+    if order_details.get("status") in ["delivered", "rejected"]:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Order {delivery_complete.order_id} is already in '{order_details.get('status')}' status and cannot be completed.")
 
-        await external_services.update_order_status_in_restaurant_service(delivery_complete.order_id, "delivered")
+    completion = await completion_worker.begin(delivery_complete.order_id, delivery_complete.agent_id)
+    if completion is None:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return DeliveryCompletionResponse(
+            msg=f"Delivery for order {delivery_complete.order_id} is already being completed.",
+            agent_id=agent.id,
+            agent_available=agent.available,
+            order_status_updated=False
+        )
 
+    released = await completion_worker.attempt(completion)
+    if released is None:
+        response.status_code = status.HTTP_202_ACCEPTED
         return DeliveryCompletionResponse(
-            msg=f"Delivery for order {delivery_complete.order_id} completed successfully by agent {delivery_complete.agent_id}.",
+            msg=f"Delivery for order {delivery_complete.order_id} recorded; the order status update will be retried.",
             agent_id=agent.id,
             agent_available=agent.available,
-            order_status_updated=True
+            order_status_updated=False
         )
 
+    return DeliveryCompletionResponse(
+        msg=f"Delivery for order {delivery_complete.order_id} completed successfully by agent {delivery_complete.agent_id}.",
+        agent_id=released.id,
+        agent_available=released.available,
+        order_status_updated=True
+    )
+
+@router.get("/agents", response_model=List[DeliveryAgentOut])
+async def get_delivery_agents(ids: List[int] = Query(...)):
+    return await crud.get_delivery_agents_by_ids(ids)
+
+@router.post("/agents/locations", response_model=LocationIngestResult, status_code=status.HTTP_202_ACCEPTED)
+async def report_agent_locations(batch: LocationBatch):
+    """
+    Takes in many agents' location pings at once.
+    Positions are visible immediately and written to the database in bulk shortly after.
+    """
+    accepted = crud.record_locations(batch.pings)
+    return LocationIngestResult(accepted=accepted, rejected=len(batch.pings) - accepted)
+
+@router.post("/agents/{agent_id}/location", response_model=LocationIngestResult, status_code=status.HTTP_202_ACCEPTED)
+async def report_agent_location(agent_id: int, location: LocationIn):
+    accepted = crud.record_locations([LocationPing(agent_id=agent_id, **location.model_dump())])
+    return LocationIngestResult(accepted=accepted, rejected=1 - accepted)
+
+@router.get("/agents/{agent_id}/location", response_model=AgentLocation)
+async def get_agent_location(agent_id: int):
+    """
+    Latest known position of an agent, from memory when this process received it.
+    """
+    latest = agent_locations.position(agent_id)
+    if latest is not None:
+        latitude, longitude, recorded_at = latest
+        return AgentLocation(
+            agent_id=agent_id, latitude=latitude, longitude=longitude,
+            recorded_at=datetime.fromtimestamp(recorded_at, timezone.utc),
+        )
+
+    agent = await crud.read_delivery_agent_by_id(agent_id)
+    if not agent:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delivery agent not found.")
+    if agent.latitude is None or agent.longitude is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delivery agent has not reported a location.")
+    return AgentLocation(
+        agent_id=agent_id, latitude=agent.latitude, longitude=agent.longitude, recorded_at=agent.location_updated_at
+    )
+
 @router.get("/agents/{agent_id}", response_model=DeliveryAgentOut)
 async def get_delivery_agent(agent_id: int):
-    agent = await crud.get_delivery_agent_by_id(agent_id)
+    agent = await crud.read_delivery_agent_by_id(agent_id)
     if not agent:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delivery agent not found.")
     return agent
@@ -1,27 +1,82 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 class DeliveryAssignment(BaseModel):
 
     order_id: int
+    # Pickup location; when given the nearest free agent is assigned.
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+class BatchAssignmentOrder(BaseModel):
+    order_id: int
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+class BatchAssignmentIn(BaseModel):
+    orders: List[BatchAssignmentOrder] = Field(min_length=1, max_length=1000)
+
+class BatchAssignmentItem(BaseModel):
+    order_id: int
+    agent_id: int
+    distance_km: float
+
+class BatchAssignmentResult(BaseModel):
+    assignments: List[BatchAssignmentItem]
+    unassigned: List[int]
+    total_distance_km: float
 
 class DeliveryAgentIn(BaseModel):
 
     name: str
     available: bool = True
+    capacity: int = Field(1, ge=1, le=10)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class DeliveryAgentOut(BaseModel):
 
     id: int
     name: str
     available: bool
+    capacity: int = 1
+    active_deliveries: int = 0
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         from_attributes = True
 
+class LocationIn(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    # When the device took the reading; defaults to the time the ping arrives.
+    recorded_at: Optional[datetime] = None
+
+class LocationPing(LocationIn):
+    agent_id: int
+
+class LocationBatch(BaseModel):
+    pings: List[LocationPing] = Field(max_length=10000)
+
+class LocationIngestResult(BaseModel):
+    accepted: int
+    rejected: int
+
+class AgentLocation(BaseModel):
+    agent_id: int
+    latitude: float
+    longitude: float
+    recorded_at: Optional[datetime] = None
+
 class DeliveryComplete(BaseModel):
     order_id: int
     agent_id: int
 
+class DeliveryRelease(BaseModel):
+    order_id: int
+
 class DeliveryCompletionResponse(BaseModel):
     msg: str
     agent_id: int
@@ -0,0 +1,27 @@
+import math
+from typing import Iterable, List, Tuple
+
+from app.agent_index import KM_PER_DEGREE, distance_km
+
+def degree_box(latitude: float, radius_km: float) -> Tuple[float, float]:
+    """Half-height and half-width, in degrees, of a box covering `radius_km` around a point."""
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return lat_delta, lng_delta
+
+def stacking_candidates(
+    pickups: Iterable[Tuple[int, float, float]], latitude: float, longitude: float, radius_km: float
+) -> List[Tuple[int, float]]:
+    """
+    Agents an order picked up at (latitude, longitude) could be stacked onto.
+
+    `pickups` are (agent_id, pickup_latitude, pickup_longitude) of deliveries in
+    progress on agents with spare capacity. Returns (agent_id, distance_km)
+    for pickups within `radius_km`, nearest first, each agent once.
+    """
+    nearest = {}
+    for agent_id, pickup_latitude, pickup_longitude in pickups:
+        distance = distance_km(latitude, longitude, pickup_latitude, pickup_longitude)
+        if distance <= radius_km and distance < nearest.get(agent_id, math.inf):
+            nearest[agent_id] = distance
+    return sorted(nearest.items(), key=lambda item: item[1])
@@ -0,0 +1,170 @@
+"""
+Simulator: orders delivered per agent-hour with single-order agents vs. agents
+that carry several orders and get new ones stacked onto a nearby pickup.
+
+Orders arrive at a steady rate from restaurants of skewed popularity inside a
+square delivery zone and go to customers within a few km. Time advances in
+5-second steps; agents drive at a fixed speed and spend a fixed handover time
+at every pickup and drop-off. Assignment follows POST /delivery/assign: an order is
+stacked onto an agent still heading to a pickup within the stacking radius
+(app.stacking.stacking_candidates) when capacity allows, otherwise it takes the
+nearest idle agent from the grid index; with nobody free it waits in a queue.
+No database is needed; run from the delivery_agent_service directory:
+
+    python -m benchmarks.agent_capacity --agents 100 --orders-per-minute 12 --hours 2 --capacity 3
+"""
+import argparse
+import random
+import statistics
+
+from app.agent_index import AgentGeoIndex, distance_km
+from app.stacking import stacking_candidates
+
+CENTER = (12.97, 77.59)
+STEP_SECONDS = 5.0
+
+
+def near(rng: random.Random, point, radius_km: float):
+    # Uniform in a square around the point is close enough here.
+    delta = radius_km / 111.32
+    return point[0] + rng.uniform(-delta, delta), point[1] + rng.uniform(-delta, delta)
+
+
+def order_dropoffs(start, dropoffs):
+    """Visits drop-offs nearest-neighbour first from `start`."""
+    ordered, position, remaining = [], start, list(dropoffs)
+    while remaining:
+        stop = min(remaining, key=lambda s: distance_km(position[0], position[1], s["point"][0], s["point"][1]))
+        remaining.remove(stop)
+        ordered.append(stop)
+        position = stop["point"]
+    return ordered
+
+
+def simulate(args, capacity: int) -> dict:
+    rng = random.Random(args.seed)
+    restaurants = [near(rng, CENTER, args.zone_km / 2) for _ in range(args.restaurants)]
+    weights = [1 / (rank + 1) for rank in range(args.restaurants)]
+    agents = [{"id": i, "point": near(rng, CENTER, args.zone_km / 2), "route": [], "dwell": 0.0, "active": 0} for i in range(args.agents)]
+    index = AgentGeoIndex()
+    index.reset({agent["id"]: agent["point"] for agent in agents})
+
+    step_km = args.speed_kmh * STEP_SECONDS / 3600
+    handover = args.handover_minutes * 60
+    total_steps = int(args.hours * 3600 / STEP_SECONDS)
+    queue, delivery_minutes, wait_minutes = [], [], []
+    created = stacked = 0
+    arrivals = 0.0
+
+    def assign(order, now) -> bool:
+        nonlocal stacked
+        pickup = order["restaurant"]
+        if capacity > 1:
+            pickups = [
+                (agent["id"], stop["point"][0], stop["point"][1])
+                for agent in agents if 0 < agent["active"] < capacity
+                for stop in agent["route"]
+                if stop["kind"] == "pickup" and now - stop["assigned_at"] <= args.stack_window
+            ]
+            candidates = stacking_candidates(pickups, pickup[0], pickup[1], args.stack_radius)
+            if candidates:
+                agent = agents[candidates[0][0]]
+                pickups_left = [stop for stop in agent["route"] if stop["kind"] == "pickup"]
+                dropoffs = [stop for stop in agent["route"] if stop["kind"] == "dropoff"]
+                pickups_left.append({"kind": "pickup", "point": pickup, "order": order, "assigned_at": now})
+                dropoffs.append({"kind": "dropoff", "point": order["customer"], "order": order})
+                agent["route"] = pickups_left + order_dropoffs(pickups_left[-1]["point"], dropoffs)
+                agent["active"] += 1
+                stacked += 1
+                order["assigned_at"] = now
+                return True
+        match = index.nearest(pickup[0], pickup[1])
+        if match is None:
+            return False
+        agent = agents[match[0]]
+        index.remove(agent["id"])
+        agent["route"] = [
+            {"kind": "pickup", "point": pickup, "order": order, "assigned_at": now},
+            {"kind": "dropoff", "point": order["customer"], "order": order},
+        ]
+        agent["active"] = 1
+        order["assigned_at"] = now
+        return True
+
+    for step in range(total_steps):
+        now = step * STEP_SECONDS
+        arrivals += args.orders_per_minute * STEP_SECONDS / 60
+        while arrivals >= 1:
+            arrivals -= 1
+            restaurant = rng.choices(restaurants, weights)[0]
+            queue.append({"restaurant": restaurant, "customer": near(rng, restaurant, args.delivery_radius), "created_at": now})
+            created += 1
+        queue = [order for order in queue if not assign(order, now)]
+
+        for agent in agents:
+            if not agent["route"]:
+                continue
+            if agent["dwell"] > 0:
+                agent["dwell"] -= STEP_SECONDS
+                continue
+            stop = agent["route"][0]
+            remaining = distance_km(agent["point"][0], agent["point"][1], stop["point"][0], stop["point"][1])
+            if remaining > step_km:
+                fraction = step_km / remaining
+                agent["point"] = (
+                    agent["point"][0] + (stop["point"][0] - agent["point"][0]) * fraction,
+                    agent["point"][1] + (stop["point"][1] - agent["point"][1]) * fraction,
+                )
+                continue
+            agent["point"] = stop["point"]
+            agent["dwell"] = handover
+            agent["route"].pop(0)
+            if stop["kind"] == "dropoff":
+                order = stop["order"]
+                delivery_minutes.append((now - order["created_at"]) / 60)
+                wait_minutes.append((order["assigned_at"] - order["created_at"]) / 60)
+                agent["active"] -= 1
+            if not agent["route"]:
+                index.add(agent["id"], agent["point"][0], agent["point"][1])
+
+    delivered = len(delivery_minutes)
+    return {
+        "created": created,
+        "delivered": delivered,
+        "stacked": stacked,
+        "queued_at_end": len(queue),
+        "per_agent_hour": delivered / (args.agents * args.hours),
+        "delivery_minutes": statistics.mean(delivery_minutes) if delivery_minutes else 0.0,
+        "wait_minutes": statistics.mean(wait_minutes) if wait_minutes else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--restaurants", type=int, default=60)
+    parser.add_argument("--zone-km", type=float, default=8.0, help="side of the square delivery zone")
+    parser.add_argument("--orders-per-minute", type=float, default=12.0)
+    parser.add_argument("--hours", type=float, default=2.0)
+    parser.add_argument("--capacity", type=int, default=3)
+    parser.add_argument("--speed-kmh", type=float, default=20.0)
+    parser.add_argument("--handover-minutes", type=float, default=1.0)
+    parser.add_argument("--delivery-radius", type=float, default=3.0, help="km from restaurant to customer")
+    parser.add_argument("--stack-radius", type=float, default=0.5, help="km, as STACK_RADIUS_KM")
+    parser.add_argument("--stack-window", type=float, default=600.0, help="seconds, as STACK_WINDOW_SECONDS")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{args.agents} agents, {args.orders_per_minute:g} orders/minute for {args.hours:g} h")
+    for capacity in sorted({1, args.capacity}):
+        result = simulate(args, capacity)
+        print(
+            f"capacity {capacity}: {result['per_agent_hour']:5.2f} orders/agent-hour  "
+            f"delivered {result['delivered']}/{result['created']}  stacked {result['stacked']}  "
+            f"queued at end {result['queued_at_end']}  "
+            f"wait {result['wait_minutes']:5.1f} min  order-to-door {result['delivery_minutes']:5.1f} min"
+        )
+
+
+if __name__ == "__main__":
+    main()
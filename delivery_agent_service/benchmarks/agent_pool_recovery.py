@@ -0,0 +1,179 @@
+"""
+Crash-recovery check for AGENT_POOL_MODE=memory.
+
+Starts the service with the in-memory agent pool against the migrated database
+in DB_PRIMARY_URL, plus a restaurant_service stand-in in this process. Workers
+assign and complete orders until the service is killed with SIGKILL, then the
+service is started again and the recovered state is checked:
+
+- every agent's active_deliveries matches its agent_deliveries rows, no agent
+  is over capacity and none with a delivery is marked available;
+- the restarted pool reports the same number of active deliveries as the table;
+- after more load on the recovered pool the same still holds.
+
+Assignments acknowledged within the last flush interval before the kill may be
+missing afterwards; they are counted and reported, not treated as failures.
+Run from the delivery_agent_service directory:
+
+    python -m benchmarks.agent_pool_recovery --agents 200 --kill-after 5
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import subprocess
+import sys
+import time
+
+import asyncpg
+import httpx
+import uvicorn
+
+from app.config import DB_URL
+from benchmarks.complete_delivery_load import stand_in_restaurant
+
+# Agents whose stored load disagrees with their delivery rows.
+INCONSISTENT_AGENTS_SQL = """
+SELECT agent.id, agent.available, agent.capacity, agent.active_deliveries, COALESCE(delivery.n, 0) AS rows
+FROM delivery_agents AS agent
+LEFT JOIN (SELECT agent_id, count(*) AS n FROM agent_deliveries GROUP BY agent_id) AS delivery
+ON delivery.agent_id = agent.id
+WHERE agent.name LIKE $1
+AND (agent.active_deliveries <> COALESCE(delivery.n, 0)
+     OR COALESCE(delivery.n, 0) > agent.capacity
+     OR (COALESCE(delivery.n, 0) > 0 AND agent.available))
+"""
+
+
+def start_service(port: int, stand_in_port: int, flush_seconds: float) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "AGENT_POOL_MODE": "memory",
+        "AGENT_POOL_FLUSH_SECONDS": str(flush_seconds),
+        "RESTAURANT_SERVICE_URL": f"http://localhost:{stand_in_port}",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"], env=env
+    )
+
+
+async def wait_healthy(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("delivery agent service did not become healthy")
+
+
+async def drive(client: httpx.AsyncClient, rng: random.Random, assigned: dict, completed: set, first_order: int, stop: asyncio.Event, workers: int):
+    """Assigns and completes orders until `stop` is set or the service goes away."""
+    order_ids = itertools.count(first_order)
+
+    async def worker():
+        while not stop.is_set():
+            order_id = next(order_ids)
+            try:
+                resp = await client.post("/delivery/assign", json={
+                    "order_id": order_id, "latitude": rng.uniform(12.90, 13.05), "longitude": rng.uniform(77.50, 77.68),
+                })
+                if resp.status_code != 200:
+                    await asyncio.sleep(0.01)
+                    continue
+                agent_id = resp.json()["agent_id"]
+                assigned[order_id] = agent_id
+                if rng.random() < 0.7:
+                    resp = await client.post("/delivery/complete-delivery", json={"order_id": order_id, "agent_id": agent_id})
+                    if resp.status_code == 200:
+                        completed.add(order_id)
+            except httpx.TransportError:
+                return
+
+    await asyncio.gather(*[worker() for _ in range(workers)])
+
+
+async def check(conn: asyncpg.Connection, client: httpx.AsyncClient, tag: str) -> bool:
+    bad = await conn.fetch(INCONSISTENT_AGENTS_SQL, f"{tag}%")
+    for row in bad[:10]:
+        print(f"  inconsistent agent {dict(row)}")
+    table_active = await conn.fetchval("SELECT count(*) FROM agent_deliveries")
+    pool = (await client.get("/metrics/agent-pool")).json()
+    print(f"  inconsistent agents: {len(bad)}  active deliveries: table {table_active}, pool {pool['active_deliveries']}")
+    return not bad and table_active == pool["active_deliveries"]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8012)
+    parser.add_argument("--stand-in-port", type=int, default=8011)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--capacity", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--kill-after", type=float, default=5.0, help="seconds of load before SIGKILL")
+    parser.add_argument("--flush-seconds", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tag = f"recovery-{int(time.time())}-"
+    assigned, completed = {}, set()
+    stand_in = uvicorn.Server(uvicorn.Config(stand_in_restaurant(0.0, assigned), port=args.stand_in_port, log_level="warning"))
+    stand_in_task = asyncio.create_task(stand_in.serve())
+
+    service = start_service(args.port, args.stand_in_port, args.flush_seconds)
+    conn = await asyncpg.connect(DB_URL)
+    ok = False
+    try:
+        async with httpx.AsyncClient(base_url=f"http://localhost:{args.port}", timeout=10.0) as client:
+            await wait_healthy(client)
+            for i in range(args.agents):
+                await client.post("/delivery/agents", json={
+                    "name": f"{tag}{i}", "capacity": args.capacity,
+                    "latitude": rng.uniform(12.90, 13.05), "longitude": rng.uniform(77.50, 77.68),
+                })
+
+            stop = asyncio.Event()
+            # Unique across runs (a thousand per second of wall time) and within Postgres INT.
+            first_order = 1_000_000_000 + int(time.time()) % 1_000_000 * 1000
+            load = asyncio.create_task(drive(client, rng, assigned, completed, first_order, stop, args.workers))
+            await asyncio.sleep(args.kill_after)
+            service.kill()
+            service.wait()
+            stop.set()
+            await load
+            print(f"killed after {len(assigned)} assignments and {len(completed)} completions")
+
+            service = start_service(args.port, args.stand_in_port, args.flush_seconds)
+            await wait_healthy(client)
+            rows = await conn.fetch("SELECT order_id FROM agent_deliveries WHERE order_id >= $1", first_order)
+            stored = {row["order_id"] for row in rows}
+            open_orders = set(assigned) - completed
+            print(f"after restart: {len(open_orders - stored)} acknowledged assignments lost, "
+                  f"{len(stored & completed)} acknowledged completions lost (flush interval {args.flush_seconds}s)")
+            ok = await check(conn, client, tag)
+
+            stop = asyncio.Event()
+            load = asyncio.create_task(drive(client, rng, assigned, completed, max(assigned, default=first_order) + 1, stop, args.workers))
+            await asyncio.sleep(2.0)
+            stop.set()
+            await load
+            await asyncio.sleep(args.flush_seconds * 5)
+            print("after more load on the recovered pool:")
+            ok = await check(conn, client, tag) and ok
+    finally:
+        service.terminate()
+        service.wait()
+        await conn.close()
+        stand_in.should_exit = True
+        await stand_in_task
+
+    print("recovery check " + ("passed" if ok else "FAILED"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Concurrency benchmark for POST /delivery/assign.
+
+Seeds a pool of free agents, fires many simultaneous assignment requests and
+reports throughput plus how many agents were handed out more than once.
+
+    python benchmarks/assign_concurrency.py --agents 300 --requests 300
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+
+async def seed_agents(client: httpx.AsyncClient, count: int):
+    await asyncio.gather(*[
+        client.post("/delivery/agents", json={"name": f"bench-agent-{i}", "available": True})
+        for i in range(count)
+    ])
+
+
+async def assign(client: httpx.AsyncClient, order_id: int):
+    resp = await client.post("/delivery/assign", json={"order_id": order_id})
+    if resp.status_code == 200:
+        return resp.json()["agent_id"]
+    return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8002")
+    parser.add_argument("--agents", type=int, default=300, help="free agents to seed before the run (0 to skip)")
+    parser.add_argument("--requests", type=int, default=300, help="simultaneous /assign calls")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.requests, max_keepalive_connections=args.requests)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        if args.agents:
+            await seed_agents(client, args.agents)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*[assign(client, order_id) for order_id in range(1, args.requests + 1)])
+        elapsed = time.perf_counter() - started
+
+    assigned = [agent_id for agent_id in results if agent_id is not None]
+    counts = Counter(assigned)
+    double_assigned = sum(n - 1 for n in counts.values() if n > 1)
+
+    print(f"requests:           {args.requests}")
+    print(f"assigned:           {len(assigned)}")
+    print(f"rejected (409/err): {args.requests - len(assigned)}")
+    print(f"distinct agents:    {len(counts)}")
+    print(f"double assignments: {double_assigned}")
+    print(f"elapsed:            {elapsed:.3f}s")
+    print(f"throughput:         {args.requests / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
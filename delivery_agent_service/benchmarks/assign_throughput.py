@@ -0,0 +1,103 @@
+"""
+Throughput of assign + complete cycles, for comparing AGENT_POOL_MODE=db with
+AGENT_POOL_MODE=memory.
+
+Starts a restaurant_service stand-in in this process, seeds located agents and
+runs `--concurrency` workers that each assign an order at a random pickup and
+complete it right away. Reports cycles per second and assignment latency for
+the mode the service reports. Run it once per mode against a fresh service:
+
+    RESTAURANT_SERVICE_URL=http://localhost:8011 AGENT_POOL_MODE=db uvicorn app.main:app --port 8002
+    python -m benchmarks.assign_throughput --agents 500 --cycles 5000 --concurrency 50
+
+    RESTAURANT_SERVICE_URL=http://localhost:8011 AGENT_POOL_MODE=memory uvicorn app.main:app --port 8002
+    python -m benchmarks.assign_throughput --agents 500 --cycles 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.complete_delivery_load import percentile, stand_in_restaurant
+
+MIN_LAT, MAX_LAT = 12.80, 13.16
+MIN_LNG, MAX_LNG = 77.40, 77.77
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8002")
+    parser.add_argument("--stand-in-port", type=int, default=8011)
+    parser.add_argument("--agents", type=int, default=500, help="located agents to seed before the run (0 to skip)")
+    parser.add_argument("--cycles", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    assigned = {}
+    server = uvicorn.Server(uvicorn.Config(stand_in_restaurant(0.0, assigned), port=args.stand_in_port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=args.concurrency + 10, max_keepalive_connections=args.concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        mode = (await client.get("/metrics/agent-pool")).json()["mode"]
+        for start in range(0, args.agents, 100):
+            await asyncio.gather(*[
+                client.post("/delivery/agents", json={
+                    "name": f"bench-agent-{i}",
+                    "latitude": rng.uniform(MIN_LAT, MAX_LAT),
+                    "longitude": rng.uniform(MIN_LNG, MAX_LNG),
+                })
+                for i in range(start, min(start + 100, args.agents))
+            ])
+
+        # Order ids unique across runs (a thousand per second of wall time), since
+        # agent_deliveries keys on them, and within Postgres INT.
+        order_ids = itertools.count(1_000_000_000 + int(time.time()) % 1_000_000 * 1000)
+        cycles = iter(range(args.cycles))
+        assign_ms, complete_ms = [], []
+        conflicts = 0
+
+        async def worker():
+            nonlocal conflicts
+            for _ in cycles:
+                order_id = next(order_ids)
+                payload = {"order_id": order_id, "latitude": rng.uniform(MIN_LAT, MAX_LAT), "longitude": rng.uniform(MIN_LNG, MAX_LNG)}
+                started = time.perf_counter()
+                resp = await client.post("/delivery/assign", json=payload)
+                assign_ms.append((time.perf_counter() - started) * 1000)
+                if resp.status_code != 200:
+                    conflicts += 1
+                    continue
+                agent_id = resp.json()["agent_id"]
+                assigned[order_id] = agent_id
+                started = time.perf_counter()
+                await client.post("/delivery/complete-delivery", json={"order_id": order_id, "agent_id": agent_id})
+                complete_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+        pool = (await client.get("/metrics/agent-pool")).json()
+
+    server.should_exit = True
+    await server_task
+
+    print(f"mode {mode}: {args.cycles} cycles with {args.concurrency} workers in {elapsed:.2f}s ({args.cycles / elapsed:.0f} cycles/s)")
+    print(f"assign    median {statistics.median(assign_ms):7.2f} ms  p99 {percentile(assign_ms, 0.99):7.2f} ms  (409s: {conflicts})")
+    if complete_ms:
+        print(f"complete  median {statistics.median(complete_ms):7.2f} ms  p99 {percentile(complete_ms, 0.99):7.2f} ms")
+    if mode == "memory":
+        print(f"pool flushes {pool['flushes']}  last flush {pool['last_flush_duration_seconds'] * 1000:.1f} ms  failures {pool['flush_failures']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
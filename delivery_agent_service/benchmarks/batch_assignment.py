@@ -0,0 +1,87 @@
+"""
+Simulator: batch (optimal) vs. sequential greedy assignment of orders to agents.
+
+Each round scatters free agents and a burst of pending orders over a city and
+assigns them twice: greedily, each order in arrival order taking the nearest
+free agent from the grid index (what POST /delivery/assign does), and in one go
+with app.batch_assignment.solve_assignment (what POST /delivery/assign/batch
+does). Reports total pickup distance and solve latency for both. No database
+is needed; run from the delivery_agent_service directory:
+
+    python -m benchmarks.batch_assignment --agents 2000 --orders 50 --rounds 20
+
+--max-candidates caps how many nearest agents per order the solver considers;
+set it to --orders for an exactly optimal matching.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.agent_index import AgentGeoIndex
+from app.batch_assignment import solve_assignment
+
+MIN_LAT, MAX_LAT = 12.80, 13.16
+MIN_LNG, MAX_LNG = 77.40, 77.77
+
+
+def random_point(rng: random.Random):
+    return rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG)
+
+
+def greedy(orders, index):
+    total = 0.0
+    for latitude, longitude in orders:
+        match = index.nearest(latitude, longitude)
+        if match is None:
+            break
+        agent, distance = match
+        index.remove(agent)
+        total += distance
+    return total
+
+
+def batch(orders, agents, max_candidates):
+    return sum(distance for _, _, distance in solve_assignment(orders, agents, max_candidates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--max-candidates", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = {"greedy": ([], []), "batch": ([], [])}
+    for _ in range(args.rounds):
+        agents = [random_point(rng) for _ in range(args.agents)]
+        orders = [random_point(rng) for _ in range(args.orders)]
+        # The service keeps its grid index built; only the lookups count for greedy.
+        index = AgentGeoIndex()
+        index.reset(dict(enumerate(agents)))
+        solvers = (
+            ("greedy", lambda: greedy(orders, index)),
+            ("batch", lambda: batch(orders, agents, args.max_candidates)),
+        )
+        for name, solve in solvers:
+            started = time.perf_counter()
+            total = solve()
+            results[name][0].append(total)
+            results[name][1].append((time.perf_counter() - started) * 1000)
+
+    print(f"{args.rounds} rounds of {args.orders} orders against {args.agents} free agents")
+    for name, (totals, latencies) in results.items():
+        print(
+            f"{name:<7} total distance {statistics.mean(totals):8.2f} km/round  "
+            f"({statistics.mean(totals) / args.orders:.3f} km/order)  "
+            f"latency {statistics.median(latencies):7.2f} ms/round"
+        )
+    saved = 1 - statistics.mean(results["batch"][0]) / statistics.mean(results["greedy"][0])
+    print(f"batch saves {saved:.1%} of greedy's travel distance")
+
+
+if __name__ == "__main__":
+    main()
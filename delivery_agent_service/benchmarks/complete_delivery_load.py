@@ -0,0 +1,116 @@
+"""
+Load test for POST /delivery/complete-delivery against a slow restaurant_service.
+
+Starts a stand-in restaurant_service in this process that answers the order
+lookup and status update after `--delay` seconds, seeds one busy agent per
+order, fires `--requests` simultaneous completions and meanwhile samples
+/metrics/db-pool and the latency of GET /delivery/agents/{id}, which needs a
+pooled connection. With no connection held across the HTTP calls, pool
+occupancy stays at a few connections and the probe stays fast however slow the
+stand-in is.
+
+Start the delivery agent service pointed at the stand-in, then run:
+
+    RESTAURANT_SERVICE_URL=http://localhost:8011 uvicorn app.main:app --port 8002
+    python benchmarks/complete_delivery_load.py --requests 200 --delay 2
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+
+def stand_in_restaurant(delay: float, assigned: dict) -> FastAPI:
+    app = FastAPI()
+    statuses = {}
+
+    @app.get("/orders/{order_id}")
+    async def get_order(order_id: int):
+        await asyncio.sleep(delay)
+        return {"id": order_id, "assigned_agent_id": assigned.get(order_id), "status": statuses.get(order_id, "ready_for_pickup")}
+
+    @app.put("/orders/{order_id}/status")
+    async def update_status(order_id: int, body: dict):
+        await asyncio.sleep(delay)
+        statuses[order_id] = body["status"]
+        return {"id": order_id, "assigned_agent_id": assigned.get(order_id), "status": body["status"]}
+
+    return app
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8002")
+    parser.add_argument("--stand-in-port", type=int, default=8011)
+    parser.add_argument("--requests", type=int, default=200, help="simultaneous completions")
+    parser.add_argument("--delay", type=float, default=2.0, help="seconds the stand-in takes per call")
+    args = parser.parse_args()
+
+    assigned = {}
+    server = uvicorn.Server(uvicorn.Config(
+        stand_in_restaurant(args.delay, assigned), port=args.stand_in_port, log_level="warning"
+    ))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=args.requests + 10, max_keepalive_connections=args.requests + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0, limits=limits) as client:
+        agents = await asyncio.gather(*[
+            client.post("/delivery/agents", json={"name": f"bench-agent-{i}", "available": False})
+            for i in range(args.requests)
+        ])
+        agent_ids = [resp.json()["id"] for resp in agents]
+        base_order_id = int(time.time())
+        for offset, agent_id in enumerate(agent_ids):
+            assigned[base_order_id + offset] = agent_id
+
+        done = asyncio.Event()
+        pool_samples, probe_ms = [], []
+
+        async def sample():
+            while not done.is_set():
+                pool = (await client.get("/metrics/db-pool")).json()["default"]
+                if pool is not None:
+                    pool_samples.append(pool["in_use"])
+                started = time.perf_counter()
+                await client.get(f"/delivery/agents/{agent_ids[0]}")
+                probe_ms.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.05)
+
+        async def complete(order_id: int, agent_id: int):
+            resp = await client.post("/delivery/complete-delivery", json={"order_id": order_id, "agent_id": agent_id})
+            return resp.status_code
+
+        sampler = asyncio.create_task(sample())
+        started = time.perf_counter()
+        codes = await asyncio.gather(*[complete(order_id, agent_id) for order_id, agent_id in assigned.items()])
+        elapsed = time.perf_counter() - started
+        done.set()
+        await sampler
+        pool = (await client.get("/metrics/db-pool")).json()["default"]
+        completions = (await client.get("/metrics/completions")).json()
+
+    server.should_exit = True
+    await server_task
+
+    print(f"{args.requests} completions in {elapsed:.2f}s with a {args.delay}s restaurant stand-in")
+    print("status codes:   " + ", ".join(f"{code}: {codes.count(code)}" for code in sorted(set(codes))))
+    if pool_samples:
+        print(f"pool in use:    max {max(pool_samples)}  mean {statistics.mean(pool_samples):.1f}  (pool max size {pool['max_size']})")
+    if probe_ms:
+        print(f"agent lookup:   median {statistics.median(probe_ms):.1f} ms  p99 {percentile(probe_ms, 0.99):.1f} ms during the run")
+    print(f"completions:    {completions}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
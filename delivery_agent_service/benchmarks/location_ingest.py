@@ -0,0 +1,67 @@
+"""
+Load test for agent location ingestion.
+
+Sends batched pings for `--agents` agents, each reporting every `--period`
+seconds, for `--duration` seconds, then prints the achieved ping rate and the
+service's location metrics (flush lag, dropped and stale pings).
+
+    python benchmarks/location_ingest.py --agents 50000 --period 5 --duration 30
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8002")
+    parser.add_argument("--agents", type=int, default=50000)
+    parser.add_argument("--period", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    positions = {agent_id: [rng.uniform(12.80, 13.16), rng.uniform(77.40, 77.77)] for agent_id in range(1, args.agents + 1)}
+    agent_ids = list(positions)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    sent = accepted = 0
+
+    async def send(client: httpx.AsyncClient, batch):
+        nonlocal sent, accepted
+        async with semaphore:
+            resp = await client.post("/delivery/agents/locations", json={"pings": batch})
+            resp.raise_for_status()
+            sent += len(batch)
+            accepted += resp.json()["accepted"]
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0) as client:
+        started = time.perf_counter()
+        while time.perf_counter() - started < args.duration:
+            round_started = time.perf_counter()
+            batches = []
+            for i in range(0, len(agent_ids), args.batch_size):
+                batch = []
+                for agent_id in agent_ids[i:i + args.batch_size]:
+                    position = positions[agent_id]
+                    position[0] += rng.uniform(-0.0005, 0.0005)
+                    position[1] += rng.uniform(-0.0005, 0.0005)
+                    batch.append({"agent_id": agent_id, "latitude": position[0], "longitude": position[1]})
+                batches.append(batch)
+            await asyncio.gather(*[send(client, batch) for batch in batches])
+            await asyncio.sleep(max(0.0, args.period - (time.perf_counter() - round_started)))
+        elapsed = time.perf_counter() - started
+        metrics = (await client.get("/metrics/locations")).json()
+
+    print(f"pings sent:     {sent} ({sent / elapsed:.0f}/s)")
+    print(f"pings accepted: {accepted}")
+    for key, value in metrics.items():
+        print(f"{key + ':':<32}{value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Benchmark: nearest free agent lookup, grid index vs. brute-force scan.
+
+Scatters agents uniformly over a city-sized box, then answers random pickup
+queries with AgentGeoIndex.nearest() and with a linear scan over every agent,
+checks both find equally near agents, and reports per-query latency. No
+database is needed; run from the delivery_agent_service directory:
+
+    python -m benchmarks.nearest_agent --agents 50000 --queries 5000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from app.agent_index import AgentGeoIndex, distance_km
+
+# Roughly a 40 x 40 km metro area.
+MIN_LAT, MAX_LAT = 12.80, 13.16
+MIN_LNG, MAX_LNG = 77.40, 77.77
+
+
+def brute_force_nearest(positions, latitude, longitude):
+    best_id, best_distance = None, float("inf")
+    for agent_id, (agent_lat, agent_lng) in positions.items():
+        distance = distance_km(latitude, longitude, agent_lat, agent_lng)
+        if distance < best_distance:
+            best_id, best_distance = agent_id, distance
+    return best_id, best_distance
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--brute-force-queries", type=int, default=200)
+    parser.add_argument("--cell-degrees", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    positions = {
+        agent_id: (rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG))
+        for agent_id in range(1, args.agents + 1)
+    }
+    queries = [(rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG)) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    index = AgentGeoIndex(cell_degrees=args.cell_degrees)
+    index.reset(positions)
+    build_seconds = time.perf_counter() - started
+
+    grid_us = []
+    grid_results = []
+    for latitude, longitude in queries:
+        started = time.perf_counter()
+        grid_results.append(index.nearest(latitude, longitude))
+        grid_us.append((time.perf_counter() - started) * 1e6)
+
+    brute_us = []
+    for (latitude, longitude), (_, grid_distance) in zip(queries[:args.brute_force_queries], grid_results):
+        started = time.perf_counter()
+        _, brute_distance = brute_force_nearest(positions, latitude, longitude)
+        brute_us.append((time.perf_counter() - started) * 1e6)
+        if abs(brute_distance - grid_distance) > 1e-9:
+            print(f"mismatch at ({latitude}, {longitude}): grid {grid_distance} km, brute force {brute_distance} km")
+            sys.exit(1)
+
+    print(f"agents: {args.agents}  cells: {index.stats()['cells']}  build: {build_seconds * 1000:.1f} ms")
+    print(f"grid         median {statistics.median(grid_us):8.1f} us  p99 {percentile(grid_us, 0.99):8.1f} us")
+    print(f"brute force  median {statistics.median(brute_us):8.1f} us  p99 {percentile(brute_us, 0.99):8.1f} us")
+    print(f"results match brute force on {len(brute_us)} queries")
+
+
+if __name__ == "__main__":
+    main()
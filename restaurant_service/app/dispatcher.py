@@ -0,0 +1,236 @@
+import asyncio
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from .models import AssignmentOutbox, Order, Restaurant
+from .dependencies import delivery_agent_service_client
+from .order_events import order_events
+from .order_lifecycle import attach_items, compare_and_set, order_row_to_dict, transition_order
+
+# Orders in these states still need an agent; the kitchen may move an accepted
+# order along before the dispatcher gets to it.
+AWAITING_AGENT_STATUSES = ["accepted", "preparing", "ready_for_pickup"]
+
+class AssignmentDispatcher:
+    """
+    Drains the assignment outbox in the background.
+
+    Each batch is claimed with SKIP LOCKED and leased for `lease_seconds`, so the
+    HTTP call to the delivery agent service never runs inside a transaction and
+    several restaurant_service processes can drain the same outbox.
+    """
+
+    def __init__(self, batch_size: int = 50, poll_interval: float = 1.0, lease_seconds: int = 30, max_backoff: int = 60):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_backoff = max_backoff
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+        self.dispatched = 0
+        self.retries = 0
+        self.dropped = 0
+        self.released = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+        self.last_batch_duration = 0.0
+
+    def notify(self):
+        """Wakes the dispatcher early, e.g. right after an order was accepted."""
+        self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                drained = await self.drain_once()
+            except Exception as e:
+                print(f"ERROR: Assignment dispatcher batch failed: {str(e)}")
+                drained = 0
+
+            if drained < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        """Claims and dispatches one batch. Returns the number of outbox rows handled."""
+        started = time.perf_counter()
+        entries = await self._claim_batch()
+        if not entries:
+            return 0
+
+        handled = len(entries)
+        releases = [entry for entry in entries if entry.action == "release"]
+        entries = [entry for entry in entries if entry.action != "release"]
+        orders = {
+            order_id: (restaurant_id, status, agent_id)
+            for order_id, restaurant_id, status, agent_id in await Order.filter(
+                id__in=[entry.order_id for entry in entries]
+            ).values_list("id", "restaurant_id", "status", "assigned_agent_id")
+        }
+        active = {
+            order_id: restaurant_id
+            for order_id, (restaurant_id, status, agent_id) in orders.items()
+            if status in AWAITING_AGENT_STATUSES and agent_id is None
+        }
+        pickups = await self._pickup_locations(set(active.values()))
+
+        stale = [entry for entry in entries if entry.order_id not in active]
+        # An earlier attempt may have claimed an agent before failing; unless the
+        # order ended up with an agent, free whichever one that was.
+        unclaimed = [
+            entry for entry in stale
+            if entry.attempts > 0 and entry.order_id in orders and orders[entry.order_id][2] is None
+        ]
+        if unclaimed:
+            await AssignmentOutbox.filter(id__in=[entry.id for entry in unclaimed]).update(action="release")
+            releases.extend(unclaimed)
+        dropped = [entry for entry in stale if entry not in unclaimed]
+        if dropped:
+            # Order was rejected or already has an agent by the time we got to it.
+            await AssignmentOutbox.filter(id__in=[entry.id for entry in dropped]).delete()
+            self.dropped += len(dropped)
+
+        await asyncio.gather(
+            *[self._dispatch(entry, pickups.get(active[entry.order_id])) for entry in entries if entry.order_id in active],
+            *[self._release(entry) for entry in releases],
+        )
+        self.last_batch_duration = time.perf_counter() - started
+        return handled
+
+    async def _pickup_locations(self, restaurant_ids: set) -> Dict[int, Tuple[float, float]]:
+        """Coordinates of the given restaurants, for those that have them."""
+        if not restaurant_ids:
+            return {}
+        rows = await Restaurant.filter(
+            id__in=restaurant_ids, latitude__isnull=False, longitude__isnull=False
+        ).values_list("id", "latitude", "longitude")
+        return {restaurant_id: (latitude, longitude) for restaurant_id, latitude, longitude in rows}
+
+    async def _claim_batch(self) -> List[AssignmentOutbox]:
+        now = timezone.now()
+        async with in_transaction("default"):
+            entries = await AssignmentOutbox.filter(
+                next_attempt_at__lte=now
+            ).order_by("id").limit(self.batch_size).select_for_update(skip_locked=True)
+            if entries:
+                await AssignmentOutbox.filter(id__in=[entry.id for entry in entries]).update(
+                    next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+                )
+        return entries
+
+    async def _dispatch(self, entry: AssignmentOutbox, pickup: Optional[Tuple[float, float]]):
+        payload = {"order_id": entry.order_id}
+        if pickup is not None:
+            # Lets the delivery agent service pick the agent nearest to the restaurant.
+            payload["latitude"], payload["longitude"] = pickup
+        try:
+            resp = await delivery_agent_service_client.post("/delivery/assign", json=payload)
+            resp.raise_for_status()
+            assigned_agent_id = resp.json().get("agent_id")
+        except httpx.ConnectError:
+            await self._reschedule(entry, "Delivery agent service is unavailable for assignment.")
+            return
+        except httpx.ReadTimeout:
+            await self._reschedule(entry, "Delivery agent service timed out during assignment.")
+            return
+        except httpx.HTTPStatusError as exc:
+            await self._reschedule(entry, f"Delivery service error during assignment: {exc.response.status_code} - {exc.response.text}")
+            return
+        except Exception as e:
+            await self._reschedule(entry, f"Unexpected error during delivery assignment: {str(e)}")
+            return
+
+        async with in_transaction("default") as connection:
+            row = await transition_order(
+                entry.order_id, "assigned_to_agent", connection=connection, assigned_agent_id=assigned_agent_id
+            )
+            if not row:
+                row = await compare_and_set(
+                    entry.order_id, AWAITING_AGENT_STATUSES, connection=connection, assigned_agent_id=assigned_agent_id
+                )
+            if row:
+                await AssignmentOutbox.filter(id=entry.id).using_db(connection).delete()
+            else:
+                # The order was rejected or moved on while the agent was being claimed.
+                await AssignmentOutbox.filter(id=entry.id).using_db(connection).update(
+                    action="release", attempts=0, next_attempt_at=timezone.now()
+                )
+        if not row:
+            print(f"WARNING: Order {entry.order_id} no longer needs agent {assigned_agent_id}; releasing it.")
+            self.notify()
+            return
+        if order_events.watched(entry.order_id):
+            await attach_items([row])
+            order_events.publish(entry.order_id, order_row_to_dict(row))
+
+        latency = (timezone.now() - entry.created_at).total_seconds()
+        self.dispatched += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self._total_latency += latency
+
+    async def _release(self, entry: AssignmentOutbox):
+        """Frees the agent delivery_agent_service holds for an order that no longer needs one."""
+        try:
+            resp = await delivery_agent_service_client.post("/delivery/release", json={"order_id": entry.order_id})
+            resp.raise_for_status()
+        except httpx.HTTPStatusError as exc:
+            await self._reschedule(entry, f"Delivery service error during release: {exc.response.status_code} - {exc.response.text}")
+            return
+        except Exception as e:
+            await self._reschedule(entry, f"Error releasing the agent: {str(e)}")
+            return
+        await AssignmentOutbox.filter(id=entry.id).delete()
+        self.released += 1
+
+    async def _reschedule(self, entry: AssignmentOutbox, error: str):
+        print(f"WARNING: Assignment for order {entry.order_id} failed (attempt {entry.attempts + 1}): {error}")
+        backoff = min(self.max_backoff, 2 ** entry.attempts)
+        await AssignmentOutbox.filter(id=entry.id).update(
+            attempts=entry.attempts + 1,
+            last_error=error,
+            next_attempt_at=timezone.now() + timedelta(seconds=backoff),
+        )
+        self.retries += 1
+
+    async def stats(self) -> dict:
+        now = timezone.now()
+        oldest = await AssignmentOutbox.all().order_by("id").first()
+        return {
+            "queue_depth": await AssignmentOutbox.all().count(),
+            "due": await AssignmentOutbox.filter(next_attempt_at__lte=now).count(),
+            "oldest_pending_seconds": (now - oldest.created_at).total_seconds() if oldest else 0.0,
+            "dispatched": self.dispatched,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "released": self.released,
+            "last_latency_seconds": self.last_latency,
+            "avg_latency_seconds": self._total_latency / self.dispatched if self.dispatched else 0.0,
+            "max_latency_seconds": self.max_latency,
+            "last_batch_duration_seconds": self.last_batch_duration,
+        }
+
+assignment_dispatcher = AssignmentDispatcher()
@@ -0,0 +1,55 @@
+import asyncio
+from typing import List, Optional, Set
+
+from .config import CACHE_INVALIDATION_TOKEN, GATEWAY_URLS
+from .dependencies import gateway_client
+
+class GatewayCacheInvalidator:
+    """
+    Tells every gateway in GATEWAY_URLS to evict restaurants after they change.
+
+    Pushes run in the background after the write has committed and are best
+    effort: a gateway that misses one still drops the entry once its TTL runs out.
+    """
+
+    def __init__(self, urls: List[str], token: Optional[str]):
+        # Gateways refuse pushes without the shared token, so there is nothing to send.
+        self.urls = urls if token else []
+        self.token = token
+        self._tasks: Set[asyncio.Task] = set()
+        self.pushed = 0
+        self.failed = 0
+
+    def evict(self, entity: str, ids: List[int]):
+        if not self.urls:
+            return
+        task = asyncio.create_task(self._push(entity, ids))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _push(self, entity: str, ids: List[int]):
+        for url in self.urls:
+            try:
+                resp = await gateway_client.post(
+                    f"{url}/cache/invalidate", json={"entity": entity, "ids": ids},
+                    headers={"X-Cache-Token": self.token},
+                )
+                resp.raise_for_status()
+                self.pushed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"WARNING: Could not evict {entity} {ids} from gateway {url}: {str(e)}")
+
+    async def close(self):
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await gateway_client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "gateways": len(self.urls),
+            "pending": len(self._tasks),
+            "pushed": self.pushed,
+            "failed": self.failed,
+        }
+
+gateway_cache = GatewayCacheInvalidator(GATEWAY_URLS, CACHE_INVALIDATION_TOKEN)
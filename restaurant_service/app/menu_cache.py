@@ -0,0 +1,92 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+class CachedMenu(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+
+class MenuCache:
+    """
+    In-process LRU cache of serialized menus, keyed by restaurant id.
+
+    Every menu write bumps the restaurant's version. A fill that raced with a
+    write carries the old version and is discarded instead of being cached.
+    The cache is bounded both by entry count and by total body size.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, CachedMenu]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def version(self, restaurant_id: int) -> int:
+        return self._versions.get(restaurant_id, 0)
+
+    def get(self, restaurant_id: int) -> Optional[CachedMenu]:
+        entry = self._entries.get(restaurant_id)
+        if entry is None or entry.version != self.version(restaurant_id):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(restaurant_id)
+        self.hits += 1
+        return entry
+
+    def put(self, restaurant_id: int, version: int, body: bytes) -> CachedMenu:
+        """Stores a freshly serialized menu. Returns the entry even if it was too stale or large to keep."""
+        entry = CachedMenu(version=version, etag=f'"{hashlib.sha1(body).hexdigest()}"', body=body)
+        if version != self.version(restaurant_id) or len(body) > self.max_bytes:
+            return entry
+
+        self._discard(restaurant_id)
+        self._entries[restaurant_id] = entry
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, restaurant_id: int):
+        """Called after every committed menu write for the restaurant."""
+        self._versions[restaurant_id] = self.version(restaurant_id) + 1
+        self._discard(restaurant_id)
+        self.invalidations += 1
+
+    def _discard(self, restaurant_id: int):
+        entry = self._entries.pop(restaurant_id, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against a strong ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+menu_cache = MenuCache()
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, List, NamedTuple
+
+from .models import MenuItem
+
+class MenuEntry(NamedTuple):
+    id: int
+    price: Decimal
+    available: bool
+
+class MenuIndex:
+    """
+    Per-restaurant name -> (id, price, available) lookup used to validate and price orders.
+
+    Built lazily on first use and dropped by every menu write. As with the menu
+    cache, a build that raced with a write is used once but not kept.
+    """
+
+    def __init__(self, max_restaurants: int = 4096):
+        self.max_restaurants = max_restaurants
+        self._menus: "OrderedDict[int, Dict[str, MenuEntry]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+
+    async def get(self, restaurant_id: int) -> Dict[str, MenuEntry]:
+        menu = self._menus.get(restaurant_id)
+        if menu is not None:
+            self._menus.move_to_end(restaurant_id)
+            return menu
+
+        version = self._versions.get(restaurant_id, 0)
+        rows = await MenuItem.filter(restaurant_id=restaurant_id).values_list("id", "name", "price", "available")
+        menu = {name: MenuEntry(id=item_id, price=Decimal(price), available=available) for item_id, name, price, available in rows}
+        if version == self._versions.get(restaurant_id, 0):
+            self._menus[restaurant_id] = menu
+            if len(self._menus) > self.max_restaurants:
+                self._menus.popitem(last=False)
+        return menu
+
+    def invalidate(self, restaurant_id: int):
+        self._versions[restaurant_id] = self._versions.get(restaurant_id, 0) + 1
+        self._menus.pop(restaurant_id, None)
+
+def price_items(menu: Dict[str, MenuEntry], items: List[str]) -> Decimal:
+    """
+    Returns the order total for `items` (names may repeat).
+    Raises ValueError naming any unknown or unavailable items.
+    """
+    unknown = sorted({name for name in items if name not in menu})
+    if unknown:
+        raise ValueError(f"Unknown menu items: {', '.join(unknown)}")
+    unavailable = sorted({name for name in items if not menu[name].available})
+    if unavailable:
+        raise ValueError(f"Unavailable menu items: {', '.join(unavailable)}")
+    return sum((menu[name].price for name in items), Decimal("0.00"))
+
+def order_lines(menu: Dict[str, MenuEntry], items: List[str]) -> List[dict]:
+    """
+    Groups already-validated `items` into order lines, one per distinct menu item
+    in order of first appearance, snapshotting each item's current price.
+    """
+    lines: Dict[str, dict] = {}
+    for name in items:
+        line = lines.get(name)
+        if line is None:
+            entry = menu[name]
+            lines[name] = {"position": len(lines), "menu_item_id": entry.id, "name": name, "quantity": 1, "unit_price": entry.price}
+        else:
+            line["quantity"] += 1
+    return list(lines.values())
+
+menu_index = MenuIndex()
@@ -0,0 +1,49 @@
+"""
+Applies the versioned SQL migrations in app/migrations, in file name order.
+The migrations are written for Postgres, the only supported database.
+
+Run before starting the service:
+
+    python -m app.migrate
+"""
+import asyncio
+from pathlib import Path
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from .config import DB_URL
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATIONS_TABLE = "restaurant_schema_migrations"
+
+async def migrate():
+    await Tortoise.init(db_url=DB_URL, modules={"models": ["app.models"]})
+    try:
+        # All pending migrations run in one transaction; the advisory lock keeps
+        # replicas that boot at the same time from applying them twice.
+        async with in_transaction() as connection:
+            await connection.execute_query(f"SELECT pg_advisory_xact_lock(hashtext('{MIGRATIONS_TABLE}'))")
+            await connection.execute_script(
+                f'CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" ('
+                '"version" VARCHAR(255) NOT NULL PRIMARY KEY, '
+                '"applied_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP)'
+            )
+            rows = await connection.execute_query_dict(f'SELECT "version" FROM "{MIGRATIONS_TABLE}"')
+            applied = {row["version"] for row in rows}
+
+            for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                version = path.stem
+                if version in applied:
+                    continue
+                await connection.execute_script(path.read_text())
+                await connection.execute_query(
+                    f'INSERT INTO "{MIGRATIONS_TABLE}" ("version") VALUES ($1)',
+                    [version],
+                )
+                print(f"Applied migration {version}")
+    finally:
+        await Tortoise.close_connections()
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
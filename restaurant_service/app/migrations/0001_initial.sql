@@ -0,0 +1,26 @@
+-- Baseline schema, as previously produced by generate_schemas.
+CREATE TABLE IF NOT EXISTS "restaurant" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "name" VARCHAR(100) NOT NULL,
+    "online" BOOL NOT NULL DEFAULT True
+);
+
+CREATE TABLE IF NOT EXISTS "menuitem" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "name" VARCHAR(100) NOT NULL,
+    "description" TEXT,
+    "price" DECIMAL(10,2) NOT NULL,
+    "available" BOOL NOT NULL DEFAULT True,
+    "restaurant_id" INT NOT NULL REFERENCES "restaurant" ("id") ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "order" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "user_id" INT NOT NULL,
+    "status" VARCHAR(50) NOT NULL,
+    "items" JSONB NOT NULL,
+    "assigned_agent_id" INT,
+    "restaurant_rating" INT,
+    "agent_rating" INT,
+    "restaurant_id" INT NOT NULL REFERENCES "restaurant" ("id") ON DELETE CASCADE
+);
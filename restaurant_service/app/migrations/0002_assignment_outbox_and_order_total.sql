@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS "assignmentoutbox" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "order_id" INT NOT NULL UNIQUE,
+    "attempts" INT NOT NULL DEFAULT 0,
+    "last_error" TEXT,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "next_attempt_at" TIMESTAMPTZ NOT NULL
+);
+
+ALTER TABLE "order" ADD COLUMN IF NOT EXISTS "total" DECIMAL(10,2);
@@ -0,0 +1,13 @@
+-- Order history and lookups by owner, newest first (keyset on id).
+CREATE INDEX IF NOT EXISTS "idx_order_user_id_id" ON "order" ("user_id", "id");
+CREATE INDEX IF NOT EXISTS "idx_order_restaurant_id_id" ON "order" ("restaurant_id", "id");
+CREATE INDEX IF NOT EXISTS "idx_order_restaurant_status_id" ON "order" ("restaurant_id", "status", "id");
+
+-- Menu reads and the menu index build.
+CREATE INDEX IF NOT EXISTS "idx_menuitem_restaurant_id" ON "menuitem" ("restaurant_id");
+
+-- GET /restaurants/available walks online restaurants in id order.
+CREATE INDEX IF NOT EXISTS "idx_restaurant_online_id" ON "restaurant" ("id") WHERE "online";
+
+-- Dispatcher claims due outbox rows.
+CREATE INDEX IF NOT EXISTS "idx_assignmentoutbox_next_attempt_at" ON "assignmentoutbox" ("next_attempt_at");
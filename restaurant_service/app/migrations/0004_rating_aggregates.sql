@@ -0,0 +1,17 @@
+CREATE TABLE IF NOT EXISTS "rating_aggregate" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "entity_type" VARCHAR(20) NOT NULL,
+    "entity_id" INT NOT NULL,
+    "count" INT NOT NULL DEFAULT 0,
+    "sum" INT NOT NULL DEFAULT 0,
+    "average" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "r1" INT NOT NULL DEFAULT 0,
+    "r2" INT NOT NULL DEFAULT 0,
+    "r3" INT NOT NULL DEFAULT 0,
+    "r4" INT NOT NULL DEFAULT 0,
+    "r5" INT NOT NULL DEFAULT 0,
+    CONSTRAINT "uid_rating_aggregate_entity" UNIQUE ("entity_type", "entity_id")
+);
+
+-- Top-N rated restaurants (or agents) straight from the aggregate table.
+CREATE INDEX IF NOT EXISTS "idx_rating_aggregate_top" ON "rating_aggregate" ("entity_type", "average" DESC, "count" DESC);
@@ -0,0 +1,77 @@
+-- Orders get created_at/updated_at and become range-partitioned by month on
+-- created_at. Rows that predate the timestamps are stamped with the migration time.
+-- Nothing may hold a foreign key into "order": the primary key is now (id, created_at).
+
+CREATE OR REPLACE FUNCTION "order_ensure_partitions"(months_ahead INT) RETURNS VOID AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', now() AT TIME ZONE 'UTC');
+    lower_bound TIMESTAMP;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        lower_bound := month_start + make_interval(months => i);
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF "order" FOR VALUES FROM (%L) TO (%L)',
+            'order_p' || to_char(lower_bound, 'YYYYMM'),
+            lower_bound AT TIME ZONE 'UTC',
+            (lower_bound + INTERVAL '1 month') AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER SEQUENCE "order_id_seq" OWNED BY NONE;
+ALTER TABLE "order" RENAME TO "order_unpartitioned";
+ALTER INDEX "order_pkey" RENAME TO "order_unpartitioned_pkey";
+
+CREATE TABLE "order" (
+    "id" INT NOT NULL DEFAULT nextval('order_id_seq'),
+    "user_id" INT NOT NULL,
+    "status" VARCHAR(50) NOT NULL,
+    "items" JSONB NOT NULL,
+    "assigned_agent_id" INT,
+    "restaurant_rating" INT,
+    "agent_rating" INT,
+    "restaurant_id" INT NOT NULL REFERENCES "restaurant" ("id") ON DELETE CASCADE,
+    "total" DECIMAL(10,2),
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY ("id", "created_at")
+) PARTITION BY RANGE ("created_at");
+
+-- Catches rows outside every monthly partition; the archiver keeps months created ahead.
+CREATE TABLE "order_default" PARTITION OF "order" DEFAULT;
+SELECT "order_ensure_partitions"(2);
+
+INSERT INTO "order" (
+    "id", "user_id", "status", "items", "assigned_agent_id",
+    "restaurant_rating", "agent_rating", "restaurant_id", "total"
+)
+SELECT
+    "id", "user_id", "status", "items", "assigned_agent_id",
+    "restaurant_rating", "agent_rating", "restaurant_id", "total"
+FROM "order_unpartitioned";
+
+DROP TABLE "order_unpartitioned";
+ALTER SEQUENCE "order_id_seq" OWNED BY "order"."id";
+
+CREATE INDEX IF NOT EXISTS "idx_order_user_id_id" ON "order" ("user_id", "id");
+CREATE INDEX IF NOT EXISTS "idx_order_restaurant_id_id" ON "order" ("restaurant_id", "id");
+CREATE INDEX IF NOT EXISTS "idx_order_restaurant_status_id" ON "order" ("restaurant_id", "status", "id");
+-- Archival scans for old completed orders.
+CREATE INDEX IF NOT EXISTS "idx_order_status_created_at" ON "order" ("status", "created_at");
+
+-- Completed orders past the retention window; no secondary indexes or foreign keys.
+CREATE TABLE IF NOT EXISTS "order_archive" (
+    "id" INT NOT NULL PRIMARY KEY,
+    "restaurant_id" INT NOT NULL,
+    "user_id" INT NOT NULL,
+    "status" VARCHAR(50) NOT NULL,
+    "items" JSONB NOT NULL,
+    "assigned_agent_id" INT,
+    "restaurant_rating" SMALLINT,
+    "agent_rating" SMALLINT,
+    "total" DECIMAL(10,2),
+    "created_at" TIMESTAMPTZ NOT NULL,
+    "updated_at" TIMESTAMPTZ NOT NULL,
+    "archived_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
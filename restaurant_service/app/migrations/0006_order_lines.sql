@@ -0,0 +1,42 @@
+-- Order items move from the free-form "items" JSON column into one row per
+-- distinct menu item. "order_id" has no foreign key because "order" is partitioned.
+CREATE TABLE IF NOT EXISTS "order_line" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "order_id" INT NOT NULL,
+    "position" SMALLINT NOT NULL,
+    "menu_item_id" INT,
+    "name" VARCHAR(100) NOT NULL,
+    "quantity" INT NOT NULL,
+    "unit_price" DECIMAL(10,2)
+);
+
+-- Existing orders: group repeated names, keep first-appearance order, and
+-- snapshot today's menu price (orders whose item has since left the menu keep
+-- the name with no menu item or price).
+INSERT INTO "order_line" ("order_id", "position", "menu_item_id", "name", "quantity", "unit_price")
+SELECT
+    grouped."order_id",
+    ROW_NUMBER() OVER (PARTITION BY grouped."order_id" ORDER BY grouped."first_seen") - 1,
+    menu."id",
+    grouped."name",
+    grouped."quantity",
+    menu."price"
+FROM (
+    SELECT o."id" AS "order_id", o."restaurant_id", item."name", COUNT(*) AS "quantity", MIN(item."ordinality") AS "first_seen"
+    FROM "order" o
+    CROSS JOIN LATERAL jsonb_array_elements_text(o."items") WITH ORDINALITY AS item("name", "ordinality")
+    WHERE o."items" IS NOT NULL
+    GROUP BY o."id", o."restaurant_id", item."name"
+) grouped
+LEFT JOIN LATERAL (
+    SELECT "id", "price" FROM "menuitem"
+    WHERE "restaurant_id" = grouped."restaurant_id" AND "name" = grouped."name"
+    ORDER BY "id" LIMIT 1
+) menu ON TRUE;
+
+ALTER TABLE "order" ALTER COLUMN "items" DROP NOT NULL;
+UPDATE "order" SET "items" = NULL WHERE "items" IS NOT NULL;
+
+-- Reading an order's lines, and item popularity per menu item.
+CREATE INDEX IF NOT EXISTS "idx_order_line_order_id" ON "order_line" ("order_id", "position");
+CREATE INDEX IF NOT EXISTS "idx_order_line_menu_item_id" ON "order_line" ("menu_item_id");
@@ -0,0 +1,2 @@
+ALTER TABLE "restaurant" ADD COLUMN IF NOT EXISTS "latitude" DOUBLE PRECISION;
+ALTER TABLE "restaurant" ADD COLUMN IF NOT EXISTS "longitude" DOUBLE PRECISION;
@@ -0,0 +1,3 @@
+-- An outbox row either assigns an agent to an order or releases the agent
+-- claimed for an order that no longer needs one.
+ALTER TABLE "assignmentoutbox" ADD COLUMN IF NOT EXISTS "action" VARCHAR(16) NOT NULL DEFAULT 'assign';
@@ -1,10 +1,16 @@
 from tortoise import fields
 from tortoise.models import Model
 
+# Tables and indexes are created by the SQL files in app/migrations;
+# every model change needs a matching migration there.
+
 class Restaurant(Model):
     id = fields.IntField(pk=True)
     name = fields.CharField(max_length=100)
     online = fields.BooleanField(default=True)
+    # Pickup location sent to the delivery agent service for nearest-agent assignment.
+    latitude = fields.FloatField(null=True)
+    longitude = fields.FloatField(null=True)
 
 class MenuItem(Model):
     id = fields.IntField(pk=True)
@@ -19,7 +25,85 @@ class Order(Model):
     restaurant = fields.ForeignKeyField('models.Restaurant', related_name='orders')
     user_id = fields.IntField()
     status = fields.CharField(max_length=50)
-    items = fields.JSONField()
+    # Unused since migration 0006: the items live in OrderLine.
+    items = fields.JSONField(null=True)
     assigned_agent_id = fields.IntField(null=True)
     restaurant_rating = fields.IntField(null=True)
     agent_rating = fields.IntField(null=True)
+    total = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
+    # The table is partitioned by month on created_at; see migration 0005.
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+class OrderLine(Model):
+    """
+    One distinct menu item on an order, with its quantity and the unit price at order time.
+    order_id carries no foreign key because "order" is partitioned (see migration 0005).
+    """
+    id = fields.IntField(pk=True)
+    order_id = fields.IntField()
+    position = fields.SmallIntField()
+    menu_item_id = fields.IntField(null=True)
+    name = fields.CharField(max_length=100)
+    quantity = fields.IntField()
+    unit_price = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
+
+    class Meta:
+        table = "order_line"
+
+class OrderArchive(Model):
+    """
+    Delivered or rejected order moved out of the live table by the archiver.
+    Its lines are folded back into `items`. Read-only; GET /orders/{order_id} falls back to it.
+    """
+    id = fields.IntField(pk=True)
+    restaurant_id = fields.IntField()
+    user_id = fields.IntField()
+    status = fields.CharField(max_length=50)
+    items = fields.JSONField()
+    assigned_agent_id = fields.IntField(null=True)
+    restaurant_rating = fields.SmallIntField(null=True)
+    agent_rating = fields.SmallIntField(null=True)
+    total = fields.DecimalField(max_digits=10, decimal_places=2, null=True)
+    created_at = fields.DatetimeField()
+    updated_at = fields.DatetimeField()
+    archived_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "order_archive"
+
+class AssignmentOutbox(Model):
+    """
+    Pending delivery-agent assignment for an accepted order.
+    Written in the same transaction as the acceptance and drained by the dispatcher.
+    An "assign" row whose agent came back after the order left the awaiting
+    statuses turns into a "release" row, which frees that agent again.
+    """
+    id = fields.IntField(pk=True)
+    order_id = fields.IntField(unique=True)
+    action = fields.CharField(max_length=16, default="assign")
+    attempts = fields.IntField(default=0)
+    last_error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    next_attempt_at = fields.DatetimeField()
+
+class RatingAggregate(Model):
+    """
+    Running rating totals for one restaurant or delivery agent.
+    Updated in the same transaction as every order rating write.
+    """
+    id = fields.IntField(pk=True)
+    entity_type = fields.CharField(max_length=20)
+    entity_id = fields.IntField()
+    count = fields.IntField(default=0)
+    sum = fields.IntField(default=0)
+    average = fields.FloatField(default=0)
+    r1 = fields.IntField(default=0)
+    r2 = fields.IntField(default=0)
+    r3 = fields.IntField(default=0)
+    r4 = fields.IntField(default=0)
+    r5 = fields.IntField(default=0)
+
+    class Meta:
+        table = "rating_aggregate"
+        unique_together = (("entity_type", "entity_id"),)
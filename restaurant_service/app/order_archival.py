@@ -0,0 +1,143 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import List, Optional
+
+from tortoise import connections, timezone
+
+from .config import ORDER_RETENTION_DAYS
+from .models import Order, OrderArchive, OrderLine
+from .order_lifecycle import ORDER_TRANSITIONS
+
+# Statuses an order never leaves; only these are archived.
+TERMINAL_STATUSES = sorted(status for status, targets in ORDER_TRANSITIONS.items() if not targets)
+
+ARCHIVED_COLUMNS = [
+    "id", "restaurant_id", "user_id", "status", "items", "assigned_agent_id",
+    "restaurant_rating", "agent_rating", "total", "created_at", "updated_at",
+]
+
+class OrderArchiver:
+    """
+    Moves completed orders past the retention window into the archive table.
+
+    Each batch is a single statement that deletes the orders and their lines and
+    inserts the archive rows, with the lines folded back into `items`, so an order
+    is always in exactly one of the two places. Between passes it creates the coming
+    months' partitions and drops old monthly partitions once they are empty.
+    Postgres only; on other databases it stays idle.
+    """
+
+    def __init__(self, retention_days: int = ORDER_RETENTION_DAYS, batch_size: int = 1000, interval: float = 300.0, months_ahead: int = 2):
+        self.retention = timedelta(days=retention_days)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self._task: Optional[asyncio.Task] = None
+
+        self.archived = 0
+        self.dropped_partitions: List[str] = []
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_duration = 0.0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"ERROR: Order archival pass failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """One full pass: partition upkeep, then archive batches until none are left. Returns orders moved."""
+        started = time.perf_counter()
+        connection = connections.get("default")
+        await connection.execute_query('SELECT "order_ensure_partitions"($1)', [self.months_ahead])
+
+        cutoff = timezone.now() - self.retention
+        moved = 0
+        while True:
+            batch = await self.archive_batch(cutoff)
+            moved += batch
+            if batch < self.batch_size:
+                break
+        await self._drop_empty_partitions(cutoff)
+
+        self.archived += moved
+        self.last_run_at = timezone.now()
+        self.last_run_duration = time.perf_counter() - started
+        return moved
+
+    async def archive_batch(self, cutoff: datetime) -> int:
+        order_table = Order._meta.db_table
+        columns = ", ".join(f'"{column}"' for column in ARCHIVED_COLUMNS)
+        moved_columns = ", ".join(
+            'COALESCE(moved."items", ('
+            "SELECT COALESCE(jsonb_agg(lines.\"name\" ORDER BY lines.\"position\"), '[]'::jsonb) "
+            'FROM lines CROSS JOIN generate_series(1, lines."quantity") '
+            'WHERE lines."order_id" = moved."id"))'
+            if column == "items" else f'moved."{column}"'
+            for column in ARCHIVED_COLUMNS
+        )
+        statuses = ", ".join(f"${i}" for i in range(3, 3 + len(TERMINAL_STATUSES)))
+        query = (
+            f'WITH moved AS ('
+            f'DELETE FROM "{order_table}" WHERE ("id", "created_at") IN ('
+            f'SELECT "id", "created_at" FROM "{order_table}" '
+            f'WHERE "status" IN ({statuses}) AND "created_at" < $1 '
+            f'ORDER BY "created_at" LIMIT $2 FOR UPDATE SKIP LOCKED'
+            f') RETURNING {columns}), '
+            f'lines AS ('
+            f'DELETE FROM "{OrderLine._meta.db_table}" WHERE "order_id" IN (SELECT "id" FROM moved) '
+            f'RETURNING "order_id", "position", "name", "quantity") '
+            f'INSERT INTO "{OrderArchive._meta.db_table}" ({columns}) SELECT {moved_columns} FROM moved RETURNING "id"'
+        )
+        rows = await connections.get("default").execute_query_dict(query, [cutoff, self.batch_size, *TERMINAL_STATUSES])
+        return len(rows)
+
+    async def _drop_empty_partitions(self, cutoff: datetime):
+        """Drops monthly partitions that end before the cutoff and hold no orders any more."""
+        connection = connections.get("default")
+        partitions = await connection.execute_query_dict(
+            "SELECT child.relname AS name FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = $1 AND child.relname LIKE 'order\\_p%'",
+            [Order._meta.db_table],
+        )
+        for partition in partitions:
+            name = partition["name"]
+            month_start = datetime.strptime(name[len("order_p"):], "%Y%m").replace(tzinfo=dt_timezone.utc)
+            month_end = (month_start + timedelta(days=32)).replace(day=1)
+            if month_end > cutoff:
+                continue
+            if await connection.execute_query_dict(f'SELECT 1 FROM "{name}" LIMIT 1'):
+                continue
+            await connection.execute_script(f'DROP TABLE "{name}"')
+            self.dropped_partitions.append(name)
+            print(f"Dropped empty order partition {name}")
+
+    async def stats(self) -> dict:
+        return {
+            "retention_days": self.retention.days,
+            "archived": self.archived,
+            "archive_size": await OrderArchive.all().count(),
+            "dropped_partitions": self.dropped_partitions,
+            "last_run_at": self.last_run_at,
+            "last_run_duration_seconds": self.last_run_duration,
+        }
+
+order_archiver = OrderArchiver()
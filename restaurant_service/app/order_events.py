@@ -0,0 +1,58 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, Set
+
+class OrderEventBroadcaster:
+    """
+    In-process fan-out of order changes to SSE subscribers.
+
+    Each subscriber gets its own bounded queue. A subscriber that falls behind
+    loses its oldest buffered events rather than slowing down publishers or
+    growing without bound; the newest state is always delivered.
+    """
+
+    def __init__(self, buffer_size: int = 16):
+        self.buffer_size = buffer_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self.subscriber_count = 0
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, order_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        self._subscribers[order_id].add(queue)
+        self.subscriber_count += 1
+        return queue
+
+    def unsubscribe(self, order_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(order_id)
+        if subscribers is None or queue not in subscribers:
+            return
+        subscribers.discard(queue)
+        self.subscriber_count -= 1
+        if not subscribers:
+            del self._subscribers[order_id]
+
+    def watched(self, order_id: int) -> bool:
+        """Whether anyone is subscribed to the order, so publishers can skip building events."""
+        return order_id in self._subscribers
+
+    def publish(self, order_id: int, event: dict):
+        """Called after the change is committed. Never blocks."""
+        self.published += 1
+        for queue in self._subscribers.get(order_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscriber_count,
+            "watched_orders": len(self._subscribers),
+            "buffer_size": self.buffer_size,
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+order_events = OrderEventBroadcaster()
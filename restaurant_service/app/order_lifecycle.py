@@ -0,0 +1,175 @@
+import json
+from typing import Dict, List, Optional, Set
+
+from tortoise import connections
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from .db import placeholders, recent_writes
+from .models import Order, OrderLine
+from .schemas import OrderResponse
+
+# Allowed order status transitions: current status -> statuses it may move to.
+ORDER_TRANSITIONS: Dict[str, Set[str]] = {
+    "pending_acceptance": {"accepted", "rejected"},
+    "accepted": {"assigned_to_agent", "preparing", "ready_for_pickup", "rejected"},
+    "assigned_to_agent": {"preparing", "ready_for_pickup", "delivered"},
+    "preparing": {"ready_for_pickup", "delivered", "rejected"},
+    "ready_for_pickup": {"delivered"},
+    "delivered": set(),
+    "rejected": set(),
+}
+
+# Statuses clients may request through PUT /orders/{order_id}/status.
+# assigned_to_agent is only ever set by the assignment dispatcher.
+CLIENT_SETTABLE_STATUSES = {"accepted", "rejected", "preparing", "ready_for_pickup", "delivered"}
+
+def allowed_sources(new_status: str) -> List[str]:
+    """Statuses from which an order may move to `new_status`."""
+    return sorted(source for source, targets in ORDER_TRANSITIONS.items() if new_status in targets)
+
+async def compare_and_set(
+    order_id: int,
+    expected_statuses: List[str],
+    connection: Optional[BaseDBAsyncClient] = None,
+    **changes,
+) -> Optional[dict]:
+    """
+    Applies `changes` to an order in a single conditional UPDATE ... RETURNING.
+
+    Only the given columns are written, and only while the order is still in one
+    of `expected_statuses`. Returns the updated row, or None when the order does
+    not exist or has moved on. The row has no `items`; callers that send it on
+    load them with attach_items().
+    """
+    if not expected_statuses:
+        return None
+    connection = connection or connections.get("default")
+
+    columns = list(changes)
+    marks = placeholders(connection, len(columns) + 1 + len(expected_statuses))
+    assignments = ", ".join(f'"{column}" = {mark}' for column, mark in zip(columns, marks))
+    id_mark = marks[len(columns)]
+    status_marks = ", ".join(marks[len(columns) + 1:])
+
+    query = (
+        f'UPDATE "{Order._meta.db_table}" SET {assignments}, "updated_at" = CURRENT_TIMESTAMP '
+        f'WHERE "id" = {id_mark} AND "status" IN ({status_marks}) RETURNING *'
+    )
+    rows = await connection.execute_query_dict(query, [*changes.values(), order_id, *expected_statuses])
+    if not rows:
+        return None
+    recent_writes.mark("order", order_id)
+    return rows[0]
+
+async def transition_order(
+    order_id: int,
+    new_status: str,
+    connection: Optional[BaseDBAsyncClient] = None,
+    **changes,
+) -> Optional[dict]:
+    """Moves an order to `new_status` if the transition table allows it from its current status."""
+    return await compare_and_set(order_id, allowed_sources(new_status), connection=connection, status=new_status, **changes)
+
+# Rows per INSERT into order_line, keeping bind parameters well under Postgres' 32767 limit.
+LINE_INSERT_CHUNK = 1000
+LINE_COLUMNS = ["order_id", "position", "menu_item_id", "name", "quantity", "unit_price"]
+
+def _multi_row_values(connection: BaseDBAsyncClient, row_count: int, column_count: int) -> str:
+    marks = placeholders(connection, row_count * column_count)
+    return ", ".join(
+        f"({', '.join(marks[i * column_count:(i + 1) * column_count])})" for i in range(row_count)
+    )
+
+def items_from_lines(lines: List[dict]) -> List[str]:
+    """Expands order lines back into the flat `items` list of OrderResponse."""
+    return [line["name"] for line in sorted(lines, key=lambda line: line["position"]) for _ in range(line["quantity"])]
+
+async def insert_orders(rows: List[dict], connection: Optional[BaseDBAsyncClient] = None) -> List[dict]:
+    """
+    Inserts many orders and their lines and returns the new rows, with `items`, in input order.
+    Each row needs restaurant_id, user_id, status, total and lines (see menu_index.order_lines);
+    the timestamps come from the column defaults. Orders go in with one multi-row
+    INSERT ... RETURNING and all their lines with one more, in a single transaction.
+    """
+    if not rows:
+        return []
+    if connection is None:
+        async with in_transaction("default") as connection:
+            return await insert_orders(rows, connection)
+
+    columns = ["restaurant_id", "user_id", "status", "total"]
+    params = []
+    for row in rows:
+        params.extend([row["restaurant_id"], row["user_id"], row["status"], row["total"]])
+
+    column_sql = ", ".join(f'"{column}"' for column in columns)
+    query = (
+        f'INSERT INTO "{Order._meta.db_table}" ({column_sql}) '
+        f'VALUES {_multi_row_values(connection, len(rows), len(columns))} RETURNING *'
+    )
+    inserted = await connection.execute_query_dict(query, params)
+    # Ids come from one sequence in statement order, so sorting restores input order.
+    inserted.sort(key=lambda row: row["id"])
+
+    lines = [
+        {**line, "order_id": order["id"]}
+        for order, row in zip(inserted, rows)
+        for line in row["lines"]
+    ]
+    line_column_sql = ", ".join(f'"{column}"' for column in LINE_COLUMNS)
+    for start in range(0, len(lines), LINE_INSERT_CHUNK):
+        chunk = lines[start:start + LINE_INSERT_CHUNK]
+        await connection.execute_query(
+            f'INSERT INTO "{OrderLine._meta.db_table}" ({line_column_sql}) '
+            f'VALUES {_multi_row_values(connection, len(chunk), len(LINE_COLUMNS))}',
+            [line[column] for line in chunk for column in LINE_COLUMNS],
+        )
+
+    for order, row in zip(inserted, rows):
+        order["items"] = items_from_lines(row["lines"])
+        recent_writes.mark("order", order["id"])
+    return inserted
+
+async def attach_items(rows: List[dict], connection: Optional[BaseDBAsyncClient] = None) -> List[dict]:
+    """
+    Fills `items` from order_line for rows that do not carry them (all live orders),
+    with one query for the whole list. Rows are updated in place and returned.
+    """
+    missing = [row["id"] for row in rows if row.get("items") is None]
+    if not missing:
+        return rows
+    lines = await OrderLine.filter(order_id__in=missing).using_db(connection).values(
+        "order_id", "position", "name", "quantity"
+    )
+    by_order: Dict[int, List[dict]] = {}
+    for line in lines:
+        by_order.setdefault(line["order_id"], []).append(line)
+    for row in rows:
+        if row.get("items") is None:
+            row["items"] = items_from_lines(by_order.get(row["id"], []))
+    return rows
+
+ORDER_RESPONSE_FIELDS = list(OrderResponse.model_fields)
+
+def order_row_to_dict(row: dict) -> dict:
+    """
+    Converts a raw `order` row (or values() dict) into the OrderResponse JSON shape
+    without going through pydantic validation.
+    """
+    items = row["items"]
+    if isinstance(items, (str, bytes)):
+        items = json.loads(items)
+    total = row.get("total")
+    return {
+        **{field: row.get(field) for field in ORDER_RESPONSE_FIELDS},
+        "items": items,
+        "total": float(total) if total is not None else None,
+    }
+
+def order_response(row: dict) -> OrderResponse:
+    """Builds an OrderResponse from a raw `order` row."""
+    items = row["items"]
+    if isinstance(items, (str, bytes)):
+        items = json.loads(items)
+    return OrderResponse(**{**row, "items": items})
@@ -0,0 +1,79 @@
+"""
+Rebuilds the rating aggregates from the ratings stored on orders.
+
+Live and archived orders are scanned in id-keyset chunks so memory stays bounded by the number of
+rated restaurants and agents, not orders. The rebuilt totals replace the
+aggregate table in one transaction at the end. Ratings written while the scan
+is running can be lost, so run it with order rating paused (e.g. during a deploy).
+
+    python -m app.rating_backfill --chunk-size 5000
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from .config import DB_URL
+from .models import Order, OrderArchive, RatingAggregate
+from .ratings import AGENT, RATING_BUCKETS, RESTAURANT, stored_rating
+
+def _empty_aggregate() -> Dict[str, int]:
+    return {"count": 0, "sum": 0, **{bucket: 0 for bucket in RATING_BUCKETS}}
+
+async def rebuild_rating_aggregates(chunk_size: int = 5000) -> int:
+    """Returns the number of aggregate rows written."""
+    totals: Dict[Tuple[str, int], Dict[str, int]] = defaultdict(_empty_aggregate)
+    for model in (Order, OrderArchive):
+        after = 0
+        while True:
+            rows = await model.filter(id__gt=after).order_by("id").limit(chunk_size).values(
+                "id", "restaurant_id", "assigned_agent_id", "restaurant_rating", "agent_rating"
+            )
+            if not rows:
+                break
+            for row in rows:
+                for key, rating in (
+                    ((RESTAURANT, row["restaurant_id"]), row["restaurant_rating"]),
+                    ((AGENT, row["assigned_agent_id"]), row["agent_rating"] if row["assigned_agent_id"] is not None else None),
+                ):
+                    rating = stored_rating(rating, row["id"], key[0])
+                    if rating is None:
+                        continue
+                    aggregate = totals[key]
+                    aggregate["count"] += 1
+                    aggregate["sum"] += rating
+                    aggregate[RATING_BUCKETS[rating - 1]] += 1
+            after = rows[-1]["id"]
+            print(f"Scanned {model._meta.db_table} up to id {after}")
+
+    aggregates = [
+        RatingAggregate(
+            entity_type=entity_type,
+            entity_id=entity_id,
+            average=aggregate["sum"] / aggregate["count"],
+            **aggregate,
+        )
+        for (entity_type, entity_id), aggregate in totals.items()
+    ]
+    async with in_transaction() as connection:
+        await RatingAggregate.all().using_db(connection).delete()
+        await RatingAggregate.bulk_create(aggregates, batch_size=chunk_size, using_db=connection)
+    return len(aggregates)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    await Tortoise.init(db_url=DB_URL, modules={"models": ["app.models"]})
+    try:
+        written = await rebuild_rating_aggregates(args.chunk_size)
+        print(f"Rebuilt {written} rating aggregates")
+    finally:
+        await Tortoise.close_connections()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+from typing import Dict, List, Optional
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from .db import placeholders
+from .models import RatingAggregate
+from .schemas import RatingSummary
+
+RESTAURANT = "restaurant"
+AGENT = "agent"
+RATING_BUCKETS = ["r1", "r2", "r3", "r4", "r5"]
+
+def stored_rating(rating: Optional[int], order_id: int, what: str) -> Optional[int]:
+    """
+    A rating read back from an order, or None if it is missing or outside 1-5.
+    Ratings written before the API checked the range may hold anything; they are
+    left out of the aggregates.
+    """
+    if rating is None:
+        return None
+    if not 1 <= rating <= len(RATING_BUCKETS):
+        print(f"WARNING: Ignoring out-of-range {what} rating {rating} on order {order_id}")
+        return None
+    return rating
+
+def rating_delta(new_rating: int, previous_rating: Optional[int]) -> Dict[str, int]:
+    """
+    Change to an entity's aggregate when one order's rating goes from `previous_rating` to `new_rating`.
+    Pass `previous_rating` through stored_rating() first.
+    """
+    delta = {"count": 0 if previous_rating is not None else 1, "sum": new_rating - (previous_rating or 0)}
+    delta.update({bucket: 0 for bucket in RATING_BUCKETS})
+    delta[RATING_BUCKETS[new_rating - 1]] += 1
+    if previous_rating is not None:
+        delta[RATING_BUCKETS[previous_rating - 1]] -= 1
+    return delta
+
+async def apply_rating_delta(connection: BaseDBAsyncClient, entity_type: str, entity_id: int, delta: Dict[str, int]):
+    """Adds `delta` to an entity's aggregate with a single upsert, creating the row on first rating."""
+    table = RatingAggregate._meta.db_table
+    columns = ["entity_type", "entity_id", "count", "sum", *RATING_BUCKETS, "average"]
+    average = delta["sum"] / delta["count"] if delta["count"] else 0.0
+    values = [entity_type, entity_id, delta["count"], delta["sum"], *(delta[b] for b in RATING_BUCKETS), average]
+
+    column_sql = ", ".join(f'"{c}"' for c in columns)
+    increments = ", ".join(f'"{c}" = "{table}"."{c}" + EXCLUDED."{c}"' for c in ["count", "sum", *RATING_BUCKETS])
+    new_count = f'("{table}"."count" + EXCLUDED."count")'
+    new_sum = f'("{table}"."sum" + EXCLUDED."sum")'
+    query = (
+        f'INSERT INTO "{table}" ({column_sql}) '
+        f'VALUES ({", ".join(placeholders(connection, len(columns)))}) '
+        f'ON CONFLICT ("entity_type", "entity_id") DO UPDATE SET {increments}, '
+        f'"average" = CASE WHEN {new_count} > 0 THEN {new_sum} * 1.0 / {new_count} ELSE 0 END'
+    )
+    await connection.execute_query(query, values)
+
+def rating_summary(entity_type: str, entity_id: int, aggregate: Optional[dict]) -> RatingSummary:
+    if aggregate is None:
+        return RatingSummary(entity_type=entity_type, entity_id=entity_id, count=0, average=0.0, histogram=[0] * len(RATING_BUCKETS))
+    return RatingSummary(
+        entity_type=entity_type,
+        entity_id=entity_id,
+        count=aggregate["count"],
+        average=aggregate["average"],
+        histogram=[aggregate[bucket] for bucket in RATING_BUCKETS],
+    )
+
+async def get_rating_summaries(entity_type: str, entity_ids: List[int]) -> List[RatingSummary]:
+    rows = await RatingAggregate.filter(entity_type=entity_type, entity_id__in=entity_ids).values()
+    by_id = {row["entity_id"]: row for row in rows}
+    return [rating_summary(entity_type, entity_id, by_id.get(entity_id)) for entity_id in entity_ids]
+
+async def get_top_rated(entity_type: str, limit: int, min_count: int) -> List[RatingSummary]:
+    rows = await RatingAggregate.filter(
+        entity_type=entity_type, count__gte=min_count
+    ).order_by("-average", "-count").limit(limit).values()
+    return [rating_summary(entity_type, row["entity_id"], row) for row in rows]
@@ -1,110 +1,275 @@
-from fastapi import APIRouter, HTTPException, status
-import httpx
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from tortoise import timezone
+from tortoise.transactions import in_transaction
 
-from ..models import Order, Restaurant
-from ..schemas import OrderIn, OrderStatusUpdate, OrderRatingUpdate, OrderResponse
-from ..dependencies import delivery_agent_service_client 
+from ..models import AssignmentOutbox, Order, OrderArchive, Restaurant
+from ..schemas import (
+    OrderIn,
+    OrderStatusUpdate,
+    OrderRatingUpdate,
+    OrderResponse,
+    OrderBatchIn,
+    OrderBatchItemResult,
+    OrderBatchResult,
+    OrderPage,
+)
+from ..db import read_connection
+from ..serialization import FastJSONResponse
+from ..dispatcher import assignment_dispatcher
+from ..order_events import order_events
+from ..menu_index import menu_index, order_lines, price_items
+from ..ratings import AGENT, RESTAURANT, apply_rating_delta, rating_delta, stored_rating
+from ..order_lifecycle import (
+    CLIENT_SETTABLE_STATUSES,
+    ORDER_RESPONSE_FIELDS,
+    attach_items,
+    compare_and_set,
+    insert_orders,
+    order_response,
+    order_row_to_dict,
+    transition_order,
+)
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SSE_HEARTBEAT_SECONDS = 15
+
+@router.get("", response_model=OrderPage)
+async def list_orders(
+    user_id: Optional[int] = None,
+    restaurant_id: Optional[int] = None,
+    status: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Lists a user's or a restaurant's orders, newest first.
+    Pass the returned next_cursor as `after` to fetch the following page.
+    """
+    if user_id is None and restaurant_id is None:
+        raise HTTPException(status_code=400, detail="Either user_id or restaurant_id is required.")
+
+    query = Order.all()
+    if user_id is not None:
+        query = query.filter(user_id=user_id)
+    if restaurant_id is not None:
+        query = query.filter(restaurant_id=restaurant_id)
+    if status is not None:
+        query = query.filter(status=status.lower())
+    if after is not None:
+        query = query.filter(id__lt=after)
+
+    rows = await query.order_by("-id").limit(limit + 1).values(*ORDER_RESPONSE_FIELDS)
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    page = await attach_items(rows[:limit])
+    return FastJSONResponse({"items": [order_row_to_dict(row) for row in page], "next_cursor": next_cursor})
+
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(order_in: OrderIn):
-    restaurant_obj = await Restaurant.get_or_none(id=order_in.restaurant_id, online=True)
-    if not restaurant_obj:
+    if not await Restaurant.exists(id=order_in.restaurant_id, online=True):
         raise HTTPException(status_code=404, detail="Restaurant not found or not online.")
 
-    db_order = await Order.create(
-        restaurant=restaurant_obj,
-        user_id=order_in.user_id,
-        status="pending_acceptance",
-        items=order_in.items
-    )
-    return OrderResponse.from_orm(db_order)
+    menu = await menu_index.get(order_in.restaurant_id)
+    try:
+        total = price_items(menu, order_in.items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.put("/{order_id}/status", response_model=OrderResponse)
-async def update_order_status(order_id: int, status_update: OrderStatusUpdate):
-    order = await Order.get_or_none(id=order_id)
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found.")
+    rows = await insert_orders([{
+        "restaurant_id": order_in.restaurant_id,
+        "user_id": order_in.user_id,
+        "status": "pending_acceptance",
+        "total": total,
+        "lines": order_lines(menu, order_in.items),
+    }])
+    return FastJSONResponse(order_row_to_dict(rows[0]), status_code=status.HTTP_201_CREATED)
 
-    new_status = status_update.status.lower()
+@router.post("/batch", response_model=OrderBatchResult)
+async def create_orders_batch(batch: OrderBatchIn):
+    """
+    Places many orders in one call.
+    Restaurants are checked once per distinct id and all valid orders are inserted
+    with one statement for the orders and one for their lines; orders for unknown or offline restaurants, or with unknown
+    or unavailable items, are reported per item.
+    """
+    restaurant_ids = {order_in.restaurant_id for order_in in batch.orders}
+    online_ids = set(await Restaurant.filter(id__in=restaurant_ids, online=True).values_list("id", flat=True))
+    menus = {restaurant_id: await menu_index.get(restaurant_id) for restaurant_id in online_ids}
+
+    errors = {}
+    accepted = []
+    for index, order_in in enumerate(batch.orders):
+        if order_in.restaurant_id not in online_ids:
+            errors[index] = "Restaurant not found or not online."
+            continue
+        menu = menus[order_in.restaurant_id]
+        try:
+            total = price_items(menu, order_in.items)
+        except ValueError as e:
+            errors[index] = str(e)
+            continue
+        accepted.append((index, {
+            "restaurant_id": order_in.restaurant_id,
+            "user_id": order_in.user_id,
+            "status": "pending_acceptance",
+            "total": total,
+            "lines": order_lines(menu, order_in.items),
+        }))
 
+    rows = await insert_orders([row for _, row in accepted])
+    created = {index: row for (index, _), row in zip(accepted, rows)}
+
+    results = [
+        OrderBatchItemResult(index=index, ok=True, order=order_response(created[index]))
+        if index in created
+        else OrderBatchItemResult(index=index, ok=False, error=errors[index])
+        for index in range(len(batch.orders))
+    ]
+    return OrderBatchResult(created=len(created), failed=len(results) - len(created), results=results)
+
+async def _raise_transition_error(order_id: int, new_status: str):
+    """Explains why a conditional status update matched no row."""
+    statuses = await Order.filter(id=order_id).values_list("status", flat=True)
+    if not statuses:
+        raise HTTPException(status_code=404, detail="Order not found.")
+    current_status = statuses[0]
     if new_status == "accepted":
-        if order.status != "pending_acceptance":
-            raise HTTPException(status_code=400, detail=f"Order cannot be accepted from status: {order.status}")
+        raise HTTPException(status_code=400, detail=f"Order cannot be accepted from status: {current_status}")
+    if new_status == "rejected":
+        raise HTTPException(status_code=400, detail=f"Order cannot be rejected from status: {current_status}")
+    raise HTTPException(status_code=400, detail=f"Order cannot move to '{new_status}' from status: {current_status}")
 
-        order.status = "accepted"
-        await order.save()
+@router.put("/{order_id}/status", response_model=OrderResponse)
+async def update_order_status(order_id: int, status_update: OrderStatusUpdate):
+    new_status = status_update.status.lower()
+    if new_status not in CLIENT_SETTABLE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid or unsupported order status: {new_status}")
 
-        try:
-            resp = await delivery_agent_service_client.post("/assign", json={"order_id": order_id})
-            resp.raise_for_status()
-            assignment_result = resp.json()
-            assigned_agent_id = assignment_result.get("agent_id")
-
-            order.status = "assigned_to_agent"
-            order.assigned_agent_id = assigned_agent_id
-            await order.save()
-
-            return OrderResponse.from_orm(order)
-        except httpx.ConnectError:
-            order.status = "acceptance_failed_no_agent"
-            await order.save()
-            raise HTTPException(status_code=503, detail="Delivery agent service is unavailable for assignment. Order accepted but not assigned.")
-        except httpx.ReadTimeout:
-            order.status = "acceptance_failed_timeout"
-            await order.save()
-            raise HTTPException(status_code=504, detail="Delivery agent service timed out during assignment. Order accepted but not assigned.")
-        except httpx.HTTPStatusError as exc:
-            order.status = "acceptance_failed_agent_service_error"
-            await order.save()
-            if exc.response.status_code == 409 and "No available agents" in exc.response.text:
-                 raise HTTPException(status_code=409, detail="No available delivery agents to assign. Order accepted but stuck.")
-            raise HTTPException(status_code=exc.response.status_code, detail=f"Delivery service error during assignment: {exc.response.text}")
-        except Exception as e:
-            order.status = "acceptance_failed_unexpected"
-            await order.save()
-            raise HTTPException(status_code=500, detail=f"Unexpected error during delivery assignment: {str(e)}")
+    if new_status == "accepted":
+        async with in_transaction("default") as connection:
+            row = await transition_order(order_id, "accepted", connection=connection)
+            if row:
+                await AssignmentOutbox.create(order_id=order_id, next_attempt_at=timezone.now(), using_db=connection)
+        if row:
+            assignment_dispatcher.notify()
 
     elif new_status == "rejected":
-        if order.status not in ["pending_acceptance", "accepted", "preparing"]:
-            raise HTTPException(status_code=400, detail=f"Order cannot be rejected from status: {order.status}")
-        order.status = "rejected"
-        await order.save()
-        return OrderResponse.from_orm(order)
-
-    elif new_status in ["preparing", "ready_for_pickup", "delivered"]:
-        order.status = new_status
-        await order.save()
-        return OrderResponse.from_orm(order)
+        async with in_transaction("default") as connection:
+            row = await transition_order(order_id, "rejected", connection=connection)
+            if row:
+                # Nothing was sent for an untried, unleased row. Any other may have
+                # claimed an agent already, so it has to release that agent instead.
+                await AssignmentOutbox.filter(
+                    order_id=order_id, attempts=0, next_attempt_at__lte=timezone.now()
+                ).using_db(connection).delete()
+                in_flight = await AssignmentOutbox.filter(order_id=order_id).using_db(connection).update(action="release")
+                if not in_flight and row["assigned_agent_id"] is not None:
+                    # The assignment finished before the rejection; its agent is freed the same way.
+                    await AssignmentOutbox.create(
+                        order_id=order_id, action="release", next_attempt_at=timezone.now(), using_db=connection
+                    )
+        if row:
+            assignment_dispatcher.notify()
 
     else:
-        raise HTTPException(status_code=400, detail=f"Invalid or unsupported order status: {new_status}")
+        row = await transition_order(order_id, new_status)
+
+    if not row:
+        await _raise_transition_error(order_id, new_status)
+    # Items are read after commit, off the transition; order lines never change.
+    await attach_items([row])
+    order = order_row_to_dict(row)
+    order_events.publish(order_id, order)
+    return FastJSONResponse(order)
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order_details(order_id: int):
     """
-    Retrieves details for a specific order.
+    Retrieves details for a specific order, falling back to the archive for old completed orders.
     Used internally by other services (e.g., delivery_agent_service).
     """
-    order = await Order.get_or_none(id=order_id)
-    if not order:
+    connection = read_connection("order", order_id)
+    rows = await Order.filter(id=order_id).using_db(connection).values(*ORDER_RESPONSE_FIELDS)
+    if rows:
+        await attach_items(rows, connection)
+    else:
+        rows = await OrderArchive.filter(id=order_id).using_db(connection).values(*ORDER_RESPONSE_FIELDS)
+    if not rows:
         raise HTTPException(status_code=404, detail="Order not found.")
-    return OrderResponse.from_orm(order)
+    return FastJSONResponse(order_row_to_dict(rows[0]))
+
+def _sse_event(order: dict) -> str:
+    return f"event: order\ndata: {json.dumps(order, separators=(',', ':'))}\n\n"
+
+@router.get("/{order_id}/events")
+async def order_event_stream(order_id: int):
+    """
+    Server-sent events feed of an order's changes.
+    Starts with the current state, then sends one `order` event per committed change.
+    """
+    if not await Order.exists(id=order_id):
+        raise HTTPException(status_code=404, detail="Order not found.")
+
+    async def stream():
+        # Subscribe before reading the snapshot so no change after it is missed.
+        queue = order_events.subscribe(order_id)
+        try:
+            rows = await attach_items(await Order.filter(id=order_id).values(*ORDER_RESPONSE_FIELDS))
+            if rows:
+                yield _sse_event(order_row_to_dict(rows[0]))
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse_event(event)
+        finally:
+            order_events.unsubscribe(order_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.put("/{order_id}/rate", response_model=OrderResponse)
 async def rate_order(order_id: int, ratings: OrderRatingUpdate):
     """
     Updates the ratings for a specific order.
     """
-    order = await Order.get_or_none(id=order_id)
-    if not order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found.")
+    async with in_transaction("default") as connection:
+        # Lock the row first so re-ratings adjust the aggregates by the right delta.
+        previous = await Order.filter(id=order_id).select_for_update().using_db(connection).first()
+        row = await compare_and_set(
+            order_id,
+            ["delivered"],
+            connection=connection,
+            restaurant_rating=ratings.restaurant_rating,
+            agent_rating=ratings.agent_rating,
+        )
+        if row:
+            await apply_rating_delta(
+                connection, RESTAURANT, row["restaurant_id"],
+                rating_delta(ratings.restaurant_rating, stored_rating(previous.restaurant_rating, order_id, RESTAURANT)),
+            )
+            if row["assigned_agent_id"] is not None:
+                await apply_rating_delta(
+                    connection, AGENT, row["assigned_agent_id"],
+                    rating_delta(ratings.agent_rating, stored_rating(previous.agent_rating, order_id, AGENT)),
+                )
 
-    if order.status != "delivered":
+    if not row:
+        if not previous:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found.")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order must be delivered to be rated.")
-
-    order.restaurant_rating = ratings.restaurant_rating
-    order.agent_rating = ratings.agent_rating
-    await order.save()
-    return OrderResponse.from_orm(order)
+    await attach_items([row])
+    order = order_row_to_dict(row)
+    order_events.publish(order_id, order)
+    return FastJSONResponse(order)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Query
+from typing import List
+
+from ..ratings import AGENT, RESTAURANT, get_rating_summaries, get_top_rated
+from ..schemas import RatingSummary
+
+router = APIRouter(prefix="/ratings", tags=["Ratings"])
+
+@router.get("/restaurants/top", response_model=List[RatingSummary])
+async def top_rated_restaurants(limit: int = Query(10, ge=1, le=100), min_count: int = Query(1, ge=1)):
+    """
+    Highest rated restaurants with at least `min_count` ratings, served from the aggregate table.
+    """
+    return await get_top_rated(RESTAURANT, limit, min_count)
+
+@router.get("/restaurants", response_model=List[RatingSummary])
+async def restaurant_ratings(ids: List[int] = Query(...)):
+    return await get_rating_summaries(RESTAURANT, ids)
+
+@router.get("/restaurants/{restaurant_id}", response_model=RatingSummary)
+async def restaurant_rating(restaurant_id: int):
+    return (await get_rating_summaries(RESTAURANT, [restaurant_id]))[0]
+
+@router.get("/agents", response_model=List[RatingSummary])
+async def agent_ratings(ids: List[int] = Query(...)):
+    return await get_rating_summaries(AGENT, ids)
+
+@router.get("/agents/{agent_id}", response_model=RatingSummary)
+async def agent_rating(agent_id: int):
+    return (await get_rating_summaries(AGENT, [agent_id]))[0]
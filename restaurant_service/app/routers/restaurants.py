@@ -1,18 +1,92 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+import csv
+import io
+import json
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+from typing import List, Optional
 
-from ..models import Restaurant, MenuItem
-from ..schemas import RestaurantIn, RestaurantUpdate, MenuItemIn, MenuItemUpdate
+from ..models import Restaurant, MenuItem, OrderLine
+from ..schemas import RestaurantIn, RestaurantOut, RestaurantPage, RestaurantUpdate, MenuItemIn, MenuItemUpdate, MenuImportResult, MenuItemPopularity
+from ..menu_cache import menu_cache, etag_matches
+from ..menu_index import menu_index
+from ..gateway_cache import gateway_cache
+from ..db import placeholders, read_connection, recent_writes
+from ..serialization import MENU_ITEM_FIELDS, FastJSONResponse, dumps, menu_item_to_dict
 
 router = APIRouter(prefix="/restaurants", tags=["Restaurants"])
 
-@router.get("/available", response_model=List[RestaurantIn])
-async def list_online():
-    return await Restaurant.filter(online=True).all()
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MAX_IMPORT_ROWS = 20000
+IMPORT_BATCH_SIZE = 2000
+RESTAURANT_FIELDS = list(RestaurantOut.model_fields)
+
+menu_items_adapter = TypeAdapter(List[MenuItemIn])
+
+def _menu_changed(restaurant_id: int):
+    """Drops every in-process view of a restaurant's menu after a committed write."""
+    recent_writes.mark("menu", restaurant_id)
+    menu_cache.invalidate(restaurant_id)
+    menu_index.invalidate(restaurant_id)
+
+async def _online_restaurants_after(after: Optional[int], limit: int, connection: BaseDBAsyncClient) -> List[dict]:
+    query = Restaurant.filter(online=True).using_db(connection)
+    if after is not None:
+        query = query.filter(id__gt=after)
+    return await query.order_by("id").limit(limit).values(*RESTAURANT_FIELDS)
+
+async def _stream_online_restaurants(after: Optional[int], connection: BaseDBAsyncClient):
+    """Walks online restaurants in id order, one keyset chunk at a time, so memory stays flat."""
+    while True:
+        rows = await _online_restaurants_after(after, STREAM_CHUNK_SIZE, connection)
+        if not rows:
+            return
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+        if len(rows) < STREAM_CHUNK_SIZE:
+            return
+        after = rows[-1]["id"]
+
+@router.get("/available", response_model=RestaurantPage)
+async def list_online(
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    accept: Optional[str] = Header(None),
+):
+    """
+    Lists online restaurants in id order, one page at a time.
+    Pass the returned next_cursor as `after` to fetch the following page.
+    With `Accept: application/x-ndjson` every online restaurant after the cursor
+    is streamed instead, one JSON object per line.
+    """
+    connection = read_connection("restaurant")
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(_stream_online_restaurants(after, connection), media_type=NDJSON_MEDIA_TYPE)
+
+    rows = await _online_restaurants_after(after, limit + 1, connection)
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return FastJSONResponse({"items": rows[:limit], "next_cursor": next_cursor})
+
+@router.get("", response_model=List[RestaurantOut])
+async def get_restaurants_by_ids(ids: List[int] = Query(...)):
+    """
+    Retrieves several restaurants in one call.
+    Used by the user_service's GraphQL gateway to batch relation lookups.
+    """
+    rows = await Restaurant.filter(id__in=ids).using_db(read_connection("restaurant")).values(*RESTAURANT_FIELDS)
+    return FastJSONResponse(rows)
 
 @router.post("", response_model=RestaurantIn, status_code=status.HTTP_201_CREATED)
 async def add_restaurant(r_in: RestaurantIn):
-    return await Restaurant.create(**r_in.model_dump())
+    restaurant = await Restaurant.create(**r_in.model_dump())
+    recent_writes.mark("restaurant", restaurant.id)
+    # Clears a "not found" the gateway may have cached for this id.
+    gateway_cache.evict("restaurant", [restaurant.id])
+    return restaurant
 
 @router.put("/{restaurant_id}", response_model=RestaurantIn)
 async def update_restaurant(restaurant_id: int, r_update: RestaurantUpdate):
@@ -23,6 +97,8 @@ async def update_restaurant(restaurant_id: int, r_update: RestaurantUpdate):
     update_data = r_update.model_dump(exclude_unset=True)
     if update_data:
         await restaurant.update_from_dict(update_data).save()
+        recent_writes.mark("restaurant", restaurant_id)
+        gateway_cache.evict("restaurant", [restaurant_id])
     return restaurant
 
 @router.post("/{restaurant_id}/menu", response_model=MenuItemIn, status_code=status.HTTP_201_CREATED)
@@ -32,8 +108,71 @@ async def add_menu_item(restaurant_id: int, item_in: MenuItemIn):
         raise HTTPException(status_code=404, detail="Restaurant not found.")
 
     new_item = await MenuItem.create(restaurant=restaurant, **item_in.model_dump())
+    _menu_changed(restaurant_id)
     return new_item
 
+def _parse_menu_csv(body: bytes) -> List[dict]:
+    rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+    for row in rows:
+        if not row.get("description"):
+            row["description"] = None
+        if row.get("available") in ("", None):
+            row.pop("available", None)
+    return rows
+
+@router.post("/{restaurant_id}/menu/bulk", response_model=MenuImportResult)
+async def import_menu(restaurant_id: int, request: Request):
+    """
+    Imports many menu items at once from a JSON array or a CSV upload (Content-Type: text/csv).
+    Items are matched by name: existing ones are updated, the rest are inserted.
+    """
+    if not await Restaurant.exists(id=restaurant_id):
+        raise HTTPException(status_code=404, detail="Restaurant not found.")
+
+    body = await request.body()
+    try:
+        if "text/csv" in request.headers.get("content-type", ""):
+            raw_items = _parse_menu_csv(body)
+        else:
+            raw_items = json.loads(body)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse menu import: {str(e)}")
+
+    if not isinstance(raw_items, list):
+        raise HTTPException(status_code=400, detail="Menu import must be a list of menu items.")
+    if len(raw_items) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=400, detail=f"Menu import is limited to {MAX_IMPORT_ROWS} items per request.")
+
+    try:
+        items_in = menu_items_adapter.validate_python(raw_items)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+    # Last occurrence wins when the same name appears twice in one import.
+    items_by_name = {item.name: item for item in items_in}
+
+    async with in_transaction("default") as connection:
+        existing = await MenuItem.filter(restaurant_id=restaurant_id).using_db(connection).values("id", "name")
+        existing_ids = {row["name"]: row["id"] for row in existing}
+
+        to_create = [
+            MenuItem(restaurant_id=restaurant_id, **item.model_dump())
+            for name, item in items_by_name.items() if name not in existing_ids
+        ]
+        to_update = [
+            MenuItem(id=existing_ids[name], restaurant_id=restaurant_id, **item.model_dump())
+            for name, item in items_by_name.items() if name in existing_ids
+        ]
+        if to_create:
+            await MenuItem.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE, using_db=connection)
+        if to_update:
+            await MenuItem.bulk_update(
+                to_update, fields=["description", "price", "available"], batch_size=IMPORT_BATCH_SIZE, using_db=connection
+            )
+
+    _menu_changed(restaurant_id)
+    return MenuImportResult(created=len(to_create), updated=len(to_update))
+
 @router.put("/{restaurant_id}/menu/{item_id}", response_model=MenuItemIn)
 async def update_menu_item(restaurant_id: int, item_id: int, item_update: MenuItemUpdate):
     item = await MenuItem.get_or_none(id=item_id, restaurant_id=restaurant_id)
@@ -43,14 +182,50 @@ async def update_menu_item(restaurant_id: int, item_id: int, item_update: MenuIt
     update_data = item_update.model_dump(exclude_unset=True)
     if update_data:
         await item.update_from_dict(update_data).save()
+        _menu_changed(restaurant_id)
     return item
 
 @router.get("/{restaurant_id}/menu", response_model=List[MenuItemIn])
-async def get_menu(restaurant_id: int):
-    restaurant = await Restaurant.get_or_none(id=restaurant_id)
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found.")
-    return await MenuItem.filter(restaurant=restaurant).all()
+async def get_menu(restaurant_id: int, if_none_match: Optional[str] = Header(None)):
+    """
+    Returns the restaurant's menu from the in-process cache when possible.
+    Clients sending a matching If-None-Match get a 304 without touching the database.
+    """
+    cached = menu_cache.get(restaurant_id)
+    if cached is None:
+        version = menu_cache.version(restaurant_id)
+        # A menu written within the sticky window is read back from the primary,
+        # so the cache is never filled with a replica copy older than the write.
+        connection = read_connection("menu", restaurant_id)
+        if not await Restaurant.filter(id=restaurant_id).using_db(connection).exists():
+            raise HTTPException(status_code=404, detail="Restaurant not found.")
+        rows = await MenuItem.filter(restaurant_id=restaurant_id).using_db(connection).values(*MENU_ITEM_FIELDS)
+        body = dumps([menu_item_to_dict(row) for row in rows])
+        cached = menu_cache.put(restaurant_id, version, body)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@router.get("/{restaurant_id}/menu/popularity", response_model=List[MenuItemPopularity])
+async def menu_popularity(restaurant_id: int, limit: int = Query(10, ge=1, le=100)):
+    """
+    The restaurant's most ordered menu items, aggregated in SQL over live order lines.
+    Archived orders are not counted.
+    """
+    connection = read_connection()
+    restaurant_mark, limit_mark = placeholders(connection, 2)
+    line_table = OrderLine._meta.db_table
+    menu_table = MenuItem._meta.db_table
+    return await connection.execute_query_dict(
+        f'SELECT line."menu_item_id", item."name", SUM(line."quantity") AS "quantity", COUNT(*) AS "orders" '
+        f'FROM "{line_table}" line JOIN "{menu_table}" item ON item."id" = line."menu_item_id" '
+        f'WHERE item."restaurant_id" = {restaurant_mark} '
+        f'GROUP BY line."menu_item_id", item."name" '
+        f'ORDER BY "quantity" DESC, line."menu_item_id" LIMIT {limit_mark}',
+        [restaurant_id, limit],
+    )
 
 @router.get("/{restaurant_id}", response_model=RestaurantIn)
 async def get_restaurant(restaurant_id: int):
@@ -58,7 +233,7 @@ async def get_restaurant(restaurant_id: int):
     Retrieves details for a specific restaurant by its ID.
     This endpoint is used by the user_service's GraphQL gateway.
     """
-    restaurant = await Restaurant.get_or_none(id=restaurant_id)
-    if not restaurant:
+    rows = await Restaurant.filter(id=restaurant_id).using_db(read_connection("restaurant", restaurant_id)).values(*RestaurantIn.model_fields)
+    if not rows:
         raise HTTPException(status_code=404, detail="Restaurant not found.")
-    return restaurant
+    return FastJSONResponse(rows[0])
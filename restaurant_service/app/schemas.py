@@ -1,16 +1,33 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 # --- Restaurant Schemas ---
 class RestaurantIn(BaseModel):
     name: str
     online: bool = True
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     class Config:
         from_attributes = True
 
+class RestaurantOut(BaseModel):
+    id: int
+    name: str
+    online: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    class Config:
+        from_attributes = True
+
+class RestaurantPage(BaseModel):
+    items: List[RestaurantOut]
+    next_cursor: Optional[int] = None
+
 class RestaurantUpdate(BaseModel):
     name: Optional[str] = None
     online: Optional[bool] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     class Config:
         from_attributes = True
 
@@ -31,6 +48,16 @@ class MenuItemUpdate(BaseModel):
     class Config:
         from_attributes = True
 
+class MenuImportResult(BaseModel):
+    created: int
+    updated: int
+
+class MenuItemPopularity(BaseModel):
+    menu_item_id: int
+    name: str
+    quantity: int
+    orders: int
+
 # --- Order Schemas ---
 class OrderIn(BaseModel):
     user_id: int
@@ -45,8 +72,8 @@ class OrderStatusUpdate(BaseModel):
         from_attributes = True
 
 class OrderRatingUpdate(BaseModel):
-    restaurant_rating: int
-    agent_rating: int
+    restaurant_rating: int = Field(..., ge=1, le=5)
+    agent_rating: int = Field(..., ge=1, le=5)
     class Config:
         from_attributes = True
 
@@ -59,6 +86,33 @@ class OrderResponse(BaseModel):
     assigned_agent_id: Optional[int] = None
     restaurant_rating: Optional[int] = None
     agent_rating: Optional[int] = None
+    total: Optional[float] = None
 
     class Config:
         from_attributes = True
+
+class OrderPage(BaseModel):
+    items: List[OrderResponse]
+    next_cursor: Optional[int] = None
+
+class OrderBatchIn(BaseModel):
+    orders: List[OrderIn] = Field(..., min_length=1, max_length=5000)
+
+class OrderBatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    order: Optional[OrderResponse] = None
+    error: Optional[str] = None
+
+class OrderBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchItemResult]
+
+# --- Rating Schemas ---
+class RatingSummary(BaseModel):
+    entity_type: str
+    entity_id: int
+    count: int
+    average: float
+    histogram: List[int]
@@ -0,0 +1,33 @@
+"""
+Fast-path JSON encoding for the hot order and menu endpoints.
+
+Handlers build plain dicts straight from ORM values and return them in a
+FastJSONResponse, which skips FastAPI's response_model validation and
+jsonable_encoder pass. The encoded bytes match what FastAPI's JSONResponse
+produces for the same schemas: compact separators and raw UTF-8.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(content: Any) -> bytes:
+    """Encodes `content` with orjson when it is installed, otherwise with the stdlib in FastAPI's format."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+MENU_ITEM_FIELDS = ["name", "description", "price", "available"]
+
+def menu_item_to_dict(row: dict) -> dict:
+    """Converts a MenuItem values() dict into the MenuItemIn JSON shape."""
+    return {**row, "price": float(row["price"])}
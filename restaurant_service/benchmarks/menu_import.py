@@ -0,0 +1,82 @@
+"""
+Benchmark: onboarding a large menu item by item vs with one bulk import.
+
+Creates two fresh restaurants and loads the same generated menu into each,
+once through POST /restaurants/{id}/menu and once through
+POST /restaurants/{id}/menu/bulk.
+
+    python benchmarks/menu_import.py --items 10000
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def generate_menu(count: int):
+    return [
+        {"name": f"Item {i}", "description": f"Generated dish number {i}", "price": round(5 + (i % 200) * 0.25, 2), "available": i % 10 != 0}
+        for i in range(count)
+    ]
+
+
+async def create_restaurant(client: httpx.AsyncClient, name: str) -> int:
+    resp = await client.post("/restaurants", json={"name": name, "online": True})
+    resp.raise_for_status()
+    restaurants = (await client.get("/restaurants/available", params={"limit": 500})).json()
+    # POST /restaurants does not echo the id, so walk the pages for the newest match.
+    restaurant_id = None
+    while True:
+        for r in restaurants["items"]:
+            if r["name"] == name:
+                restaurant_id = r["id"]
+        if restaurants["next_cursor"] is None:
+            return restaurant_id
+        restaurants = (await client.get("/restaurants/available", params={"limit": 500, "after": restaurants["next_cursor"]})).json()
+
+
+async def import_per_item(client: httpx.AsyncClient, restaurant_id: int, menu, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def add(item):
+        async with semaphore:
+            resp = await client.post(f"/restaurants/{restaurant_id}/menu", json=item)
+            resp.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[add(item) for item in menu])
+    return time.perf_counter() - started
+
+
+async def import_bulk(client: httpx.AsyncClient, restaurant_id: int, menu) -> float:
+    started = time.perf_counter()
+    resp = await client.post(f"/restaurants/{restaurant_id}/menu/bulk", json=menu)
+    resp.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=20, help="parallel requests for the per-item run")
+    args = parser.parse_args()
+
+    menu = generate_menu(args.items)
+    stamp = int(time.time())
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120.0) as client:
+        per_item_restaurant = await create_restaurant(client, f"bench-per-item-{stamp}")
+        bulk_restaurant = await create_restaurant(client, f"bench-bulk-{stamp}")
+
+        per_item = await import_per_item(client, per_item_restaurant, menu, args.concurrency)
+        bulk = await import_bulk(client, bulk_restaurant, menu)
+
+    print(f"items:     {args.items}")
+    print(f"per-item:  {per_item:.3f}s ({args.items / per_item:.0f} items/s, concurrency {args.concurrency})")
+    print(f"bulk:      {bulk:.3f}s ({args.items / bulk:.0f} items/s)")
+    print(f"speedup:   {per_item / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
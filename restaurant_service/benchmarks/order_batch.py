@@ -0,0 +1,46 @@
+"""
+Benchmark: placing many orders through POST /orders/batch.
+
+Sends one batch of orders spread over the given restaurant ids and reports the
+wall-clock time of the call and the created/failed split.
+
+    python benchmarks/order_batch.py --orders 1000 --restaurant-ids 1 2 3
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--restaurant-ids", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    orders = [
+        {
+            "user_id": 1000 + i,
+            "restaurant_id": args.restaurant_ids[i % len(args.restaurant_ids)],
+            "items": ["Classic Burger", "Fries"],
+        }
+        for i in range(args.orders)
+    ]
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0) as client:
+        started = time.perf_counter()
+        resp = await client.post("/orders/batch", json={"orders": orders})
+        elapsed = time.perf_counter() - started
+    resp.raise_for_status()
+    result = resp.json()
+
+    print(f"orders:   {args.orders}")
+    print(f"created:  {result['created']}")
+    print(f"failed:   {result['failed']}")
+    print(f"elapsed:  {elapsed:.3f}s ({args.orders / elapsed:.0f} orders/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Microbenchmark: per-response CPU cost of the order and menu JSON fast path.
+
+Compares the old handler path (from_orm, then FastAPI's response_model
+validation and serialization, then the stdlib encoder) with the fast path
+(plain dicts from ORM values, encoded by app.serialization.dumps). Checks that
+both produce identical bytes before timing anything. No database is needed;
+run from the restaurant_service directory:
+
+    python -m benchmarks.serialization --iterations 20000 --menu-items 40
+"""
+import argparse
+import json
+import sys
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.order_lifecycle import ORDER_RESPONSE_FIELDS, order_row_to_dict
+from app.schemas import MenuItemIn, OrderResponse
+from app.serialization import MENU_ITEM_FIELDS, dumps, menu_item_to_dict, orjson
+
+order_adapter = TypeAdapter(OrderResponse)
+menu_adapter = TypeAdapter(List[MenuItemIn])
+
+
+def fastapi_render(adapter: TypeAdapter, value) -> bytes:
+    """What FastAPI does with a handler's return value: validate, serialize, json.dumps."""
+    validated = adapter.validate_python(value, from_attributes=True)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def sample_order_row() -> dict:
+    return {
+        "id": 123456,
+        "restaurant_id": 42,
+        "user_id": 9001,
+        "status": "assigned_to_agent",
+        "items": ["Classic Burger", "Fries", "Crème brûlée"],
+        "assigned_agent_id": 7,
+        "restaurant_rating": None,
+        "agent_rating": None,
+        "total": Decimal("27.40"),
+    }
+
+
+def sample_menu_rows(count: int) -> List[dict]:
+    return [
+        {"name": f"Item {i}", "description": "Grilled, served with salad" if i % 3 else None, "price": Decimal(f"{i}.{i % 100:02d}"), "available": i % 5 != 0}
+        for i in range(1, count + 1)
+    ]
+
+
+def old_order(row: dict) -> bytes:
+    return fastapi_render(order_adapter, OrderResponse.model_validate(SimpleNamespace(**row)))
+
+
+def new_order(row: dict) -> bytes:
+    return dumps(order_row_to_dict({field: row[field] for field in ORDER_RESPONSE_FIELDS}))
+
+
+def old_menu(rows: List[dict]) -> bytes:
+    return fastapi_render(menu_adapter, [SimpleNamespace(**row) for row in rows])
+
+
+def new_menu(rows: List[dict]) -> bytes:
+    return dumps([menu_item_to_dict({field: row[field] for field in MENU_ITEM_FIELDS}) for row in rows])
+
+
+def timed(fn, arg, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(arg)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--menu-items", type=int, default=40)
+    args = parser.parse_args()
+
+    order_row = sample_order_row()
+    menu_rows = sample_menu_rows(args.menu_items)
+    cases = [
+        ("order", old_order, new_order, order_row),
+        (f"menu ({args.menu_items} items)", old_menu, new_menu, menu_rows),
+    ]
+
+    print(f"encoder: {'orjson' if orjson is not None else 'stdlib json'}")
+    for name, old, new, arg in cases:
+        if old(arg) != new(arg):
+            print(f"{name}: response bodies differ\n  old: {old(arg)!r}\n  new: {new(arg)!r}")
+            sys.exit(1)
+        old_us = timed(old, arg, args.iterations)
+        new_us = timed(new, arg, args.iterations)
+        print(f"{name:<18} old {old_us:8.1f} us  new {new_us:8.1f} us  ({old_us / new_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+
+RESTAURANT_SERVICE_URL = os.getenv("RESTAURANT_SERVICE_URL", "http://restaurant_service:8001")
+DELIVERY_AGENT_SERVICE_URL = os.getenv("DELIVERY_AGENT_SERVICE_URL", "http://delivery_agent_service:8002")
+
+# Entity cache for restaurant and agent lookups. Entries are fresh for their TTL,
+# then served stale for up to *_CACHE_STALE_SECONDS while a background fetch
+# refreshes them. Not-found answers are remembered for ENTITY_CACHE_NEGATIVE_TTL_SECONDS.
+RESTAURANT_CACHE_TTL_SECONDS = float(os.getenv("RESTAURANT_CACHE_TTL_SECONDS", "60"))
+RESTAURANT_CACHE_STALE_SECONDS = float(os.getenv("RESTAURANT_CACHE_STALE_SECONDS", "30"))
+# Agents carry availability and load, which change on every assignment and
+# nobody pushes agent evictions, so they are never served past their TTL.
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "5"))
+AGENT_CACHE_STALE_SECONDS = float(os.getenv("AGENT_CACHE_STALE_SECONDS", "0"))
+ENTITY_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("ENTITY_CACHE_NEGATIVE_TTL_SECONDS", "5"))
+ENTITY_CACHE_MAX_ENTRIES = int(os.getenv("ENTITY_CACHE_MAX_ENTRIES", "10000"))
+
+# Shared secret the backing services send with POST /cache/invalidate.
+# Unset disables the endpoint.
+CACHE_INVALIDATION_TOKEN = os.getenv("CACHE_INVALIDATION_TOKEN") or None
+
+# Concurrent identical GETs to the backing services share one upstream request.
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Upper bound on concurrent upstream SSE streams for orderUpdates subscriptions
+# (one per watched order, however many clients watch it).
+ORDER_RELAY_MAX_STREAMS = int(os.getenv("ORDER_RELAY_MAX_STREAMS", "1000"))
@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from .singleflight import SingleFlight
+
+FetchMany = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+class CacheEntry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: Any, fetched_at: float):
+        self.value = value
+        self.fetched_at = fetched_at
+
+class EntityCache:
+    """
+    In-process LRU cache of upstream entities with a time-to-live.
+
+    A cached None means the upstream answered "not found" and is kept for
+    `negative_ttl`. Past its TTL an entry is still served for `stale_seconds`
+    while one background fetch refreshes it. invalidate() bumps the key's
+    version, so a fetch that was in flight at the time is not cached.
+
+    With a `singleflight`, concurrent fetches of the same keys at the same
+    versions share one upstream call; a reader arriving after an invalidation
+    never joins a fetch that started before it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        negative_ttl: float = 5.0,
+        stale_seconds: float = 30.0,
+        max_entries: int = 10000,
+        singleflight: Optional[SingleFlight] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.singleflight = singleflight
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._versions: Dict[Hashable, int] = {}
+        self._refreshing: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.stale_age_total = 0.0
+        self.stale_age_max = 0.0
+
+    def _version(self, key: Hashable) -> int:
+        return self._versions.get(key, 0)
+
+    async def get(self, key: Hashable, fetch: Callable[[Hashable], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Returns the entity for `key`, or None if the upstream does not have it."""
+        async def fetch_one(keys: List[Hashable]) -> Dict[Hashable, Any]:
+            value = await fetch(keys[0])
+            return {} if value is None else {keys[0]: value}
+
+        return (await self.get_many([key], fetch_one)).get(key)
+
+    async def get_many(self, keys: Iterable[Hashable], fetch_many: FetchMany) -> Dict[Hashable, Any]:
+        """
+        Returns the entities found for `keys`, fetching every miss in one `fetch_many` call.
+        Keys missing from the fetched result are cached as not found.
+        """
+        now = time.monotonic()
+        found: Dict[Hashable, Any] = {}
+        missing, stale = [], []
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is None:
+                missing.append(key)
+                continue
+            age = now - entry.fetched_at
+            if entry.value is None:
+                if age <= self.negative_ttl:
+                    self.hits += 1
+                    self.negative_hits += 1
+                    self._entries.move_to_end(key)
+                else:
+                    missing.append(key)
+                continue
+            if age > self.ttl + self.stale_seconds:
+                missing.append(key)
+                continue
+            if age > self.ttl:
+                self.stale_hits += 1
+                self.stale_age_total += age - self.ttl
+                self.stale_age_max = max(self.stale_age_max, age - self.ttl)
+                if key not in self._refreshing:
+                    stale.append(key)
+            else:
+                self.hits += 1
+            self._entries.move_to_end(key)
+            found[key] = entry.value
+
+        if stale:
+            self._refreshing.update(stale)
+            task = asyncio.create_task(self._refresh(stale, fetch_many))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        if missing:
+            self.misses += len(missing)
+            versions = {key: self._version(key) for key in missing}
+            fetched = await self._fetch(missing, versions, fetch_many)
+            self._store(fetched, versions)
+            for key in missing:
+                if fetched.get(key) is not None:
+                    found[key] = fetched[key]
+        return found
+
+    async def _refresh(self, keys: List[Hashable], fetch_many: FetchMany):
+        versions = {key: self._version(key) for key in keys}
+        try:
+            self._store(await self._fetch(keys, versions, fetch_many), versions)
+            self.refreshes += 1
+        except Exception as e:
+            # The stale entries keep being served until their stale window runs out.
+            self.refresh_failures += 1
+            print(f"WARNING: Refreshing {self.name} cache entries {keys} failed: {str(e)}")
+        finally:
+            self._refreshing.difference_update(keys)
+
+    async def _fetch(self, keys: List[Hashable], versions: Dict[Hashable, int], fetch_many: FetchMany) -> Dict[Hashable, Any]:
+        if self.singleflight is None:
+            return await fetch_many(keys)
+        flight = (self.name, tuple((key, versions[key]) for key in keys))
+        return await self.singleflight.do(flight, lambda: fetch_many(keys))
+
+    def _store(self, fetched: Dict[Hashable, Any], versions: Dict[Hashable, int]):
+        now = time.monotonic()
+        for key, version in versions.items():
+            if version != self._version(key):
+                continue
+            self._entries[key] = CacheEntry(fetched.get(key), now)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drops `key` and discards any fetch of it that is still in flight."""
+        self._versions[key] = self._version(key) + 1
+        self._entries.pop(key, None)
+        self.invalidations += 1
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "negative_ttl_seconds": self.negative_ttl,
+            "stale_seconds": self.stale_seconds,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "stale_hit_ratio": self.stale_hits / lookups if lookups else 0.0,
+            "stale_age_avg_seconds": self.stale_age_total / self.stale_hits if self.stale_hits else 0.0,
+            "stale_age_max_seconds": self.stale_age_max,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refreshes_in_flight": len(self._refreshing),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,9 +1,49 @@
 import strawberry
-from typing import List, Optional
+from graphql import GraphQLError
+from strawberry.types import Info
+from typing import AsyncGenerator, List, Optional
 
-from .schemas import Restaurant, DeliveryAgent, Order, OrderInput
+from .schemas import (
+    Restaurant,
+    DeliveryAgent,
+    Order,
+    OrderConnection,
+    OrderEdge,
+    OrderInput,
+    PageInfo,
+    PlaceOrderResult,
+    RestaurantConnection,
+    RestaurantEdge,
+)
 from . import services 
 
+# Largest pages the restaurant service serves; larger `first` values are clamped.
+MAX_RESTAURANT_PAGE_SIZE = 500
+MAX_ORDER_PAGE_SIZE = 200
+
+def _page_size(first: int, maximum: int) -> int:
+    if first < 1:
+        raise GraphQLError(f"`first` must be at least 1, got {first}.")
+    return min(first, maximum)
+
+def _cursor(after: Optional[str]) -> Optional[int]:
+    """Decodes an `after` cursor, which is the id of the last node of the previous page."""
+    if not after:
+        return None
+    try:
+        return int(after)
+    except ValueError:
+        raise GraphQLError(f"Invalid cursor: {after!r}.") from None
+
+def _order_connection(orders: List[Order], next_cursor: Optional[int], after: Optional[str]) -> OrderConnection:
+    return OrderConnection(
+        edges=[OrderEdge(cursor=str(o.id), node=o) for o in orders],
+        page_info=PageInfo(
+            has_next_page=next_cursor is not None,
+            end_cursor=str(orders[-1].id) if orders else after,
+        ),
+    )
+
 @strawberry.type
 class Query:
     @strawberry.field
@@ -11,14 +51,51 @@ class Query:
         """Fetches a list of all currently online restaurants."""
         return await services.fetch_available_restaurants()
 
+    @strawberry.field
+    async def get_available_restaurants_connection(self, first: int = 50, after: Optional[str] = None) -> RestaurantConnection:
+        """Pages through online restaurants; pass pageInfo.endCursor as `after` for the next page."""
+        restaurants, next_cursor = await services.fetch_available_restaurants_page(
+            _page_size(first, MAX_RESTAURANT_PAGE_SIZE), _cursor(after)
+        )
+        return RestaurantConnection(
+            edges=[RestaurantEdge(cursor=str(r.id), node=r) for r in restaurants],
+            page_info=PageInfo(
+                has_next_page=next_cursor is not None,
+                end_cursor=str(restaurants[-1].id) if restaurants else after,
+            ),
+        )
+
+    @strawberry.field
+    async def top_rated_restaurants(self, info: Info, limit: int = 10) -> List[Restaurant]:
+        """Highest rated restaurants, best first."""
+        top = await services.fetch_top_rated_restaurants(limit)
+        for restaurant_id, rating in top:
+            info.context["restaurant_rating_loader"].prime(restaurant_id, rating)
+        restaurants = await info.context["restaurant_loader"].load_many([restaurant_id for restaurant_id, _ in top])
+        return [restaurant for restaurant in restaurants if restaurant is not None]
+
     @strawberry.field
     async def get_order(self, order_id: int) -> Optional[Order]:
         """Fetches details for a specific order by ID."""
-        order = await services.fetch_order_details(order_id)
-        if order:
-            order.restaurant = lambda: services.get_restaurant_data(order.restaurant_id)
-            order.assigned_agent = lambda: services.get_delivery_agent_data(order.assigned_agent_id)
-        return order
+        return await services.fetch_order_details(order_id)
+
+    @strawberry.field
+    async def orders_for_user(self, user_id: int, first: int = 20, after: Optional[str] = None) -> OrderConnection:
+        """Pages through a user's orders, newest first."""
+        orders, next_cursor = await services.fetch_orders_page(
+            _page_size(first, MAX_ORDER_PAGE_SIZE), _cursor(after), user_id=user_id
+        )
+        return _order_connection(orders, next_cursor, after)
+
+    @strawberry.field
+    async def orders_for_restaurant(
+        self, restaurant_id: int, status: Optional[str] = None, first: int = 20, after: Optional[str] = None
+    ) -> OrderConnection:
+        """Pages through a restaurant's orders, newest first, optionally filtered by status."""
+        orders, next_cursor = await services.fetch_orders_page(
+            _page_size(first, MAX_ORDER_PAGE_SIZE), _cursor(after), restaurant_id=restaurant_id, status=status
+        )
+        return _order_connection(orders, next_cursor, after)
 
 
 @strawberry.type
@@ -26,17 +103,33 @@ class Mutation:
     @strawberry.mutation
     async def rate_order(self, order_id: int, restaurant_rating: int, agent_rating: int) -> Order:
         """Submits a rating for an order and its agent/restaurant."""
-        rated_order = await services.update_order_rating(order_id, restaurant_rating, agent_rating)
-        rated_order.restaurant = lambda: services.get_restaurant_data(rated_order.restaurant_id)
-        rated_order.assigned_agent = lambda: services.get_delivery_agent_data(rated_order.assigned_agent_id)
-        return rated_order
+        return await services.update_order_rating(order_id, restaurant_rating, agent_rating)
 
     @strawberry.mutation
     async def place_order(self, order_data: OrderInput) -> Order:
         """Places a new order through the restaurant service."""
-        new_order = await services.create_new_order(order_data.model_dump())
-        new_order.restaurant = lambda: services.get_restaurant_data(new_order.restaurant_id)
-        new_order.assigned_agent = lambda: services.get_delivery_agent_data(new_order.assigned_agent_id)
-        return new_order
+        return await services.create_new_order(strawberry.asdict(order_data))
+
+    @strawberry.mutation
+    async def place_orders(self, orders: List[OrderInput]) -> List[PlaceOrderResult]:
+        """Places many orders in one upstream call and reports success or failure per item."""
+        results = await services.create_new_orders([strawberry.asdict(order) for order in orders])
+        return [
+            PlaceOrderResult(
+                index=result["index"],
+                ok=result["ok"],
+                order=Order(**result["order"]) if result["order"] else None,
+                error=result["error"],
+            )
+            for result in results
+        ]
+
+@strawberry.type
+class Subscription:
+    @strawberry.subscription
+    async def order_updates(self, order_id: int) -> AsyncGenerator[Order, None]:
+        """Streams an order's current state and then every status change, replacing client polling."""
+        async for order in services.stream_order_events(order_id):
+            yield order
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription)
@@ -0,0 +1,35 @@
+from typing import List, Optional
+from strawberry.dataloader import DataLoader
+
+from .schemas import Restaurant, DeliveryAgent, Rating
+from . import services
+
+async def load_restaurants(restaurant_ids: List[int]) -> List[Optional[Restaurant]]:
+    """Resolves every restaurant id requested in one tick with a single upstream call."""
+    restaurants = await services.get_restaurants_data(list(restaurant_ids))
+    return [restaurants.get(restaurant_id) for restaurant_id in restaurant_ids]
+
+async def load_delivery_agents(agent_ids: List[int]) -> List[Optional[DeliveryAgent]]:
+    """Resolves every agent id requested in one tick with a single upstream call."""
+    agents = await services.get_delivery_agents_data(list(agent_ids))
+    return [agents.get(agent_id) for agent_id in agent_ids]
+
+async def load_restaurant_ratings(restaurant_ids: List[int]) -> List[Optional[Rating]]:
+    ratings = await services.get_ratings_data("restaurants", list(restaurant_ids))
+    return [ratings.get(restaurant_id) for restaurant_id in restaurant_ids]
+
+async def load_agent_ratings(agent_ids: List[int]) -> List[Optional[Rating]]:
+    ratings = await services.get_ratings_data("agents", list(agent_ids))
+    return [ratings.get(agent_id) for agent_id in agent_ids]
+
+async def get_context() -> dict:
+    """
+    Builds the per-request GraphQL context.
+    Loaders are created per request so their caches never leak between clients.
+    """
+    return {
+        "restaurant_loader": DataLoader(load_fn=load_restaurants),
+        "agent_loader": DataLoader(load_fn=load_delivery_agents),
+        "restaurant_rating_loader": DataLoader(load_fn=load_restaurant_ratings),
+        "agent_rating_loader": DataLoader(load_fn=load_agent_ratings),
+    }
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, status
+import hmac
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, status
 from strawberry.fastapi import GraphQLRouter
 
 from .graphql_app import schema 
+from .loaders import get_context
+from .config import CACHE_INVALIDATION_TOKEN
+from .models import CacheInvalidation
 from . import services
 
 app = FastAPI()
 
-graphql_app_router = GraphQLRouter(schema)
+graphql_app_router = GraphQLRouter(schema, context_getter=get_context)
 app.include_router(graphql_app_router, prefix="/graphql")
 
 @app.get("/health", status_code=status.HTTP_200_OK)
@@ -16,6 +21,41 @@ async def health_check():
     """
     return {"status": "ok", "message": "Service is healthy"}
 
+@app.get("/metrics/entity-cache", status_code=status.HTTP_200_OK)
+async def entity_cache_metrics():
+    """
+    Hit ratio, staleness and refresh counters of the restaurant and agent caches.
+    """
+    return {name: cache.stats() for name, cache in services.entity_caches.items()}
+
+@app.get("/metrics/singleflight", status_code=status.HTTP_200_OK)
+async def singleflight_metrics():
+    """
+    Upstream GETs made and how many concurrent callers shared one.
+    """
+    return services.singleflight.stats()
+
+@app.get("/metrics/order-relay", status_code=status.HTTP_200_OK)
+async def order_relay_metrics():
+    """
+    Upstream order event streams and the subscribers sharing them.
+    """
+    return services.order_relay.stats()
+
+@app.post("/cache/invalidate", status_code=status.HTTP_200_OK)
+async def invalidate_cache(invalidation: CacheInvalidation, x_cache_token: Optional[str] = Header(None)):
+    """
+    Evicts entities from the gateway cache.
+    Called by the backing services after they change a restaurant or agent; they
+    must send CACHE_INVALIDATION_TOKEN in the X-Cache-Token header.
+    """
+    if CACHE_INVALIDATION_TOKEN is None or not hmac.compare_digest(x_cache_token or "", CACHE_INVALIDATION_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or missing cache token.")
+    cache = services.entity_caches[invalidation.entity]
+    for entity_id in invalidation.ids:
+        cache.invalidate(entity_id)
+    return {"entity": invalidation.entity, "invalidated": len(invalidation.ids)}
+
 # --- Shutdown Event for httpx clients ---
 @app.on_event("shutdown")
 async def shutdown_event():
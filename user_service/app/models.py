@@ -1,7 +1,11 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 
 class UserInDB(BaseModel):
     id: int
     username: str
     email: str
+
+class CacheInvalidation(BaseModel):
+    entity: Literal["restaurant", "agent"]
+    ids: List[int]
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Optional, Set
+
+import httpx
+from fastapi import HTTPException
+
+from .config import ORDER_RELAY_MAX_STREAMS, RESTAURANT_SERVICE_URL
+from .schemas import Order
+
+_CLOSED = object()
+
+class OrderFeed:
+    """One upstream SSE stream and the subscribers it is fanned out to."""
+
+    def __init__(self):
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.latest: Optional[Order] = None
+        self.error: Optional[Exception] = None
+        self.task: Optional[asyncio.Task] = None
+
+class OrderEventRelay:
+    """
+    Fans restaurant_service's SSE feed of each order out to every gateway subscriber.
+
+    The first subscriber to an order opens its upstream stream and the last one
+    to leave closes it, so the gateway holds one connection per watched order
+    however many clients watch it. Streams run on a client of their own, capped at
+    `max_streams` connections, and never take connections from request/response
+    calls. A late subscriber starts with the latest state seen. As in
+    restaurant_service, a subscriber that falls behind loses its oldest buffered
+    events rather than holding up the others.
+    """
+
+    def __init__(self, base_url: str, max_streams: int = 1000, buffer_size: int = 16):
+        self.buffer_size = buffer_size
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(10.0, read=None),
+            limits=httpx.Limits(max_connections=max_streams, max_keepalive_connections=0),
+        )
+        self._feeds: Dict[int, OrderFeed] = {}
+        self.subscriber_count = 0
+        self.streams_opened = 0
+        self.relayed = 0
+        self.dropped = 0
+
+    async def subscribe(self, order_id: int) -> AsyncIterator[Order]:
+        """Yields the order's current state and then every change, until the upstream stream ends."""
+        feed = self._feeds.get(order_id)
+        if feed is None:
+            feed = self._feeds[order_id] = OrderFeed()
+            feed.task = asyncio.create_task(self._pump(order_id, feed))
+            self.streams_opened += 1
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        if feed.latest is not None:
+            queue.put_nowait(feed.latest)
+        feed.subscribers.add(queue)
+        self.subscriber_count += 1
+        try:
+            while True:
+                item = await queue.get()
+                if item is _CLOSED:
+                    if feed.error is not None:
+                        raise feed.error
+                    return
+                yield item
+        finally:
+            feed.subscribers.discard(queue)
+            self.subscriber_count -= 1
+            if not feed.subscribers and feed.task is not None and not feed.task.done():
+                # Later subscribers open a fresh stream rather than join this closing one.
+                if self._feeds.get(order_id) is feed:
+                    del self._feeds[order_id]
+                feed.task.cancel()
+
+    async def _pump(self, order_id: int, feed: OrderFeed):
+        try:
+            async with self.client.stream("GET", f"/orders/{order_id}/events") as resp:
+                if resp.is_error:
+                    await resp.aread()
+                resp.raise_for_status()
+                data_lines = []
+                async for line in resp.aiter_lines():
+                    if line.startswith("data:"):
+                        data_lines.append(line[5:].strip())
+                    elif not line and data_lines:
+                        order = Order(**json.loads("\n".join(data_lines)))
+                        data_lines = []
+                        feed.latest = order
+                        self.relayed += 1
+                        for queue in feed.subscribers:
+                            self._offer(queue, order)
+        except asyncio.CancelledError:
+            pass
+        except httpx.HTTPStatusError as exc:
+            feed.error = HTTPException(status_code=exc.response.status_code, detail=f"Error from restaurant service: {exc.response.text}")
+        except Exception as e:
+            print(f"WARNING: Order {order_id} event stream failed: {str(e)}")
+            feed.error = HTTPException(status_code=503, detail="Order updates are unavailable.")
+        finally:
+            if self._feeds.get(order_id) is feed:
+                del self._feeds[order_id]
+            for queue in feed.subscribers:
+                self._offer(queue, _CLOSED)
+
+    def _offer(self, queue: asyncio.Queue, item):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(item)
+
+    async def close(self):
+        tasks = [feed.task for feed in self._feeds.values() if feed.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "upstream_streams": len(self._feeds),
+            "subscribers": self.subscriber_count,
+            "streams_opened": self.streams_opened,
+            "relayed": self.relayed,
+            "dropped": self.dropped,
+        }
+
+order_relay = OrderEventRelay(RESTAURANT_SERVICE_URL, max_streams=ORDER_RELAY_MAX_STREAMS)
@@ -1,17 +1,53 @@
 from typing import List, Optional
 import strawberry
+from strawberry.types import Info
+
+@strawberry.type
+class Rating:
+    count: int
+    average: float
+    histogram: List[int]
 
 @strawberry.type
 class Restaurant:
     id: int
     name: str
     online: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    @strawberry.field
+    async def rating(self, info: Info) -> Optional[Rating]:
+        return await info.context["restaurant_rating_loader"].load(self.id)
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str] = None
+
+@strawberry.type
+class RestaurantEdge:
+    cursor: str
+    node: Restaurant
+
+@strawberry.type
+class RestaurantConnection:
+    edges: List[RestaurantEdge]
+    page_info: PageInfo
 
 @strawberry.type
 class DeliveryAgent:
     id: int
     name: str
     available: bool
+    capacity: int = 1
+    active_deliveries: int = 0
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    @strawberry.field
+    async def rating(self, info: Info) -> Optional[Rating]:
+        return await info.context["agent_rating_loader"].load(self.id)
 
 @strawberry.type
 class Order:
@@ -23,14 +59,34 @@ class Order:
     assigned_agent_id: Optional[int] = None
     restaurant_rating: Optional[int] = None
     agent_rating: Optional[int] = None
+    total: Optional[float] = None
 
     @strawberry.field
-    async def restaurant(self) -> Optional[Restaurant]:
-        return None
+    async def restaurant(self, info: Info) -> Optional[Restaurant]:
+        return await info.context["restaurant_loader"].load(self.restaurant_id)
 
     @strawberry.field
-    async def assigned_agent(self) -> Optional[DeliveryAgent]:
-        return None
+    async def assigned_agent(self, info: Info) -> Optional[DeliveryAgent]:
+        if self.assigned_agent_id is None:
+            return None
+        return await info.context["agent_loader"].load(self.assigned_agent_id)
+
+@strawberry.type
+class OrderEdge:
+    cursor: str
+    node: Order
+
+@strawberry.type
+class OrderConnection:
+    edges: List[OrderEdge]
+    page_info: PageInfo
+
+@strawberry.type
+class PlaceOrderResult:
+    index: int
+    ok: bool
+    order: Optional[Order] = None
+    error: Optional[str] = None
 
 @strawberry.input
 class OrderInput:
@@ -1,12 +1,65 @@
+import json
 import httpx
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from fastapi import HTTPException
-from .schemas import Restaurant, DeliveryAgent, Order 
+from .schemas import Restaurant, DeliveryAgent, Order, Rating
+from .config import (
+    RESTAURANT_SERVICE_URL,
+    DELIVERY_AGENT_SERVICE_URL,
+    RESTAURANT_CACHE_TTL_SECONDS,
+    RESTAURANT_CACHE_STALE_SECONDS,
+    AGENT_CACHE_TTL_SECONDS,
+    AGENT_CACHE_STALE_SECONDS,
+    ENTITY_CACHE_NEGATIVE_TTL_SECONDS,
+    ENTITY_CACHE_MAX_ENTRIES,
+    SINGLEFLIGHT_ENABLED,
+)
+from .entity_cache import EntityCache
+from .singleflight import SingleFlight
+from .order_relay import order_relay
 
-restaurant_service_client = httpx.AsyncClient(base_url="http://restaurant_service:8001", timeout=10.0)
-delivery_agent_service_client = httpx.AsyncClient(base_url="http://delivery_agent_service:8002", timeout=10.0)
+restaurant_service_client = httpx.AsyncClient(base_url=RESTAURANT_SERVICE_URL, timeout=10.0)
+delivery_agent_service_client = httpx.AsyncClient(base_url=DELIVERY_AGENT_SERVICE_URL, timeout=10.0)
+
+# Shared by every idempotent GET below; see SingleFlight. The entity caches
+# coalesce their own fetches through it, keyed by cache version.
+singleflight = SingleFlight(enabled=SINGLEFLIGHT_ENABLED)
+
+restaurant_cache = EntityCache(
+    "restaurant",
+    ttl=RESTAURANT_CACHE_TTL_SECONDS,
+    negative_ttl=ENTITY_CACHE_NEGATIVE_TTL_SECONDS,
+    stale_seconds=RESTAURANT_CACHE_STALE_SECONDS,
+    max_entries=ENTITY_CACHE_MAX_ENTRIES,
+    singleflight=singleflight,
+)
+agent_cache = EntityCache(
+    "agent",
+    ttl=AGENT_CACHE_TTL_SECONDS,
+    negative_ttl=ENTITY_CACHE_NEGATIVE_TTL_SECONDS,
+    stale_seconds=AGENT_CACHE_STALE_SECONDS,
+    max_entries=ENTITY_CACHE_MAX_ENTRIES,
+    singleflight=singleflight,
+)
+entity_caches = {"restaurant": restaurant_cache, "agent": agent_cache}
 
 async def get_restaurant_data(restaurant_id: int) -> Optional[Restaurant]:
+    """Restaurant details, served from restaurant_cache when possible."""
+    return await restaurant_cache.get(restaurant_id, _fetch_restaurant)
+
+async def get_delivery_agent_data(agent_id: int) -> Optional[DeliveryAgent]:
+    """Delivery agent details, served from agent_cache when possible."""
+    return await agent_cache.get(agent_id, _fetch_delivery_agent)
+
+async def get_restaurants_data(restaurant_ids: List[int]) -> Dict[int, Restaurant]:
+    """Several restaurants keyed by id; cache misses are fetched in one request."""
+    return await restaurant_cache.get_many(restaurant_ids, _fetch_restaurants)
+
+async def get_delivery_agents_data(agent_ids: List[int]) -> Dict[int, DeliveryAgent]:
+    """Several delivery agents keyed by id; cache misses are fetched in one request."""
+    return await agent_cache.get_many(agent_ids, _fetch_delivery_agents)
+
+async def _fetch_restaurant(restaurant_id: int) -> Optional[Restaurant]:
     """Fetches restaurant details from the restaurant service."""
     try:
         resp = await restaurant_service_client.get(f"/restaurants/{restaurant_id}")
@@ -20,7 +73,7 @@ async def get_restaurant_data(restaurant_id: int) -> Optional[Restaurant]:
         print(f"Error fetching restaurant {restaurant_id}: {e}")
         raise
 
-async def get_delivery_agent_data(agent_id: int) -> Optional[DeliveryAgent]:
+async def _fetch_delivery_agent(agent_id: int) -> Optional[DeliveryAgent]:
     """Fetches delivery agent details from the delivery agent service."""
     try:
         resp = await delivery_agent_service_client.get(f"/agents/{agent_id}")
@@ -34,12 +87,83 @@ async def get_delivery_agent_data(agent_id: int) -> Optional[DeliveryAgent]:
         print(f"Error fetching agent {agent_id}: {e}")
         raise
 
+async def _fetch_restaurants(restaurant_ids: List[int]) -> Dict[int, Restaurant]:
+    """Fetches several restaurants in one request, keyed by id."""
+    try:
+        resp = await restaurant_service_client.get("/restaurants", params={"ids": restaurant_ids})
+        resp.raise_for_status()
+        return {r["id"]: Restaurant(**r) for r in resp.json()}
+    except Exception as e:
+        print(f"Error fetching restaurants {restaurant_ids}: {e}")
+        raise
+
+async def _fetch_delivery_agents(agent_ids: List[int]) -> Dict[int, DeliveryAgent]:
+    """Fetches several delivery agents in one request, keyed by id."""
+    try:
+        resp = await delivery_agent_service_client.get("/delivery/agents", params={"ids": agent_ids})
+        resp.raise_for_status()
+        return {a["id"]: DeliveryAgent(**a) for a in resp.json()}
+    except Exception as e:
+        print(f"Error fetching agents {agent_ids}: {e}")
+        raise
+
+def _rating(summary: dict) -> Rating:
+    return Rating(count=summary["count"], average=summary["average"], histogram=summary["histogram"])
+
+@singleflight.coalesce
+async def get_ratings_data(entity: str, entity_ids: List[int]) -> Dict[int, Rating]:
+    """Fetches rating aggregates for several restaurants or agents (entity: "restaurants" or "agents")."""
+    try:
+        resp = await restaurant_service_client.get(f"/ratings/{entity}", params={"ids": entity_ids})
+        resp.raise_for_status()
+        return {r["entity_id"]: _rating(r) for r in resp.json()}
+    except Exception as e:
+        print(f"Error fetching {entity} ratings {entity_ids}: {e}")
+        raise
+
+@singleflight.coalesce
+async def fetch_top_rated_restaurants(limit: int) -> List[Tuple[int, Rating]]:
+    """Fetches the highest rated restaurant ids with their rating aggregates."""
+    try:
+        resp = await restaurant_service_client.get("/ratings/restaurants/top", params={"limit": limit})
+        resp.raise_for_status()
+        return [(r["entity_id"], _rating(r)) for r in resp.json()]
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status_code=exc.response.status_code, detail=f"Error from restaurant service: {exc.response.text}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+@singleflight.coalesce
 async def fetch_available_restaurants() -> List[Restaurant]:
-    """Fetches a list of all currently online restaurants."""
+    """Fetches a list of all currently online restaurants, streamed as NDJSON."""
     try:
-        resp = await restaurant_service_client.get("/restaurants/available")
+        async with restaurant_service_client.stream(
+            "GET", "/restaurants/available", headers={"Accept": "application/x-ndjson"}
+        ) as resp:
+            if resp.is_error:
+                await resp.aread()
+            resp.raise_for_status()
+            return [Restaurant(**json.loads(line)) async for line in resp.aiter_lines() if line]
+    except httpx.ConnectError:
+        raise HTTPException(status_code=503, detail="Restaurant service is unavailable.")
+    except httpx.ReadTimeout:
+        raise HTTPException(status_code=504, detail="Restaurant service took too long to respond.")
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status_code=exc.response.status_code, detail=f"Error from restaurant service: {exc.response.text}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+@singleflight.coalesce
+async def fetch_available_restaurants_page(limit: int, after: Optional[int] = None) -> Tuple[List[Restaurant], Optional[int]]:
+    """Fetches one keyset page of online restaurants and the cursor for the next one."""
+    params = {"limit": limit}
+    if after is not None:
+        params["after"] = after
+    try:
+        resp = await restaurant_service_client.get("/restaurants/available", params=params)
         resp.raise_for_status()
-        return [Restaurant(**r) for r in resp.json()]
+        page = resp.json()
+        return [Restaurant(**r) for r in page["items"]], page["next_cursor"]
     except httpx.ConnectError:
         raise HTTPException(status_code=503, detail="Restaurant service is unavailable.")
     except httpx.ReadTimeout:
@@ -49,6 +173,7 @@ async def fetch_available_restaurants() -> List[Restaurant]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@singleflight.coalesce
 async def fetch_order_details(order_id: int) -> Optional[Order]:
     """Fetches details for a specific order by ID."""
     try:
@@ -62,6 +187,40 @@ async def fetch_order_details(order_id: int) -> Optional[Order]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@singleflight.coalesce
+async def fetch_orders_page(
+    limit: int,
+    after: Optional[int] = None,
+    user_id: Optional[int] = None,
+    restaurant_id: Optional[int] = None,
+    status: Optional[str] = None,
+) -> Tuple[List[Order], Optional[int]]:
+    """Fetches one keyset page of a user's or restaurant's orders, newest first."""
+    params = {"limit": limit}
+    for key, value in (("after", after), ("user_id", user_id), ("restaurant_id", restaurant_id), ("status", status)):
+        if value is not None:
+            params[key] = value
+    try:
+        resp = await restaurant_service_client.get("/orders", params=params)
+        resp.raise_for_status()
+        page = resp.json()
+        return [Order(**o) for o in page["items"]], page["next_cursor"]
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status_code=exc.response.status_code, detail=f"Error from restaurant service: {exc.response.text}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+async def stream_order_events(order_id: int) -> AsyncIterator[Order]:
+    """Yields every state restaurant_service reports for an order, from a stream shared by its subscribers."""
+    async for order in order_relay.subscribe(order_id):
+        yield order
+
+def _forget_order_reads(order_id: Optional[int] = None):
+    """After a write, order reads still in flight may predate it; later callers must not join them."""
+    if order_id is not None:
+        fetch_order_details.forget(order_id)
+    fetch_orders_page.forget_all()
+
 async def update_order_rating(order_id: int, restaurant_rating: int, agent_rating: int) -> Order:
     """Submits a rating for an order and its agent/restaurant."""
     try:
@@ -70,6 +229,9 @@ async def update_order_rating(order_id: int, restaurant_rating: int, agent_ratin
             json={"restaurant_rating": restaurant_rating, "agent_rating": agent_rating}
         )
         resp.raise_for_status()
+        _forget_order_reads(order_id)
+        get_ratings_data.forget_all()
+        fetch_top_rated_restaurants.forget_all()
         return Order(**resp.json())
     except httpx.HTTPStatusError as exc:
         raise HTTPException(status_code=exc.response.status_code, detail=f"Error rating order: {exc.response.text}")
@@ -81,6 +243,7 @@ async def create_new_order(order_data: dict) -> Order:
     try:
         resp = await restaurant_service_client.post("/orders", json=order_data)
         resp.raise_for_status()
+        _forget_order_reads()
         return Order(**resp.json())
     except httpx.ConnectError:
         raise HTTPException(status_code=503, detail="Restaurant service is unavailable to place orders.")
@@ -91,7 +254,26 @@ async def create_new_order(order_data: dict) -> Order:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+async def create_new_orders(orders_data: List[dict]) -> List[dict]:
+    """Places many orders in one call; returns the per-item results from the restaurant service."""
+    try:
+        resp = await restaurant_service_client.post("/orders/batch", json={"orders": orders_data})
+        resp.raise_for_status()
+        _forget_order_reads()
+        return resp.json()["results"]
+    except httpx.ConnectError:
+        raise HTTPException(status_code=503, detail="Restaurant service is unavailable to place orders.")
+    except httpx.ReadTimeout:
+        raise HTTPException(status_code=504, detail="Restaurant service took too long to process orders.")
+    except httpx.HTTPStatusError as exc:
+        raise HTTPException(status_code=exc.response.status_code, detail=f"Error placing orders: {exc.response.text}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
 async def close_http_clients():
     """Closes httpx clients on application shutdown."""
+    for cache in entity_caches.values():
+        await cache.close()
+    await order_relay.close()
     await restaurant_service_client.aclose()
     await delivery_agent_service_client.aclose()
@@ -0,0 +1,94 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one.
+
+    The first caller for a key starts the call as a task; callers arriving while
+    it runs await the same task and get its result or exception. A caller that
+    is cancelled does not cancel the shared call. Only use it for idempotent
+    reads whose result callers do not mutate. A write that makes a running call
+    stale should forget() its key, so later callers start a fresh call.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.shared = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            self.calls += 1
+            return await fn()
+
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(functools.partial(self._finished, key))
+            self.calls += 1
+        else:
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        """Later callers for `key` start a new call; those already waiting keep the old one."""
+        if self._calls.pop(key, None) is not None:
+            del self._waiters[key]
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        # Every waiter may have been cancelled; mark the exception as retrieved.
+        if not task.cancelled():
+            task.exception()
+
+    def coalesce(self, fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        """Decorator: concurrent calls of `fn` with equal arguments share one call."""
+        def key_of(args, kwargs) -> Hashable:
+            return (fn.__qualname__, _freeze(args), _freeze(kwargs))
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.do(key_of(args, kwargs), lambda: fn(*args, **kwargs))
+
+        def forget(*args, **kwargs):
+            self.forget(key_of(args, kwargs))
+
+        def forget_all():
+            for key in [key for key in self._calls if key[0] == fn.__qualname__]:
+                self.forget(key)
+
+        wrapper.forget = forget
+        wrapper.forget_all = forget_all
+        return wrapper
+
+    def stats(self) -> dict:
+        requested = self.calls + self.shared
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "shared_ratio": self.shared / requested if requested else 0.0,
+            "max_waiters": self.max_waiters,
+        }
@@ -0,0 +1,113 @@
+"""
+Upstream requests made by the gateway during a burst of identical queries,
+with and without request coalescing (app.singleflight).
+
+Runs the GraphQL schema in this process against a restaurant_service stand-in
+that streams `--restaurants` online restaurants from GET /restaurants/available
+after `--upstream-ms` milliseconds. Each of `--bursts` bursts fires `--burst`
+concurrent getAvailableRestaurants queries, `--gap-ms` apart. Reports upstream
+requests and QPS and gateway latency for both modes. Latency includes executing
+every query in this one process, so large bursts mostly measure GraphQL CPU
+time. No services are needed; run from the user_service directory:
+
+    python -m benchmarks.singleflight_burst --burst 200 --bursts 10 --upstream-ms 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from app import services
+from app.graphql_app import schema
+
+QUERY = "{ getAvailableRestaurants { id name online } }"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def stand_in_restaurant(delay: float, restaurants: int, counter: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/restaurants/available")
+    async def available():
+        counter["requests"] += 1
+        await asyncio.sleep(delay)
+
+        async def lines():
+            for i in range(1, restaurants + 1):
+                yield json.dumps({"id": i, "name": f"Restaurant {i}", "online": True}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+async def run(args, coalesce: bool) -> dict:
+    counter = {"requests": 0}
+    stand_in = stand_in_restaurant(args.upstream_ms / 1000, args.restaurants, counter)
+    services.restaurant_service_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=stand_in), base_url="http://restaurant_service", timeout=30.0
+    )
+    services.singleflight.enabled = coalesce
+    latencies_ms, errors = [], 0
+
+    async def query():
+        nonlocal errors
+        started = time.perf_counter()
+        result = await schema.execute(QUERY)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        if result.errors or len(result.data["getAvailableRestaurants"]) != args.restaurants:
+            errors += 1
+
+    started = time.perf_counter()
+    bursts = []
+    for _ in range(args.bursts):
+        bursts.append(asyncio.create_task(asyncio.wait([asyncio.create_task(query()) for _ in range(args.burst)])))
+        await asyncio.sleep(args.gap_ms / 1000)
+    await asyncio.gather(*bursts)
+    elapsed = time.perf_counter() - started
+    await services.restaurant_service_client.aclose()
+
+    return {
+        "upstream_requests": counter["requests"],
+        "upstream_qps": counter["requests"] / elapsed,
+        "elapsed": elapsed,
+        "median_ms": statistics.median(latencies_ms),
+        "p99_ms": percentile(latencies_ms, 0.99),
+        "errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=200, help="concurrent queries per burst")
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--gap-ms", type=float, default=100.0, help="time between burst starts")
+    parser.add_argument("--upstream-ms", type=float, default=50.0, help="stand-in latency before the first byte")
+    parser.add_argument("--restaurants", type=int, default=50)
+    args = parser.parse_args()
+
+    queries = args.burst * args.bursts
+    print(f"{args.bursts} bursts of {args.burst} getAvailableRestaurants queries, upstream {args.upstream_ms:g} ms")
+    results = {}
+    for coalesce in (False, True):
+        result = results[coalesce] = await run(args, coalesce)
+        print(
+            f"singleflight {'on ' if coalesce else 'off'}: {result['upstream_requests']:6d} upstream requests "
+            f"for {queries} queries ({result['upstream_qps']:8.1f}/s over {result['elapsed']:.2f}s)  "
+            f"median {result['median_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  errors {result['errors']}"
+        )
+    saved = 1 - results[True]["upstream_requests"] / results[False]["upstream_requests"]
+    print(f"upstream requests reduced by {saved:.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())